@@ -49,6 +49,11 @@ class Task:
     def is_overrun(self) -> bool:
         return self.elapsed_seconds > self.allocated_seconds
 
+    @property
+    def scheduled_minute(self) -> Optional[int]:
+        from lt_db import minute_of_day
+        return minute_of_day(self.scheduled_time)
+
 
 @dataclass
 class DayPlan:
@@ -64,24 +69,17 @@ class DayPlan:
 
 
 def engine_to_plan(engine) -> DayPlan:
-    """Конвертирует состояние TimerEngine в DayPlan для UI."""
-    tasks = []
-    for t in engine.get_tasks():
-        tasks.append(Task(
-            id                = t["id"],
-            name              = t["name"],
-            allocated_seconds = t["allocated_seconds"],
-            elapsed_seconds   = t["elapsed_seconds"],
-            overrun_seconds   = t["overrun_seconds"],
-            status            = TaskStatus(t["status"].value if hasattr(t["status"], "value") else t["status"]),
-            scheduled_time    = t["scheduled_time"],
-            completed_at      = t["completed_at"].isoformat() if t["completed_at"] else None,
-            priority          = t.get("priority", Priority.NORMAL),
-        ))
+    """
+    Конвертирует состояние TimerEngine в DayPlan для UI.
+    Записи движка (timer.TaskState) неизменяемы и читаются так же, как Task,
+    поэтому кладутся в план как есть — без копирования каждую секунду.
+    Всё берётся из одного снимка — задачи и прокрастинация согласованы.
+    """
+    snap = engine.snapshot()
     return DayPlan(
         date=date.today().isoformat(),
-        tasks=tasks,
-        procrastination_used=engine.get_proc_used(),
+        tasks=list(snap.tasks),
+        procrastination_used=snap.proc_used,
     )
 
 
@@ -0,0 +1,60 @@
+"""
+Асинхронный путь к БД для asyncio-кода (AsyncTimerEngine).
+Синхронные функции repository выполняются в одном выделенном потоке:
+event loop не блокируется, а порядок записей сохраняется (FIFO) —
+SQLite всё равно сериализует запись, больше одного потока не нужно.
+"""
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from typing import Optional
+
+import repository as repo
+from lt_db import DayPlan, Task
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="life-timer-db")
+
+
+async def run(fn, *args, **kwargs):
+    """Выполняет синхронную функцию repository в потоке БД."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(fn, *args, **kwargs))
+
+
+async def get_or_create_plan(d: date) -> DayPlan:
+    return await run(repo.get_or_create_plan, d)
+
+
+async def get_plan(plan_id: int) -> Optional[DayPlan]:
+    return await run(repo.get_plan, plan_id)
+
+
+async def get_tasks_for_plan(plan_id: int) -> list[Task]:
+    return await run(repo.get_tasks_for_plan, plan_id)
+
+
+async def add_task(plan_id: int, task_id: str, name: str,
+                   allocated_seconds: int, **kwargs) -> Task:
+    return await run(repo.add_task, plan_id, task_id, name, allocated_seconds, **kwargs)
+
+
+async def update_task(task_id: str, **kwargs):
+    await run(repo.update_task, task_id, **kwargs)
+
+
+async def add_tasks_bulk(plan_id: int, rows: list[dict]) -> int:
+    return await run(repo.add_tasks_bulk, plan_id, rows)
+
+
+async def update_tasks_bulk(changes: list[dict]) -> int:
+    return await run(repo.update_tasks_bulk, changes)
+
+
+async def delete_task(task_id: str):
+    await run(repo.delete_task, task_id)
+
+
+async def flush_engine_state(plan_id: int, plan_fields: dict,
+                             task_rows: list[dict]) -> int:
+    return await run(repo.flush_engine_state, plan_id, plan_fields, task_rows)
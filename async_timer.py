@@ -0,0 +1,208 @@
+"""
+AsyncTimerEngine — asyncio-вариант TimerEngine для встраивания в async-сервисы.
+
+Логика учёта времени та же самая — внутри обычный TimerEngine (core).
+Отличия только в обвязке:
+  - дедлайны через loop.call_at (AsyncioScheduler), без фонового потока;
+  - в БД пишет не core, а эта обёртка через async_repository —
+    запись уходит в поток БД и не блокирует event loop;
+  - вместо on_tick/listener-колбеков — async-итератор событий.
+Исключение — смена суток (core._rollover): раз в сутки закрытый день
+пишется синхронно, из потока event loop.
+
+Все методы вызывать из потока event loop.
+
+    engine = await AsyncTimerEngine.create(plan_id, settings)
+    await engine.start()
+    async for kind, task_id in engine.events():
+        ...
+"""
+import asyncio
+import logging
+import time
+from typing import Optional
+
+import async_repository as arepo
+from lt_db import Settings, Priority
+from scheduler import AsyncioScheduler
+from timer import TimerEngine, TaskState
+
+log = logging.getLogger(__name__)
+
+
+class EventStream:
+    """
+    Подписка на события движка: async-итератор пар (kind, task_id).
+    kind — как у TimerEngine listener'ов (add/remove/edit/activate/deactivate/
+    complete/skip) плюс "tick" на каждом дедлайне движка.
+    Медленный читатель теряет самые старые события, а не тормозит движок.
+    """
+
+    def __init__(self, owner: "AsyncTimerEngine", maxsize: int):
+        self._owner = owner
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize)
+
+    def _put(self, item):
+        if self._queue.full():
+            self._queue.get_nowait()
+        self._queue.put_nowait(item)
+
+    def close(self):
+        self._owner._streams.discard(self)
+        self._put(None)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> tuple[str, Optional[str]]:
+        item = await self._queue.get()
+        if item is None:
+            raise StopAsyncIteration
+        return item
+
+
+class AsyncTimerEngine:
+    SAVE_INTERVAL    = TimerEngine.SAVE_INTERVAL
+    EVENT_QUEUE_SIZE = 256
+
+    def __init__(self, core: TimerEngine, scheduler: AsyncioScheduler):
+        """Напрямую не вызывать — core надо грузить из БД: см. create()."""
+        self.core = core
+        self.scheduler = scheduler
+        self._streams: set[EventStream] = set()
+        self._background: set[asyncio.Task] = set()
+        self._last_flush = time.monotonic()
+        self._running = False
+        core.on_tick = lambda: self._publish("tick", None)
+        core.add_listener(self._publish)
+
+    @classmethod
+    async def create(cls, plan_id: int, settings: Settings) -> "AsyncTimerEngine":
+        scheduler = AsyncioScheduler(asyncio.get_running_loop())
+        # _load_state читает БД — делаем это в потоке БД
+        core = await arepo.run(TimerEngine, plan_id, settings,
+                               scheduler=scheduler, autoflush=False)
+        return cls(core, scheduler)
+
+    @property
+    def plan_id(self) -> int:
+        return self.core.plan_id
+
+    @property
+    def active_task_id(self) -> Optional[str]:
+        return self.core.active_task_id
+
+    # ──────────────────────────────────────────────
+    #  Чтение (без БД — синхронно)
+    # ──────────────────────────────────────────────
+
+    def get_tasks(self) -> list[TaskState]:
+        return self.core.get_tasks()
+
+    def get_task(self, task_id: str) -> Optional[TaskState]:
+        return self.core.get_task(task_id)
+
+    def get_proc_used(self) -> int:
+        return self.core.get_proc_used()
+
+    # ──────────────────────────────────────────────
+    #  Запуск / остановка
+    # ──────────────────────────────────────────────
+
+    async def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._last_flush = time.monotonic()
+        self.core.start()
+        self.scheduler.reschedule(self)
+
+    async def stop(self):
+        if not self._running:
+            return
+        self._running = False
+        self.scheduler.remove(self)
+        self.core.stop()
+        if self._background:
+            await asyncio.gather(*self._background, return_exceptions=True)
+        await self.flush()
+        for stream in list(self._streams):
+            stream.close()
+
+    # ──────────────────────────────────────────────
+    #  Управление задачами
+    # ──────────────────────────────────────────────
+
+    async def add_task(self, task_id: str, name: str, allocated_seconds: int,
+                       scheduled_time: Optional[str] = None,
+                       priority: Priority = Priority.NORMAL):
+        """Создаёт задачу в БД и в движке."""
+        await arepo.add_task(self.plan_id, task_id, name, allocated_seconds,
+                             scheduled_time=scheduled_time, priority=priority,
+                             position=len(self.core.get_tasks()))
+        self.core.add_task(task_id, name, allocated_seconds, scheduled_time, priority)
+
+    async def remove_task(self, task_id: str):
+        self.core.remove_task(task_id)
+        await arepo.delete_task(task_id)
+
+    async def activate_task(self, task_id: str):
+        self.core.activate_task(task_id)
+
+    async def deactivate(self):
+        self.core.deactivate()
+
+    async def complete_task(self, task_id: str):
+        self.core.complete_task(task_id)
+        await self.flush()
+
+    async def skip_task(self, task_id: str):
+        self.core.skip_task(task_id)
+        await self.flush()
+
+    # ──────────────────────────────────────────────
+    #  События
+    # ──────────────────────────────────────────────
+
+    def events(self) -> EventStream:
+        """Новая подписка; события до вызова events() в неё не попадают."""
+        stream = EventStream(self, self.EVENT_QUEUE_SIZE)
+        self._streams.add(stream)
+        return stream
+
+    def _publish(self, kind: str, task_id: Optional[str]):
+        for stream in self._streams:
+            stream._put((kind, task_id))
+
+    # ──────────────────────────────────────────────
+    #  Запись в БД
+    # ──────────────────────────────────────────────
+
+    async def flush(self):
+        """Пишет изменения core в БД через поток БД (см. TimerEngine._take_changes)."""
+        plan_fields, rows, undo = self.core._take_changes()
+        statements = 0
+        if rows or plan_fields:
+            try:
+                statements = await arepo.flush_engine_state(self.plan_id, plan_fields, rows)
+            except Exception:
+                self.core._restore_changes(undo)
+                raise
+            self.core._commit_changes(plan_fields)
+        self.core._record_flush(len(rows), statements)
+
+    def next_deadline(self) -> Optional[float]:
+        if not self._running:
+            return None
+        return self._last_flush + self.SAVE_INTERVAL
+
+    def on_deadline(self, now: float):
+        self._last_flush = now
+        task = asyncio.get_running_loop().create_task(self.flush())
+        self._background.add(task)
+        task.add_done_callback(self._flush_done)
+
+    def _flush_done(self, task: asyncio.Task):
+        self._background.discard(task)
+        if not task.cancelled() and task.exception():
+            log.error("Фоновый flush не удался", exc_info=task.exception())
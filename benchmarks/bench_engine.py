@@ -0,0 +1,158 @@
+"""
+Бенчмарк горячего пути TimerEngine и построения модели для UI.
+
+Синтетический план из 10 / 100 / 1k / 10k задач (каждая третья — со
+scheduled_time), in-memory SQLite, виртуальные часы. Меряется:
+  tick                       — секунда жизни движка: часы +1с, snapshot()
+                               (то, что UI делает каждую секунду)
+  flush                      — одна изменённая задача → _take_changes +
+                               repo.flush_engine_state (синхронно, без писателя)
+  tick_proportional          — то же, но активная задача в перерасходе при
+                               OverrunSource.PROPORTIONAL (ужимаются остальные)
+  flush_proportional         — секунда перерасхода + публичный flush(wait=True)
+                               через писателя
+  procrastination_remaining
+  engine_to_plan             — adapter.engine_to_plan
+  sort_tasks                 — ui.task_panel.sort_tasks
+  check_plan                 — validation.check_plan
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_engine [--sizes 10,100] [--json out.json]
+                                      [--compare benchmarks/baseline_engine.json]
+"""
+import sys, os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datetime import datetime, time as dt_time, date
+from sqlalchemy import create_engine, insert
+from sqlalchemy.pool import StaticPool
+
+# Подменяем движок на in-memory ДО первого импорта repository
+import lt_db
+lt_db.engine = create_engine("sqlite://", poolclass=StaticPool,
+                             connect_args={"check_same_thread": False})
+
+import repository as repo
+import validation
+from adapter import AppSettings, engine_to_plan
+from clock import VirtualClock
+from lt_db import Task, OverrunSource, init_db
+from scheduler import Scheduler
+from timer import TimerEngine
+from ui.task_panel import sort_tasks
+
+from benchmarks import harness
+
+SIZES = (10, 100, 1_000, 10_000)
+METRICS = ("tick", "flush", "tick_proportional", "flush_proportional",
+           "procrastination_remaining",
+           "engine_to_plan", "sort_tasks", "check_plan")
+
+
+def make_plan(n: int) -> int:
+    """Свежая БД с планом на сегодня из n задач."""
+    lt_db.Base.metadata.drop_all(lt_db.engine)
+    with lt_db.engine.begin() as conn:
+        lt_db._set_schema_version(conn, 0)      # схемы нет — init_db строит заново
+    init_db()
+    plan = repo.get_or_create_plan(date.today())
+    rows = [
+        {"id": f"task-{i}", "plan_id": plan.id, "name": f"Задача {i}",
+         "allocated_seconds": 600 + i % 7 * 300, "position": i,
+         "scheduled_time": f"{8 + i % 12:02d}:{i % 4 * 15:02d}" if i % 3 == 0 else None}
+        for i in range(n)
+    ]
+    with lt_db.get_session() as s:
+        s.execute(insert(Task), rows)
+        s.commit()
+    return plan.id
+
+
+def make_engine(plan_id: int, settings: AppSettings,
+                autoflush: bool = False) -> tuple[TimerEngine, VirtualClock]:
+    clock = VirtualClock(datetime.combine(date.today(), dt_time(9, 0)))
+    engine = TimerEngine(plan_id, settings, scheduler=Scheduler(),
+                         autoflush=autoflush, clock=clock)
+    engine.start()
+    engine.activate_task("task-0")
+    return engine, clock
+
+
+def make_overrun(plan_id: int, settings: AppSettings,
+                 autoflush: bool = False) -> tuple[TimerEngine, VirtualClock]:
+    """task-0 уже в перерасходе; остальным — запас на всё время замера."""
+    engine, clock = make_engine(plan_id, settings, autoflush=autoflush)
+    for t in engine.get_tasks():
+        if t.id != "task-0":
+            engine.update_task_meta(t.id, t.name, 10**7, t.scheduled_time)
+    clock.advance(3600)
+    engine.snapshot()
+    return engine, clock
+
+
+def bench(n: int) -> dict:
+    plan_id = make_plan(n)
+    settings = AppSettings()
+    engine, clock = make_engine(plan_id, settings)
+
+    def tick():
+        clock.advance(1)
+        engine.snapshot()
+
+    def flush():
+        clock.advance(1)
+        plan_fields, rows, undo = engine._take_changes()
+        repo.flush_engine_state(plan_id, plan_fields, rows)
+        engine._commit_changes(plan_fields)
+
+    proportional = AppSettings()
+    proportional.overrun_source = OverrunSource.PROPORTIONAL
+    prop_engine, prop_clock = make_overrun(plan_id, proportional)
+    flush_engine, flush_clock = make_overrun(plan_id, proportional, autoflush=True)
+
+    def tick_proportional():
+        prop_clock.advance(1)
+        prop_engine.snapshot()
+
+    def flush_proportional():
+        flush_clock.advance(1)
+        flush_engine.flush(wait=True)
+
+    tasks = engine.get_tasks()
+    plan = engine_to_plan(engine)
+    results = {
+        "tick":                      harness.per_call_us(tick),
+        "flush":                     harness.per_call_us(flush),
+        "tick_proportional":         harness.per_call_us(tick_proportional),
+        "flush_proportional":        harness.per_call_us(flush_proportional),
+        "procrastination_remaining": harness.per_call_us(engine.procrastination_remaining),
+        "engine_to_plan":            harness.per_call_us(lambda: engine_to_plan(engine)),
+        "sort_tasks":                harness.per_call_us(
+                                         lambda: sort_tasks(tasks, engine.active_task_id)),
+        "check_plan":                harness.per_call_us(lambda: validation.check_plan(plan)),
+    }
+    engine.stop()
+    prop_engine.stop()
+    flush_engine.stop()
+    return {f"{metric}/{n}": {"us": us} for metric, us in results.items()}
+
+
+def run(sizes: tuple) -> dict:
+    results = {}
+    for n in sizes:
+        results.update(bench(n))
+    return results
+
+
+def print_table(results: dict):
+    sizes = sorted({int(key.split("/")[1]) for key in results})
+    header = f"{'мкс/вызов':<26}" + "".join(f"{n:>12}" for n in sizes)
+    print(header)
+    print("-" * len(header))
+    for metric in METRICS:
+        cells = "".join(f"{results[f'{metric}/{n}']['us']:>12.2f}" for n in sizes)
+        print(f"{metric:<26}{cells}")
+
+
+if __name__ == "__main__":
+    harness.main("engine", run, SIZES, print_table)
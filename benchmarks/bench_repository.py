@@ -0,0 +1,155 @@
+"""
+Бенчмарк repository.py на истории разной длины: 30 дней, 1 год, 5 лет
+(benchmarks.datagen, фиксированный seed, in-memory SQLite).
+
+Для каждой функции — задержка одного вызова (p50 / p95 / p99 / max, мкс)
+и число SQL-выражений на вызов (db_stats.count_queries). Рост числа выражений с размером истории —
+признак N+1: такие строки помечены ⚠ в таблице, а --compare считает
+регрессией любой рост счётчика относительно эталона.
+
+Не меряются необратимые операции, после которых повтор уже не тот же
+вызов: delete_*, purchase_reward, save_*_compat.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_repository [--sizes 30,365] [--json out.json]
+                                          [--compare benchmarks/baseline_repository.json]
+"""
+import sys, os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import itertools
+import time
+from datetime import date, timedelta
+from typing import Callable
+
+from benchmarks import datagen, harness
+
+import db_stats
+import repository as repo
+from lt_db import RewardType
+
+SIZES = (30, 365, 1_825)       # дней истории
+TASKS_PER_DAY = 8
+SEED = 42
+MAX_CALLS = 200                # вызовов на функцию
+TIME_BUDGET = 1.0              # ... или пока не выйдет столько секунд
+MIN_CALLS = 5
+
+
+def cases() -> dict[str, Callable]:
+    """Вызовы для замера; аргументы — из сгенерированной истории."""
+    yesterday = date.today() - timedelta(days=1)
+    month_ago = yesterday - timedelta(days=29)
+    plan = repo.get_or_create_plan(yesterday)
+    task_ids = [t.id for t in repo.get_tasks_for_plan(plan.id)]
+    today = repo.get_or_create_plan(date.today())
+    reward_id = repo.get_rewards()[0].id
+    counter = itertools.count()
+
+    def add_task():
+        repo.add_task(today.id, f"bench-{next(counter)}", "Задача", 1800, "10:00")
+
+    def preset_rows():
+        return [{"id": f"bench-{next(counter)}", "name": "Задача",
+                 "allocated_seconds": 1800, "scheduled_time": "10:00"} for _ in range(50)]
+
+    def add_task_x50():
+        for row in preset_rows():
+            repo.add_task(today.id, row["id"], row["name"], row["allocated_seconds"],
+                          row["scheduled_time"])
+
+    return {
+        "get_settings":              repo.get_settings,
+        "save_settings":             lambda: repo.save_settings({"notify_before_minutes": 5}),
+        "get_or_create_plan":        lambda: repo.get_or_create_plan(yesterday),
+        "get_plan":                  lambda: repo.get_plan(plan.id),
+        "get_plan_with_tasks":       lambda: repo.get_plan_with_tasks(yesterday),
+        "update_plan":               lambda: repo.update_plan(plan.id, procrastination_used=60),
+        "mark_carried_over":         lambda: repo.mark_carried_over(task_ids[:1]),
+        "get_unfinished_from_date":  lambda: repo.get_unfinished_from_date(yesterday),
+        "add_task":                  add_task,
+        "add_task_x50":              add_task_x50,
+        "add_tasks_bulk/50":         lambda: repo.add_tasks_bulk(today.id, preset_rows()),
+        "update_task":               lambda: repo.update_task(task_ids[0], name="Задача"),
+        "update_tasks_bulk":         lambda: repo.update_tasks_bulk(
+                                         [{"id": tid, "name": "Задача"} for tid in task_ids]),
+        "flush_engine_state":        lambda: repo.flush_engine_state(
+                                         plan.id, {"procrastination_used": 120},
+                                         [{"id": tid, "elapsed_seconds": 60} for tid in task_ids]),
+        "get_tasks_for_plan":        lambda: repo.get_tasks_for_plan(plan.id),
+        "get_next_scheduled_task":   lambda: repo.get_next_scheduled_task(plan.id, 12 * 60),
+        "get_scheduled_tasks":       lambda: repo.get_scheduled_tasks(plan.id),
+        "get_balance":               repo.get_balance,
+        "add_transaction":           lambda: repo.add_transaction(1, "Бенчмарк"),
+        "update_streak":             lambda: repo.update_streak(3),
+        "get_transactions":          repo.get_transactions,
+        "get_rewards":               repo.get_rewards,
+        "add_reward":                lambda: repo.add_reward("Бенчмарк", 10, RewardType.SINGLE),
+        "update_reward":             lambda: repo.update_reward(
+                                         reward_id, "Награда", 10, None),
+        "get_templates":             repo.get_templates,
+        "add_user_template":         lambda: repo.add_user_template("Бенчмарк", 900, "👤 Мои шаблоны"),
+        "get_presets":               repo.get_presets,
+        "get_templates_as_dicts":    repo.get_templates_as_dicts,
+        "get_user_presets_as_dicts": repo.get_user_presets_as_dicts,
+        "get_user_preset_template_names": lambda: repo.get_user_preset_template_names("Пресет 0"),
+        "get_templates_by_names":    lambda: repo.get_templates_by_names(["Сон", "Обед", "Ужин"]),
+        "get_stats/month":           lambda: repo.get_stats(month_ago, yesterday),
+        "get_stats/all":             repo.get_stats,
+        "get_stats_summary/month":   lambda: repo.get_stats_summary(month_ago, yesterday),
+        "get_stats_summary/all":     repo.get_stats_summary,
+    }
+
+
+def measure(fn: Callable) -> dict:
+    samples, statements = [], []
+    started = time.perf_counter()
+    while len(samples) < MAX_CALLS and (
+            len(samples) < MIN_CALLS or time.perf_counter() - started < TIME_BUDGET):
+        with db_stats.count_queries() as q:
+            fn()
+        samples.append(q.seconds * 1e6)
+        statements.append(q.statements)
+    result = {f"{k}_us": v for k, v in harness.percentiles(samples).items()}
+    result["statements"] = max(statements)
+    result["calls"] = len(samples)
+    return result
+
+
+def bench(days: int) -> dict:
+    eng = datagen.memory_engine()
+    datagen.install(eng)
+    datagen.generate(eng, days=days, tasks_per_day=TASKS_PER_DAY, seed=SEED)
+    results = {f"{name}/{days}d": measure(fn)
+               for name, fn in cases().items()}
+    eng.dispose()
+    return results
+
+
+def run(sizes: tuple) -> dict:
+    results = {}
+    for days in sizes:
+        results.update(bench(days))
+    return results
+
+
+def print_table(results: dict):
+    sizes = sorted({int(key.rsplit("/", 1)[1][:-1]) for key in results})
+    names = list(dict.fromkeys(key.rsplit("/", 1)[0] for key in results))
+    header = (f"{'функция':<32}{'дней':>6}{'p50 мкс':>11}{'p95 мкс':>11}"
+              f"{'p99 мкс':>11}{'max мкс':>11}{'SQL':>5}")
+    print(header)
+    print("-" * len(header))
+    for name in names:
+        rows = [results[f"{name}/{days}d"] for days in sizes]
+        # Одинаковый вызов на большей истории — больше SQL: запрос в цикле
+        grows = any(b["statements"] > a["statements"] for a, b in zip(rows, rows[1:]))
+        for days, r in zip(sizes, rows):
+            print(f"{name:<32}{days:>6}{r['p50_us']:>11.0f}{r['p95_us']:>11.0f}"
+                  f"{r['p99_us']:>11.0f}{r['max_us']:>11.0f}{r['statements']:>5}"
+                  + (" ⚠" if grows else ""))
+
+
+if __name__ == "__main__":
+    harness.main("repository", run, SIZES, print_table,
+                 fields=("p50_us", "p95_us"), exact=("statements",))
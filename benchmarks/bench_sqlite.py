@@ -0,0 +1,105 @@
+"""
+Бенчмарк PRAGMA-профиля SQLite: commit'ов в секунду до и после.
+
+Файловая БД во временном каталоге (in-memory не показывает fsync),
+два профиля:
+  default — как было: create_engine без PRAGMA (rollback journal, FULL)
+  profile — lt_db.SQLITE_PRAGMAS (WAL, synchronous=NORMAL, ...)
+
+Нагрузки — по одной транзакции на вызов, как в приложении:
+  flush        — repo.flush_engine_state: задача + план (поток записи движка)
+  transaction  — repo.add_transaction (монеты, UI)
+  read_during_write — get_tasks_for_plan, пока другой поток непрерывно
+                 пишет (в rollback journal читатель ждёт писателя)
+
+Результат — мкс на операцию (меньше — лучше) и пересчёт в операции/с.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_sqlite [--json out.json]
+"""
+import sys, os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tempfile
+import threading
+import time
+from datetime import date
+
+from benchmarks import datagen, harness
+
+import repository as repo
+
+PROFILES = {"default": {}, "profile": None}   # None — lt_db.SQLITE_PRAGMAS
+WORKLOADS = ("flush", "transaction", "read_during_write")
+DURATION = 1.0      # секунд на нагрузку
+DAYS = 30           # истории в БД
+
+
+def _timed(fn, duration: float = DURATION) -> float:
+    """Средняя длительность вызова fn за duration секунд, мкс."""
+    calls = 0
+    started = time.perf_counter()
+    while time.perf_counter() - started < duration:
+        fn()
+        calls += 1
+    return (time.perf_counter() - started) / calls * 1e6
+
+
+def bench(profile: str, pragmas) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        eng = datagen.sqlite_engine(os.path.join(tmp, "bench.db"), pragmas=pragmas)
+        datagen.install(eng)
+        datagen.generate(eng, days=DAYS, seed=1)
+        plan = repo.get_or_create_plan(date.today())
+        for i in range(8):
+            repo.add_task(plan.id, f"task-{i}", f"Задача {i}", 1800, position=i)
+        elapsed = [0]
+
+        def flush():
+            elapsed[0] += 1
+            repo.flush_engine_state(plan.id, {"procrastination_used": elapsed[0]},
+                                    [{"id": "task-0", "elapsed_seconds": elapsed[0]}])
+
+        results = {
+            "flush":       _timed(flush),
+            "transaction": _timed(lambda: repo.add_transaction(1, "Бенчмарк")),
+        }
+
+        stop = threading.Event()
+
+        def writer():
+            while not stop.is_set():
+                flush()
+        thread = threading.Thread(target=writer, daemon=True)
+        thread.start()
+        try:
+            results["read_during_write"] = _timed(lambda: repo.get_tasks_for_plan(plan.id))
+        finally:
+            stop.set()
+            thread.join()
+        eng.dispose()
+    return {f"{w}/{profile}": {"us": us, "ops_per_s": 1e6 / us}
+            for w, us in results.items()}
+
+
+def run(profiles: tuple) -> dict:
+    results = {}
+    for name in profiles:
+        results.update(bench(name, PROFILES[name]))
+    return results
+
+
+def print_table(results: dict):
+    profiles = [p for p in PROFILES if f"flush/{p}" in results]
+    header = f"{'операций/с':<20}" + "".join(f"{p:>12}" for p in profiles) + f"{'×':>8}"
+    print(header)
+    print("-" * len(header))
+    for w in WORKLOADS:
+        ops = [results[f"{w}/{p}"]["ops_per_s"] for p in profiles]
+        gain = f"{ops[-1] / ops[0]:>8.1f}" if len(ops) > 1 else ""
+        print(f"{w:<20}" + "".join(f"{x:>12.0f}" for x in ops) + gain)
+
+
+if __name__ == "__main__":
+    # «Размеры» этого набора — профили, --sizes не используется
+    harness.main("sqlite", lambda _: run(tuple(PROFILES)), (), print_table)
@@ -0,0 +1,117 @@
+"""
+Бенчмарк: dict на задачу (старый layout TimerEngine._tasks) против
+timer.TaskState (NamedTuple, copy-on-write).
+
+Меряет на 100 / 1k / 10k задач:
+  - память на N записей (tracemalloc)
+  - обновление поля активной задачи (то, что делает _settle)
+  - построение модели для UI (старый engine_to_plan копировал каждую
+    задачу в adapter.Task; теперь записи отдаются как есть)
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_task_state
+"""
+import sys, os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import timeit
+import tracemalloc
+import uuid
+
+from lt_db import TaskStatus, Priority
+from adapter import Task, TaskStatus as UITaskStatus
+from timer import TaskState
+
+SIZES = (100, 1_000, 10_000)
+
+
+def make_dicts(n: int) -> dict:
+    return {
+        tid: {
+            "id": tid, "name": f"Задача {i}",
+            "allocated_seconds": 1800, "elapsed_seconds": 0,
+            "overrun_seconds": 0, "status": TaskStatus.PENDING,
+            "scheduled_time": None, "completed_at": None,
+            "priority": Priority.NORMAL,
+        }
+        for i, tid in enumerate(str(uuid.uuid4()) for _ in range(n))
+    }
+
+
+def make_states(n: int) -> dict:
+    return {
+        tid: TaskState(id=tid, name=f"Задача {i}", allocated_seconds=1800)
+        for i, tid in enumerate(str(uuid.uuid4()) for _ in range(n))
+    }
+
+
+def legacy_to_ui(tasks: dict) -> list:
+    """Тело старого adapter.engine_to_plan — копия каждой задачи в Task."""
+    return [
+        Task(
+            id=t["id"], name=t["name"],
+            allocated_seconds=t["allocated_seconds"],
+            elapsed_seconds=t["elapsed_seconds"],
+            overrun_seconds=t["overrun_seconds"],
+            status=UITaskStatus(t["status"].value),
+            scheduled_time=t["scheduled_time"],
+            completed_at=t["completed_at"].isoformat() if t["completed_at"] else None,
+            priority=t.get("priority", Priority.NORMAL),
+        )
+        for t in tasks.values()
+    ]
+
+
+def measure_memory(factory, n: int) -> int:
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    data = factory(n)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del data
+    return after - before
+
+
+def per_call_us(fn, number: int) -> float:
+    return min(timeit.repeat(fn, number=number, repeat=5)) / number * 1e6
+
+
+def bench(n: int) -> dict:
+    dicts = make_dicts(n)
+    states = make_states(n)
+    d_key = next(iter(dicts))
+    s_key = next(iter(states))
+
+    def dict_update():
+        dicts[d_key]["elapsed_seconds"] += 1
+
+    def state_update():
+        t = states[s_key]
+        states[s_key] = t._replace(elapsed_seconds=t.elapsed_seconds + 1)
+
+    ui_number = max(1, 20_000 // n)
+    return {
+        "n": n,
+        "mem_dict_kb":    measure_memory(make_dicts, n) / 1024,
+        "mem_state_kb":   measure_memory(make_states, n) / 1024,
+        "update_dict_us":  per_call_us(dict_update, 100_000),
+        "update_state_us": per_call_us(state_update, 100_000),
+        "ui_dict_us":     per_call_us(lambda: legacy_to_ui(dicts), ui_number),
+        "ui_state_us":    per_call_us(lambda: list(states.values()), ui_number),
+    }
+
+
+def main():
+    header = (f"{'tasks':>6} | {'mem dict':>10} {'mem state':>10} | "
+              f"{'upd dict':>9} {'upd state':>9} | {'UI dict':>11} {'UI state':>10}")
+    print(header)
+    print("-" * len(header))
+    for n in SIZES:
+        r = bench(n)
+        print(f"{r['n']:>6} | {r['mem_dict_kb']:>8.0f}KB {r['mem_state_kb']:>8.0f}KB | "
+              f"{r['update_dict_us']:>7.2f}us {r['update_state_us']:>7.2f}us | "
+              f"{r['ui_dict_us']:>9.0f}us {r['ui_state_us']:>8.1f}us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+"""
+Генератор истории для нагрузочных тестов слоя БД.
+
+Заполняет схему lt_db годами «прожитых» дней: DayPlan с подведёнными
+итогами, задачи со смесью приоритетов и статусов, транзакции монет
+(итоги дней и покупки), награды, пользовательские шаблоны и пресеты.
+Монеты и штрафы считаются функциями gamification — как при настоящем
+finalize_day. Всё детерминировано seed'ом; вставка — пакетами
+(executemany INSERT), год истории генерируется за секунды.
+
+    eng = datagen.memory_engine()
+    datagen.install(eng)                    # lt_db/repository смотрят в eng
+    datagen.generate(eng, days=365, seed=1)
+
+Из командной строки — SQLite-файл:
+    python -m benchmarks.datagen --days 1825 --tasks-per-day 10 --out history.db
+"""
+import sys, os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import math
+import random
+import uuid
+from datetime import date, datetime, timedelta
+from types import SimpleNamespace
+from typing import Optional
+
+from sqlalchemy import create_engine, insert, func, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+import lt_db
+import gamification as gami
+from lt_db import (
+    DayPlan, Task, CoinBalance, CoinTransaction, Reward, Template,
+    Preset, PresetItem, TaskStatus, RewardType, Priority, minute_of_day,
+)
+
+CHUNK = 5_000       # строк на один executemany
+# Доли приоритетов: HIGH / NORMAL / LOW
+PRIORITY_MIX = (0.2, 0.6, 0.2)
+# Доли исходов задачи: выполнена / пропущена / осталась незавершённой
+STATUS_MIX = (0.75, 0.10, 0.15)
+
+TASK_NAMES = (
+    "Сон", "Утренние ритуалы", "Завтрак", "Обед", "Ужин", "Зарядка",
+    "Спорт", "Прогулка", "Медитация", "Дневник", "Уборка", "Покупки",
+    "Работа", "Созвон", "Код-ревью", "Чтение", "Английский", "Почта",
+)
+
+
+# ──────────────────────────────────────────────
+#  Движки БД
+# ──────────────────────────────────────────────
+
+def memory_engine() -> Engine:
+    """In-memory SQLite, общий для всех потоков и сессий."""
+    return create_engine("sqlite://", poolclass=StaticPool,
+                         connect_args={"check_same_thread": False})
+
+
+def sqlite_engine(path: str, pragmas: Optional[dict] = None) -> Engine:
+    """SQLite-файл с PRAGMA-профилем приложения (lt_db.make_engine)."""
+    return lt_db.make_engine(f"sqlite:///{path}", pragmas=pragmas)
+
+
+def install(eng: Engine):
+    """Делает eng движком приложения (lt_db.engine) и создаёт схему."""
+    lt_db.engine = eng
+    lt_db.init_db()
+
+
+# ──────────────────────────────────────────────
+#  Генерация
+# ──────────────────────────────────────────────
+
+def generate(eng: Engine, days: int = 365, tasks_per_day: int = 8,
+             seed: int = 0, end: Optional[date] = None,
+             priority_mix: tuple = PRIORITY_MIX, status_mix: tuple = STATUS_MIX,
+             rewards: int = 20, purchases_per_week: float = 1.0,
+             user_templates: int = 30, user_presets: int = 10) -> dict:
+    """
+    Пишет days дней истории, заканчивая end (по умолчанию — вчера).
+    Схема уже должна существовать (install). Возвращает число строк по таблицам.
+    """
+    rng = random.Random(seed)
+    end = end or date.today() - timedelta(days=1)
+    start = end - timedelta(days=days - 1)
+    priorities = (Priority.HIGH, Priority.NORMAL, Priority.LOW)
+    statuses = (TaskStatus.COMPLETED, TaskStatus.SKIPPED, TaskStatus.PENDING)
+
+    with Session(eng) as s:
+        plan_id = (s.scalar(select(func.max(DayPlan.id))) or 0) + 1
+        template_ids = _insert_templates(s, rng, user_templates)
+        _insert_presets(s, rng, user_presets, template_ids)
+        reward_rows = _insert_rewards(s, rng, rewards)
+
+        plans, tasks, transactions = [], [], []
+        balance = streak = 0
+        for offset in range(days):
+            d = start + timedelta(days=offset)
+            day_start = datetime.combine(d, datetime.min.time())
+            n = max(1, round(rng.gauss(tasks_per_day, tasks_per_day / 4)))
+            bonus = penalty = 0
+            for position in range(n):
+                task = _make_task(rng, plan_id, position, day_start,
+                                  rng.choices(priorities, priority_mix)[0],
+                                  rng.choices(statuses, status_mix)[0])
+                b, p = _task_coins(task)
+                task["coins_earned"], task["coins_penalty"] = b, p
+                bonus += b
+                penalty += p
+                tasks.append(task)
+
+            # Итог дня — как gamification.finalize_day
+            multiplier = gami.calc_streak_multiplier(streak)
+            day_total = math.floor((bonus - penalty) * multiplier)
+            streak = 0 if day_total < 0 else streak + 1
+            plans.append({
+                "id": plan_id, "date": d,
+                "procrastination_used": rng.randint(0, 6 * 3600),
+                "day_bonus": bonus, "day_penalty": penalty,
+                "day_total": day_total, "day_finalized": True,
+            })
+            end_of_day = day_start + timedelta(days=1)
+            if day_total:
+                balance = max(0, balance + day_total)
+                transactions.append({
+                    "created_at": end_of_day, "amount": day_total, "plan_date": d,
+                    "reason": f"Итог дня {d} (×{multiplier:.1f} стрик)",
+                })
+            if reward_rows and rng.random() < purchases_per_week / 7:
+                reward = rng.choice(reward_rows)
+                if balance >= reward["price"]:
+                    balance -= reward["price"]
+                    transactions.append({
+                        "created_at": end_of_day - timedelta(hours=rng.randint(1, 12)),
+                        "amount": -reward["price"], "reward_id": reward["id"],
+                        "reason": f"Покупка: {reward['name']}",
+                    })
+            plan_id += 1
+
+        _bulk(s, DayPlan, plans)
+        _bulk(s, Task, tasks)
+        _bulk(s, CoinTransaction, transactions)
+        bal = s.get(CoinBalance, 1) or CoinBalance(id=1)
+        bal.balance, bal.streak = balance, streak
+        s.add(bal)
+        s.commit()
+
+    return {
+        "day_plans": len(plans), "tasks": len(tasks),
+        "coin_transactions": len(transactions), "rewards": len(reward_rows),
+        "templates": len(template_ids), "presets": user_presets,
+    }
+
+
+def _make_task(rng: random.Random, plan_id: int, position: int,
+               day_start: datetime, priority: Priority, status: TaskStatus) -> dict:
+    allocated = rng.choice((10, 15, 20, 30, 45, 60, 90, 120)) * 60
+    if status == TaskStatus.COMPLETED:
+        elapsed = int(allocated * rng.uniform(0.5, 2.5))
+    elif status == TaskStatus.SKIPPED:
+        elapsed = int(allocated * rng.uniform(0.0, 0.5))
+    else:
+        elapsed = int(allocated * rng.uniform(0.0, 0.9))
+    scheduled = None
+    if rng.random() < 0.3:
+        scheduled = f"{rng.randint(6, 22):02d}:{rng.choice((0, 15, 30, 45)):02d}"
+    created = day_start + timedelta(minutes=rng.randint(0, 9 * 60))
+    finished = status in (TaskStatus.COMPLETED, TaskStatus.SKIPPED)
+    return {
+        "id": str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+        "plan_id": plan_id,
+        "name": rng.choice(TASK_NAMES),
+        "allocated_seconds": allocated,
+        "elapsed_seconds": elapsed,
+        "overrun_seconds": max(0, elapsed - allocated),
+        "status": status,
+        "scheduled_time": scheduled,
+        # executemany мимо ORM — @validates не срабатывает
+        "scheduled_minute": minute_of_day(scheduled),
+        "position": position,
+        "created_at": created,
+        "completed_at": created + timedelta(seconds=elapsed) if finished else None,
+        "priority": priority,
+        "carried_over": status == TaskStatus.PENDING and rng.random() < 0.5,
+    }
+
+
+def _task_coins(task: dict) -> tuple[int, int]:
+    """(бонус, штраф) задачи — правилами gamification.finalize_day."""
+    t = SimpleNamespace(**task)
+    if t.status == TaskStatus.COMPLETED:
+        return gami.calc_task_bonus(t), gami.calc_task_penalty(t)
+    if t.status == TaskStatus.SKIPPED:
+        return 0, gami.calc_task_penalty(t)
+    if t.carried_over:
+        return 0, gami.calc_postpone_penalty(t)
+    return 0, gami.calc_task_penalty(t)
+
+
+def _insert_templates(s: Session, rng: random.Random, n: int) -> list[int]:
+    """Пользовательские шаблоны; возвращает id всех шаблонов (со встроенными)."""
+    categories = ("👤 Мои шаблоны", "💼 Работа", "📚 Учёба")
+    _bulk(s, Template, [
+        {"name": f"{rng.choice(TASK_NAMES)} #{i}", "category": rng.choice(categories),
+         "allocated_seconds": rng.choice((15, 30, 45, 60, 90)) * 60, "is_builtin": False}
+        for i in range(n)
+    ])
+    return list(s.scalars(select(Template.id)))
+
+
+def _insert_presets(s: Session, rng: random.Random, n: int, template_ids: list[int]):
+    if not template_ids:
+        return
+    first = (s.scalar(select(func.max(Preset.id))) or 0) + 1
+    _bulk(s, Preset, [{"id": first + i, "name": f"Пресет {i}", "is_builtin": False}
+                      for i in range(n)])
+    _bulk(s, PresetItem, [
+        {"preset_id": first + i, "template_id": tid, "position": pos}
+        for i in range(n)
+        for pos, tid in enumerate(rng.sample(template_ids, min(len(template_ids),
+                                                               rng.randint(3, 8))))
+    ])
+
+
+def _insert_rewards(s: Session, rng: random.Random, n: int) -> list[dict]:
+    first = (s.scalar(select(func.max(Reward.id))) or 0) + 1
+    rows = []
+    for i in range(n):
+        kind = rng.choice(tuple(RewardType))
+        count = rng.randint(1, 10) if kind == RewardType.LIMITED else None
+        rows.append({
+            "id": first + i, "name": f"Награда {i}", "price": rng.randint(5, 200),
+            "reward_type": kind, "count": count, "count_initial": count,
+            "task_duration_minutes": rng.choice((30, 60)) if kind == RewardType.SUBSCRIPTION else None,
+        })
+    _bulk(s, Reward, rows)
+    return rows
+
+
+def _bulk(s: Session, model, rows: list[dict]):
+    for i in range(0, len(rows), CHUNK):
+        s.execute(insert(model), rows[i:i + CHUNK])
+
+
+# ──────────────────────────────────────────────
+#  CLI
+# ──────────────────────────────────────────────
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.datagen")
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--tasks-per-day", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", required=True, help="путь к SQLite-файлу (перезаписывается)")
+    args = parser.parse_args()
+
+    if os.path.exists(args.out):
+        os.remove(args.out)
+    eng = sqlite_engine(args.out)
+    install(eng)
+    started = datetime.now()
+    counts = generate(eng, days=args.days, tasks_per_day=args.tasks_per_day, seed=args.seed)
+    elapsed = (datetime.now() - started).total_seconds()
+    print(", ".join(f"{k}: {v}" for k, v in counts.items()) + f" — за {elapsed:.1f}с")
+
+
+if __name__ == "__main__":
+    main()
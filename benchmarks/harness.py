@@ -0,0 +1,119 @@
+"""
+Общая обвязка бенчмарков: замер, JSON-результаты, сравнение с эталоном.
+
+Результат набора — плоский словарь {"метрика/размер": {"us": ...}, ...};
+в JSON рядом кладётся окружение (python, платформа), чтобы эталоны
+с разных машин не сравнивали вслепую.
+
+    python -m benchmarks.bench_engine --json out.json
+    python -m benchmarks.bench_engine --compare benchmarks/baseline_engine.json
+
+--compare завершается с кодом 1, если какая-то метрика медленнее
+эталона больше чем на --tolerance (по умолчанию 25%) или вырос
+счётчик (число SQL-выражений на вызов и т.п.).
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+import timeit
+from datetime import datetime
+from typing import Callable
+
+TARGET_SECONDS = 0.05   # на один повтор замера
+TOLERANCE = 0.25
+
+
+def per_call_us(fn: Callable, number: int = 0, repeat: int = 5) -> float:
+    """Лучшее из repeat время одного вызова, мкс. number=0 — подобрать самому."""
+    if not number:
+        number = calibrate(fn)
+    return min(timeit.repeat(fn, number=number, repeat=repeat)) / number * 1e6
+
+
+def calibrate(fn: Callable) -> int:
+    """Сколько вызовов укладывается примерно в TARGET_SECONDS."""
+    number = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        if time.perf_counter() - started >= TARGET_SECONDS / 10 or number >= 1_000_000:
+            elapsed = (time.perf_counter() - started) / number
+            return max(1, int(TARGET_SECONDS / max(elapsed, 1e-9)))
+        number *= 10
+
+
+def environment() -> dict:
+    return {
+        "python":   platform.python_version(),
+        "platform": platform.platform(),
+        "machine":  platform.machine(),
+        "date":     datetime.now().isoformat(timespec="seconds"),
+    }
+
+
+def write_json(path: str, suite: str, results: dict):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"suite": suite, "env": environment(), "results": results},
+                  f, ensure_ascii=False, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def percentiles(samples: list[float], points=(50, 95, 99)) -> dict:
+    """{"p50": ..., "p95": ..., "p99": ..., "max": ...} по выборке (ближайший ранг)."""
+    ordered = sorted(samples)
+    result = {f"p{p}": ordered[min(len(ordered) - 1, max(0, round(p / 100 * len(ordered)) - 1))]
+              for p in points}
+    result["max"] = ordered[-1]
+    return result
+
+
+def compare(results: dict, baseline: dict, tolerance: float = TOLERANCE,
+            fields: tuple = ("us",), exact: tuple = ()) -> list[str]:
+    """
+    Регрессии относительно эталона: поле из fields выросло больше чем на
+    tolerance, поле из exact (счётчики — число SQL и т.п.) выросло вообще.
+    """
+    regressions = []
+    for key, old in baseline.items():
+        new = results.get(key)
+        if new is None:
+            continue
+        for field in fields + exact:
+            if field not in old or field not in new:
+                continue
+            limit = old[field] if field in exact else old[field] * (1 + tolerance)
+            if new[field] > limit:
+                ratio = f" (×{new[field] / old[field]:.2f})" if old[field] else ""
+                regressions.append(f"{key}: {field} {old[field]:.2f} → {new[field]:.2f}{ratio}")
+    return regressions
+
+
+def main(suite: str, run: Callable[[tuple], dict], sizes: tuple,
+         print_table: Callable[[dict], None],
+         fields: tuple = ("us",), exact: tuple = ()):
+    """CLI набора: run(sizes) → результаты; печать, --json, --compare (см. compare)."""
+    parser = argparse.ArgumentParser(prog=f"python -m benchmarks.bench_{suite}")
+    parser.add_argument("--sizes", type=lambda s: tuple(int(x) for x in s.split(",")),
+                        default=sizes, help="через запятую, по умолчанию %(default)s")
+    parser.add_argument("--json", metavar="PATH", help="записать результаты в JSON")
+    parser.add_argument("--compare", metavar="BASELINE", help="сравнить с эталоном")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    args = parser.parse_args()
+
+    results = run(args.sizes)
+    print_table(results)
+    if args.json:
+        write_json(args.json, suite, results)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.tolerance, fields, exact)
+        if regressions:
+            print(f"\nРегрессии (> {args.tolerance:.0%}):")
+            for line in regressions:
+                print("  " + line)
+            sys.exit(1)
+        print(f"\nРегрессий нет (допуск {args.tolerance:.0%})")
@@ -0,0 +1,74 @@
+"""
+Источник времени для движка, уведомлений, валидации и UI.
+
+SystemClock — настоящее время; VirtualClock — управляемое вручную
+(тесты, simulation.py): сутки прогоняются за миллисекунды.
+
+  monotonic()  — для отрезков учёта (как time.monotonic)
+  time()       — unix-время (метки журнала)
+  now()        — локальные дата/время (полночь, scheduled_time)
+  today()      — текущая дата
+"""
+import time as _time
+from abc import ABC, abstractmethod
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+
+class Clock(ABC):
+
+    @abstractmethod
+    def monotonic(self) -> float: ...
+
+    @abstractmethod
+    def time(self) -> float: ...
+
+    @abstractmethod
+    def now(self) -> datetime: ...
+
+    def today(self) -> date:
+        return self.now().date()
+
+
+class SystemClock(Clock):
+
+    def monotonic(self) -> float:
+        return _time.monotonic()
+
+    def time(self) -> float:
+        return _time.time()
+
+    def now(self) -> datetime:
+        return datetime.now()
+
+
+class VirtualClock(Clock):
+    """
+    Часы, которые идут только по advance()/advance_to().
+    now() = start + сколько «прошло»; monotonic() начинается с monotonic_start.
+    """
+
+    def __init__(self, start: Optional[datetime] = None, monotonic_start: float = 0.0):
+        self._start = start or datetime.now().replace(microsecond=0)
+        self._origin = monotonic_start
+        self._mono = monotonic_start
+
+    def monotonic(self) -> float:
+        return self._mono
+
+    def time(self) -> float:
+        return self.now().timestamp()
+
+    def now(self) -> datetime:
+        return self._start + timedelta(seconds=self._mono - self._origin)
+
+    def advance(self, seconds: float):
+        if seconds < 0:
+            raise ValueError("Виртуальные часы не идут назад")
+        self._mono += seconds
+
+    def advance_to(self, monotonic: float):
+        self.advance(max(0.0, monotonic - self._mono))
+
+
+SYSTEM_CLOCK = SystemClock()
@@ -0,0 +1,148 @@
+"""
+Счётчик SQL-выражений и времени на вызов репозитория (поиск N+1).
+
+Подписка на события SQLAlchemy Engine (класс, а не экземпляр — работает
+и после подмены lt_db.engine в тестах) ставится лениво — при первом замере;
+до тех пор выполнение выражений ничего не стоит. Каждое выражение
+засчитывается всем открытым в этом потоке замерам.
+
+    with count_queries() as q:          # тесты
+        repo.get_user_presets_as_dicts()
+    assert q.statements <= 2
+
+@instrumented на отдельных функциях repository.py — только при
+LIFE_TIMER_DB_STATS=1 (иначе функция не оборачивается): на каждый вызов —
+число выражений и время в stats(); вызов, превысивший STATEMENT_BUDGET
+выражений, пишется в лог предупреждением.
+"""
+import functools
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+log = logging.getLogger(__name__)
+
+# Больше стольких выражений на один вызов репозитория — предупреждение в лог
+STATEMENT_BUDGET = 10
+# instrumented оборачивает функции только при включённом счётчике (на импорте)
+ENABLED = os.environ.get("LIFE_TIMER_DB_STATS") == "1"
+
+
+class QueryCount:
+    """Итог замера: выражения, время в БД и всего (секунды)."""
+    __slots__ = ("statements", "db_seconds", "seconds")
+
+    def __init__(self):
+        self.statements = 0
+        self.db_seconds = 0.0
+        self.seconds = 0.0
+
+    def __repr__(self):
+        return (f"QueryCount(statements={self.statements}, "
+                f"db={self.db_seconds * 1e3:.2f}ms, total={self.seconds * 1e3:.2f}ms)")
+
+
+_local = threading.local()          # .active — открытые замеры потока
+_stats_lock = threading.Lock()
+_stats: dict[str, dict] = {}        # имя функции → накопленные счётчики
+_listening = False
+
+
+def _active() -> list:
+    active = getattr(_local, "active", None)
+    if active is None:
+        active = _local.active = []
+    return active
+
+
+def _listen():
+    """Подписка на события Engine — один раз, при первом замере."""
+    global _listening
+    with _stats_lock:
+        if not _listening:
+            event.listen(Engine, "before_cursor_execute", _before_execute)
+            event.listen(Engine, "after_cursor_execute", _after_execute)
+            _listening = True
+
+
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    if _active():
+        conn.info.setdefault("db_stats_started", []).append(time.perf_counter())
+
+
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    active = _active()
+    if not active:
+        return
+    started = conn.info.get("db_stats_started")
+    elapsed = time.perf_counter() - started.pop() if started else 0.0
+    for q in active:
+        q.statements += 1
+        q.db_seconds += elapsed
+
+
+@contextmanager
+def count_queries() -> Iterator[QueryCount]:
+    """Считает выражения, выполненные в этом потоке внутри with."""
+    if not _listening:
+        _listen()
+    q = QueryCount()
+    active = _active()
+    active.append(q)
+    started = time.perf_counter()
+    try:
+        yield q
+    finally:
+        q.seconds = time.perf_counter() - started
+        active.remove(q)
+
+
+def instrumented(fn: Callable) -> Callable:
+    """
+    Обёртка функции репозитория: счётчики в stats(), лог при превышении
+    бюджета. Без ENABLED возвращает fn как есть.
+    """
+    if not ENABLED:
+        return fn
+    name = fn.__name__
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with count_queries() as q:
+            result = fn(*args, **kwargs)
+        _record(name, q)
+        return result
+    return wrapper
+
+
+def _record(name: str, q: QueryCount):
+    with _stats_lock:
+        s = _stats.get(name)
+        if s is None:
+            s = _stats[name] = {"calls": 0, "statements": 0, "max_statements": 0,
+                                "db_seconds": 0.0, "seconds": 0.0}
+        s["calls"] += 1
+        s["statements"] += q.statements
+        s["max_statements"] = max(s["max_statements"], q.statements)
+        s["db_seconds"] += q.db_seconds
+        s["seconds"] += q.seconds
+    if q.statements > STATEMENT_BUDGET:
+        log.warning("%s: %d SQL-выражений за вызов (бюджет %d), %.1f мс",
+                    name, q.statements, STATEMENT_BUDGET, q.seconds * 1e3)
+
+
+def stats() -> dict[str, dict]:
+    """Копия накопленных счётчиков по функциям."""
+    with _stats_lock:
+        return {name: dict(s) for name, s in _stats.items()}
+
+
+def reset():
+    with _stats_lock:
+        _stats.clear()
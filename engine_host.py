@@ -0,0 +1,200 @@
+"""
+EngineHost — много TimerEngine в одном процессе (серверный режим).
+
+Все движки — клиенты одного Scheduler (один поток на всех), сами в БД
+не пишут (autoflush=False). Изменения собирает хост: раз в SAVE_INTERVAL
+забирает dirty-строки у всех движков и пишет их одной транзакцией
+(repo.flush_engine_states) — вместо отдельной транзакции на каждый движок.
+
+Ключ движка (key) выбирает вызывающий — id пользователя, сессии и т.п.
+Один план — не больше одного движка. В полночь движок сам переходит на
+план следующего дня (старый пишет синхронно), хост только перевешивает ключ.
+"""
+import threading
+from typing import Callable, Hashable, Optional
+
+import repository as repo
+from clock import Clock, SYSTEM_CLOCK
+from lt_db import Settings
+from scheduler import Scheduler
+from timer import TimerEngine
+
+
+class EngineHost:
+    SAVE_INTERVAL = TimerEngine.SAVE_INTERVAL
+
+    def __init__(self, scheduler: Optional[Scheduler] = None,
+                 clock: Clock = SYSTEM_CLOCK):
+        self.scheduler = scheduler or Scheduler()
+        self.clock = clock
+        self._owns_scheduler = scheduler is None
+        self._engines: dict[Hashable, TimerEngine] = {}
+        self._plans: dict[int, Hashable] = {}       # plan_id → key
+        self._lock = threading.Lock()
+        self._running = False
+        self._last_flush = clock.monotonic()
+        self.flush_stats = {"flushes": 0, "engines": 0, "rows": 0, "statements": 0}
+
+    # ──────────────────────────────────────────────
+    #  Жизненный цикл хоста
+    # ──────────────────────────────────────────────
+
+    def start(self):
+        self._running = True
+        self._last_flush = self.clock.monotonic()
+        if self._owns_scheduler:
+            self.scheduler.start()
+        self.scheduler.reschedule(self)
+
+    def stop(self):
+        """Останавливает все движки и пишет их состояние одной транзакцией."""
+        self._running = False
+        self.scheduler.remove(self)
+        with self._lock:
+            engines = list(self._engines.values())
+            self._engines.clear()
+            self._plans.clear()
+        for engine in engines:
+            engine.stop()
+        self._flush_engines(engines)
+        if self._owns_scheduler:
+            self.scheduler.stop()
+
+    # ──────────────────────────────────────────────
+    #  Движки
+    # ──────────────────────────────────────────────
+
+    def start_engine(self, key: Hashable, plan_id: int, settings: Settings,
+                     on_tick: Optional[Callable] = None) -> TimerEngine:
+        """
+        Поднимает движок для плана (или возвращает уже запущенный под этим ключом).
+        Загрузка из БД — вне _lock хоста: get/query/flush не ждут чужих загрузок.
+        Ключ и план проверяются до загрузки и ещё раз при регистрации —
+        параллельный start_engine мог успеть первым.
+        """
+        with self._lock:
+            existing = self._registered(key, plan_id)
+        if existing is not None:
+            return existing
+        engine = TimerEngine(plan_id, settings, on_tick=on_tick,
+                             scheduler=self.scheduler, autoflush=False,
+                             clock=self.clock)
+        with self._lock:
+            existing = self._registered(key, plan_id)
+            if existing is not None:
+                return existing         # загруженный движок не запущен — просто забываем
+            self._engines[key] = engine
+            self._plans[plan_id] = key
+        engine.add_listener(self._plan_tracker(key, plan_id))
+        engine.start()
+        return engine
+
+    def _registered(self, key: Hashable, plan_id: int) -> Optional[TimerEngine]:
+        """Под _lock: уже запущенный движок ключа; занятый ключ или план — ValueError."""
+        engine = self._engines.get(key)
+        if engine is not None:
+            if engine.plan_id != plan_id:
+                raise ValueError(f"Ключ {key!r} уже занят планом {engine.plan_id}")
+            return engine
+        if plan_id in self._plans:
+            raise ValueError(f"План {plan_id} уже обслуживает {self._plans[plan_id]!r}")
+        return None
+
+    def _plan_tracker(self, key: Hashable, plan_id: int) -> Callable:
+        """Listener движка: после смены суток план ключа — уже другой."""
+        current = [plan_id]
+
+        def on_change(kind: str, _task_id):
+            if kind != "rollover":
+                return
+            with self._lock:
+                engine = self._engines.get(key)
+                if engine is None:
+                    return
+                if self._plans.get(current[0]) == key:
+                    del self._plans[current[0]]
+                current[0] = engine.plan_id
+                self._plans[current[0]] = key
+        return on_change
+
+    def stop_engine(self, key: Hashable):
+        """Останавливает движок и сразу пишет его несохранённые изменения."""
+        with self._lock:
+            engine = self._engines.pop(key, None)
+            if engine is None:
+                return
+            self._plans.pop(engine.plan_id, None)
+        engine.stop()
+        self._flush_engines([engine])
+
+    def get(self, key: Hashable) -> Optional[TimerEngine]:
+        with self._lock:
+            return self._engines.get(key)
+
+    def query(self, key: Hashable) -> Optional[dict]:
+        """Срез состояния движка для API; None если ключ не запущен."""
+        engine = self.get(key)
+        if engine is None:
+            return None
+        return {
+            "plan_id":                   engine.plan_id,
+            "active_task_id":            engine.active_task_id,
+            "procrastination_used":      engine.get_proc_used(),
+            "procrastination_remaining": engine.procrastination_remaining(),
+            "tasks":                     engine.get_tasks(),
+        }
+
+    def __len__(self) -> int:
+        return len(self._engines)
+
+    # ──────────────────────────────────────────────
+    #  Пакетный flush
+    # ──────────────────────────────────────────────
+
+    def flush(self):
+        with self._lock:
+            engines = list(self._engines.values())
+        self._flush_engines(engines)
+
+    def _flush_engines(self, engines: list[TimerEngine]):
+        batch, taken = [], []
+        for engine in engines:
+            # plan_id — под тем же _lock: смена суток не вклинится между ними
+            with engine._lock:
+                plan_id = engine.plan_id
+                plan_fields, rows, undo = engine._collect_changes()
+            if rows or plan_fields:
+                batch.append((plan_id, plan_fields, rows))
+                taken.append((engine, plan_fields, undo))
+
+        statements = 0
+        if batch:
+            try:
+                statements = repo.flush_engine_states(batch)
+            except Exception:
+                for engine, _, undo in taken:
+                    engine._restore_changes(undo)
+                raise
+            for engine, plan_fields, _ in taken:
+                engine._commit_changes(plan_fields)
+
+        stats = self.flush_stats
+        stats["flushes"] += 1
+        stats["engines"] += len(batch)
+        stats["rows"] += sum(len(rows) for _, _, rows in batch)
+        stats["statements"] += statements
+
+    # ──────────────────────────────────────────────
+    #  Клиент Scheduler
+    # ──────────────────────────────────────────────
+
+    def next_deadline(self) -> Optional[float]:
+        if not self._running:
+            return None
+        return self._last_flush + self.SAVE_INTERVAL
+
+    def on_deadline(self, now: float):
+        if now - self._last_flush < self.SAVE_INTERVAL:
+            return
+        self._last_flush = now
+        self.flush()
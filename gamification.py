@@ -182,7 +182,13 @@ def finalize_day(plan_date: date) -> Optional[dict]:
     - начисляет коины
     - обновляет стрик
     Возвращает итоговый словарь или None если уже подведён.
+    Всё — одной транзакцией: итог, коины и стрик либо записаны вместе, либо нет.
     """
+    with repo.unit_of_work():
+        return _finalize_day(plan_date)
+
+
+def _finalize_day(plan_date: date) -> Optional[dict]:
     settings = repo.get_settings()
     if not settings.gamification_enabled:
         return None
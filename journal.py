@@ -0,0 +1,139 @@
+"""
+Append-only журнал событий TimerEngine (по файлу на план).
+
+Между чекпоинтами движок не переписывает строки в БД, а дописывает в журнал
+короткие записи — по одной JSON-строке:
+    {"seq": 42, "t": 1760000000.5, "k": "activate", "id": "<task_id>"}
+
+  seq — сквозной номер записи, t — time.time() события, k — вид:
+    start / stop            — границы сессии (время между ними не считается)
+    activate / deactivate / complete / skip / overrun / edit
+    mark                    — «движок жив» раз в SAVE_INTERVAL
+    ckpt                    — чекпоинт; несёт active — активную задачу
+
+Чекпоинт: запись ckpt → состояние + её seq в БД (day_plans.journal_seq)
+одной транзакцией → compact() отрезает всё, что раньше ckpt.
+После смены суток журнал старого плана удаляется целиком (remove()),
+как только его последний чекпоинт записан. Журналы других планов,
+оставшиеся с прошлых запусков (падение до полуночи, закрытие приложения),
+при старте дописывает в БД TimerEngine.recover_journals.
+При старте TimerEngine._load_state берёт БД и проигрывает записи с
+seq >= journal_seq (см. TimerEngine._replay).
+
+Каждая запись сразу уходит в ОС (переживает падение процесса);
+fsync=True — ещё и падение питания, ценой fsync на запись.
+"""
+import json
+import os
+import threading
+from typing import Optional
+
+from lt_db import DB_PATH
+
+JOURNAL_DIR = os.path.join(os.path.dirname(DB_PATH), "journal")
+
+
+class Journal:
+
+    def __init__(self, path: str, fsync: bool = False):
+        self.path = path
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        records, good = self._read()
+        if os.path.exists(path) and os.path.getsize(path) > good:
+            os.truncate(path, good)     # недописанная строка после падения
+        self._seq = records[-1]["seq"] if records else 0
+        self._file = open(path, "a", encoding="utf-8")
+
+    @classmethod
+    def for_plan(cls, plan_id: int, **kwargs) -> "Journal":
+        return cls(os.path.join(JOURNAL_DIR, f"plan_{plan_id}.jsonl"), **kwargs)
+
+    @staticmethod
+    def plan_journals(directory: str = JOURNAL_DIR) -> dict[int, str]:
+        """Журналы в каталоге: plan_id → путь к файлу."""
+        if not os.path.isdir(directory):
+            return {}
+        found = {}
+        for name in os.listdir(directory):
+            stem, ext = os.path.splitext(name)
+            if ext == ".jsonl" and stem.startswith("plan_") and stem[5:].isdecimal():
+                found[int(stem[5:])] = os.path.join(directory, name)
+        return found
+
+    @property
+    def seq(self) -> int:
+        return self._seq
+
+    def ensure_seq(self, seq: int):
+        """Номера не должны идти назад, даже если файл журнала потерян."""
+        with self._lock:
+            self._seq = max(self._seq, seq)
+
+    def append(self, kind: str, t: float, task_id: Optional[str] = None, **data) -> int:
+        with self._lock:
+            self._seq += 1
+            record = {"seq": self._seq, "t": t, "k": kind}
+            if task_id is not None:
+                record["id"] = task_id
+            record.update(data)
+            self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+            return self._seq
+
+    def read_from(self, seq: int) -> list[dict]:
+        """Записи с номером >= seq, по порядку."""
+        with self._lock:
+            return [r for r in self._read()[0] if r["seq"] >= seq]
+
+    def compact(self, seq: int):
+        """Отбрасывает записи раньше seq (обычно — до последнего чекпоинта)."""
+        with self._lock:
+            keep = [r for r in self._read()[0] if r["seq"] >= seq]
+            tmp = self.path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                for r in keep:
+                    f.write(json.dumps(r, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            closed = self._file.closed
+            self._file.close()
+            os.replace(tmp, self.path)
+            if not closed:
+                self._file = open(self.path, "a", encoding="utf-8")
+
+    def rotate(self, plan_id: int) -> "Journal":
+        """Закрывает этот журнал и открывает журнал плана plan_id рядом с ним."""
+        self.close()
+        path = os.path.join(os.path.dirname(self.path), f"plan_{plan_id}.jsonl")
+        return Journal(path, fsync=self.fsync)
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+    def remove(self):
+        """Закрывает журнал и удаляет файл — когда его чекпоинт уже в БД."""
+        with self._lock:
+            self._file.close()
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+    def _read(self) -> tuple[list[dict], int]:
+        """Все целые записи + длина файла в байтах, которую они занимают."""
+        if not os.path.exists(self.path):
+            return [], 0
+        records, good = [], 0
+        with open(self.path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    break
+                good += len(line)
+        return records, good
@@ -4,17 +4,58 @@ SQLite локально → Postgres на сервере (один и тот ж
 """
 from datetime import datetime, date
 from sqlalchemy import (
-    create_engine, Column, String, Integer, Boolean,
-    Float, DateTime, Date, ForeignKey, Enum as SAEnum, Text
+    create_engine, event, inspect, text, Column, String, Integer, Boolean,
+    Float, DateTime, Date, ForeignKey, Enum as SAEnum, Text, Index
 )
-from sqlalchemy.orm import DeclarativeBase, relationship, Session
+from sqlalchemy.orm import DeclarativeBase, relationship, Session, validates
+from typing import Optional
 import enum
+import functools
 import os
 
 DB_PATH = os.path.expanduser("~/.life_timer/life_timer.db")
 os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
 
-engine = create_engine(f"sqlite:///{DB_PATH}", echo=False)
+# Профиль соединения SQLite: PRAGMA на каждое новое соединение пула.
+#   WAL          — читатели не блокируют писателя и наоборот; commit пишет в -wal
+#   NORMAL       — fsync на чекпоинте WAL, а не на каждом commit (при падении
+#                  питания теряются последние транзакции, но не целостность)
+#   busy_timeout — ждать блокировку (поток записи + UI), а не падать с «locked»
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous":  "NORMAL",
+    "busy_timeout": 5000,              # мс
+    "cache_size":   -16_000,           # < 0 — в КиБ: ~16 МБ страничного кэша
+    "mmap_size":    64 * 1024 * 1024,  # байт
+    "temp_store":   "MEMORY",
+}
+
+
+def make_engine(url: str = f"sqlite:///{DB_PATH}", pragmas: Optional[dict] = None, **kwargs):
+    """
+    create_engine + PRAGMA-профиль для SQLite (pragmas=None — SQLITE_PRAGMAS,
+    {} — без профиля). Для других СУБД — просто create_engine.
+    """
+    eng = create_engine(url, **kwargs)
+    if eng.dialect.name == "sqlite":
+        apply_pragmas(eng, SQLITE_PRAGMAS if pragmas is None else pragmas)
+    return eng
+
+
+def apply_pragmas(eng, pragmas: dict):
+    """Выполнять pragmas на каждом новом DBAPI-соединении eng."""
+    if not pragmas:
+        return
+
+    @event.listens_for(eng, "connect")
+    def _set_pragmas(dbapi_conn, connection_record):
+        cursor = dbapi_conn.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+
+engine = make_engine(echo=False)
 
 
 class Base(DeclarativeBase):
@@ -79,12 +120,32 @@ class Settings(Base):
 #  Планы и задачи
 # ──────────────────────────────────────────────
 
+@functools.lru_cache(maxsize=4096)
+def minute_of_day(hhmm: Optional[str]) -> Optional[int]:
+    """
+    "HH:MM" → минуты от полуночи; None если пусто/некорректно.
+    Принимает то же, что strptime("%H:%M"): одна или две цифры ("9:5").
+    Кэшируется: TaskState/adapter.Task читают это на горячем пути.
+    """
+    if not hhmm:
+        return None
+    h, sep, m = hhmm.partition(":")
+    if not (sep and 0 < len(h) <= 2 and 0 < len(m) <= 2
+            and h.isdecimal() and m.isdecimal()):
+        return None
+    h, m = int(h), int(m)
+    if h > 23 or m > 59:
+        return None
+    return h * 60 + m
+
+
 class DayPlan(Base):
     __tablename__ = "day_plans"
 
     id                   = Column(Integer, primary_key=True, autoincrement=True)
     date                 = Column(Date, unique=True, nullable=False, index=True)
     procrastination_used = Column(Integer, default=0)  # секунды
+    journal_seq          = Column(Integer, default=0)  # последний чекпоинт журнала
     # Геймификация — итоги дня
     day_bonus            = Column(Integer, default=0)
     day_penalty          = Column(Integer, default=0)
@@ -106,6 +167,7 @@ class Task(Base):
     overrun_seconds   = Column(Integer, default=0)
     status            = Column(SAEnum(TaskStatus), default=TaskStatus.PENDING)
     scheduled_time    = Column(String, nullable=True)      # "HH:MM"
+    scheduled_minute  = Column(Integer, nullable=True)     # то же в минутах от полуночи
     position          = Column(Integer, default=0)         # для сортировки
     created_at        = Column(DateTime, default=datetime.now)
     completed_at      = Column(DateTime, nullable=True)
@@ -120,6 +182,17 @@ class Task(Base):
 
     plan = relationship("DayPlan", back_populates="tasks")
 
+    __table_args__ = (
+        Index("ix_tasks_plan_scheduled", "plan_id", "scheduled_minute"),
+        Index("ix_tasks_plan_position", "plan_id", "position"),   # задачи плана по порядку
+    )
+
+    @validates("scheduled_time")
+    def _sync_scheduled_minute(self, key, value):
+        """scheduled_minute всегда следует за scheduled_time."""
+        self.scheduled_minute = minute_of_day(value)
+        return value
+
 
 # ──────────────────────────────────────────────
 #  Геймификация — баланс и история
@@ -144,6 +217,10 @@ class CoinTransaction(Base):
     plan_date   = Column(Date, nullable=True)
     reward_id   = Column(Integer, ForeignKey("rewards.id"), nullable=True)
 
+    __table_args__ = (
+        Index("ix_coin_transactions_created_at", "created_at"),   # история, новые сверху
+    )
+
 
 # ──────────────────────────────────────────────
 #  Магазин
@@ -205,44 +282,147 @@ class PresetItem(Base):
 #  Инициализация
 # ──────────────────────────────────────────────
 
+# Версия схемы хранится в PRAGMA user_version (0 — новая БД или БД до
+# версионирования). MIGRATIONS[i] переводит схему с версии i на i + 1.
+# Шаги идемпотентны: упавшую на середине миграцию можно просто повторить.
+# Правила для больших БД: колонки — ALTER TABLE ADD COLUMN с константным
+# DEFAULT (в SQLite это правка только заголовка схемы, таблица не
+# переписывается), индексы — CREATE INDEX IF NOT EXISTS, пересчёт данных —
+# отдельным шагом и только для строк, которые в нём нуждаются.
+# Новая колонка/индекс: поле в модели + шаг в конце MIGRATIONS.
+
+def _m1_priority_and_carry_over(conn):
+    _add_column_if_missing(conn, "tasks", "priority", "VARCHAR DEFAULT 'normal'")
+    _add_column_if_missing(conn, "tasks", "carried_over", "BOOLEAN DEFAULT 0")
+
+
+def _m2_reward_task_duration(conn):
+    _add_column_if_missing(conn, "rewards", "task_duration_minutes", "INTEGER DEFAULT NULL")
+
+
+def _m3_journal_seq(conn):
+    _add_column_if_missing(conn, "day_plans", "journal_seq", "INTEGER DEFAULT 0")
+
+
+def _m4_scheduled_minute(conn):
+    if _add_column_if_missing(conn, "tasks", "scheduled_minute", "INTEGER DEFAULT NULL"):
+        _backfill_scheduled_minute(conn)
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_tasks_plan_scheduled "
+                      "ON tasks (plan_id, scheduled_minute)"))
+
+
+def _m5_hot_path_indexes(conn):
+    _create_index(conn, Task, "ix_tasks_plan_position")
+    _create_index(conn, CoinTransaction, "ix_coin_transactions_created_at")
+
+
+def _m6_single_digit_minutes(conn):
+    # _m4 не понимал "9:5" (strptime понимал) — у таких строк scheduled_minute NULL
+    _backfill_scheduled_minute(conn)
+
+
+MIGRATIONS = [
+    _m1_priority_and_carry_over,
+    _m2_reward_task_duration,
+    _m3_journal_seq,
+    _m4_scheduled_minute,
+    _m5_hot_path_indexes,
+    _m6_single_digit_minutes,
+]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
 def init_db():
-    """Создаём таблицы и заполняем встроенные шаблоны/пресеты/настройки."""
+    """
+    Создаём/обновляем схему и заполняем встроенные шаблоны/пресеты/настройки.
+    Если схема уже текущей версии — один запрос PRAGMA user_version и всё.
+    Версии и миграции — только для SQLite (PRAGMA); другой СУБД init_db
+    строит новую схему, а существующую обновить не берётся.
+    """
+    with engine.connect() as conn:
+        versioned = conn.dialect.name == "sqlite"
+        version = schema_version(conn) if versioned else 0
+        if version == SCHEMA_VERSION:
+            return
+        fresh = not inspect(conn).get_table_names()
+        if not fresh and not versioned:
+            raise RuntimeError(
+                f"Миграции схемы есть только для SQLite, а БД — {conn.dialect.name}: "
+                f"обновите схему средствами СУБД"
+            )
+
+    # Новая БД: create_all сразу строит текущую схему, миграции не нужны
     Base.metadata.create_all(engine)
-    _migrate(engine)
+    if not fresh:
+        _migrate(engine, version)
     with Session(engine) as s:
         _seed_settings(s)
         _seed_templates(s)
         _seed_presets(s)
         _seed_balance(s)
         s.commit()
+    # Версию — последней: прерванный запуск повторит шаги и сиды целиком
+    if versioned:
+        with engine.connect() as conn:
+            _set_schema_version(conn, SCHEMA_VERSION)
+            conn.commit()
 
 
-def _migrate(eng):
-    """
-    Мягкие миграции — добавляем колонки которых нет.
-    Безопасно: каждая операция проверяет наличие колонки перед ALTER TABLE.
-    """
+def _require_sqlite(conn):
+    """Версия (PRAGMA user_version) и шаги MIGRATIONS (PRAGMA table_info) — SQLite-only."""
+    if conn.dialect.name != "sqlite":
+        raise RuntimeError(f"Версионирование схемы — только для SQLite, не {conn.dialect.name}")
+
+
+def schema_version(conn) -> int:
+    _require_sqlite(conn)
+    return conn.execute(text("PRAGMA user_version")).scalar()
+
+
+def _set_schema_version(conn, version: int):
+    _require_sqlite(conn)
+    conn.execute(text(f"PRAGMA user_version = {int(version)}"))
+
+
+def _migrate(eng, from_version: int):
+    """Шаги MIGRATIONS с from_version до SCHEMA_VERSION, каждый в своей транзакции."""
     with eng.connect() as conn:
-        _add_column_if_missing(conn, "tasks", "priority",
-                               "VARCHAR DEFAULT 'normal'")
-        _add_column_if_missing(conn, "tasks", "carried_over",
-                               "BOOLEAN DEFAULT 0")
-        _add_column_if_missing(conn, "rewards", "task_duration_minutes",
-                               "INTEGER DEFAULT NULL")
+        _require_sqlite(conn)
+        for step in MIGRATIONS[from_version:]:
+            step(conn)
+            conn.commit()
 
 
-def _add_column_if_missing(conn, table: str, column: str, col_def: str):
-    """ALTER TABLE только если колонки ещё нет."""
-    from sqlalchemy import text
+def _add_column_if_missing(conn, table: str, column: str, col_def: str) -> bool:
+    """ALTER TABLE только если колонки ещё нет. True — колонку добавили."""
     result = conn.execute(text(f"PRAGMA table_info({table})"))
     existing = {row[1] for row in result}
     if column not in existing:
         conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {col_def}"))
-        conn.commit()
+        return True
+    return False
+
+
+def _create_index(conn, model, name: str):
+    """CREATE INDEX IF NOT EXISTS по описанию индекса в модели."""
+    index = next(ix for ix in model.__table__.indexes if ix.name == name)
+    index.create(conn, checkfirst=True)
+
+
+def _backfill_scheduled_minute(conn):
+    """Переводит существующие строки "HH:MM" в scheduled_minute."""
+    rows = conn.execute(text(
+        "SELECT id, scheduled_time FROM tasks "
+        "WHERE scheduled_time IS NOT NULL AND scheduled_minute IS NULL"
+    )).all()
+    params = [{"id": task_id, "m": minute_of_day(hhmm)} for task_id, hhmm in rows]
+    if params:
+        conn.execute(text("UPDATE tasks SET scheduled_minute = :m WHERE id = :id"), params)
+    conn.commit()
 
 
-def get_session() -> Session:
-    return Session(engine)
+def get_session(**kwargs) -> Session:
+    return Session(engine, **kwargs)
 
 
 def _seed_settings(s: Session):
@@ -2,7 +2,7 @@ import sys, os
 sys.path.insert(0, os.path.dirname(__file__))
 
 import customtkinter as ctk
-from datetime import date, timedelta, datetime
+from datetime import date, timedelta
 from typing import Optional
 import uuid
 import threading
@@ -12,6 +12,9 @@ import repository as repo
 import gamification as gami
 from adapter import Task, DayPlan, TaskStatus, AppSettings, engine_to_plan, db_task_to_ui
 from timer import TimerEngine, NotificationScheduler
+from journal import Journal
+from notify import BatchingSink, MultiSink, CallbackSink, system_sink, merge_notifications
+from clock import SYSTEM_CLOCK
 from ui.timer_header import TimerHeader
 from ui.task_panel import TaskPanel
 from ui.add_task_dialog import AddTaskDialog
@@ -34,27 +37,38 @@ class LifeTimerApp(ctk.CTk):
 
         init_db()
 
+        self.clock = SYSTEM_CLOCK
         self.settings = AppSettings(repo.get_settings())
         ctk.set_appearance_mode(self.settings.theme)
         ctk.set_default_color_theme("blue")
 
-        self._current_date: date = date.today()
-        self._today_plan_id: int = repo.get_or_create_plan(date.today()).id
+        self._current_date: date = self.clock.today()
+        self._today_plan_id: int = repo.get_or_create_plan(self._current_date).id
+        # Хвосты журналов прошлых дней (падение до полуночи) — в их планы
+        TimerEngine.recover_journals(self.settings, keep=self._today_plan_id,
+                                     clock=self.clock)
 
         self.engine = TimerEngine(
-            self._today_plan_id, self.settings, on_tick=self._on_tick
+            self._today_plan_id, self.settings, on_tick=self._on_tick,
+            journal=Journal.for_plan(self._today_plan_id),
+            clock=self.clock, on_rollover=self._on_rollover,
         )
+        # Системное уведомление + окно в приложении; доставка в своём потоке,
+        # напоминания с разницей в пару секунд приходят одним
+        self.notify_sink = BatchingSink(MultiSink(system_sink(), CallbackSink(self._on_notify)))
         self.notifier = NotificationScheduler(
-            self.engine, self.settings, notify_cb=self._on_notify
+            self.engine, self.settings, sink=self.notify_sink
         )
         self._notification_queue: list = []
         self._ui_plan: DayPlan = engine_to_plan(self.engine)
+        # Версия снимка движка, по которой последний раз рисовался список задач
+        self._ui_version: Optional[int] = None
 
         self._build_ui()
         self.engine.start()
         self.notifier.start()
+        self._schedule_display_refresh()
         self._check_notifications()
-        self._schedule_midnight_check()
         self.protocol("WM_DELETE_WINDOW", self._on_close)
         self.after(800, self._check_carry_over)
 
@@ -125,7 +139,7 @@ class LifeTimerApp(ctk.CTk):
     # ──────────────────────────────────────────────
 
     def _date_label(self) -> str:
-        today = date.today()
+        today = self.clock.today()
         if self._current_date == today:
             return f"📅 Сегодня, {today.strftime('%d.%m')}"
         elif self._current_date == today - timedelta(days=1):
@@ -133,10 +147,10 @@ class LifeTimerApp(ctk.CTk):
         return f"📅 {self._current_date.strftime('%d.%m.%Y')}"
 
     def _is_readonly(self) -> bool:
-        return self._current_date != date.today()
+        return self._current_date != self.clock.today()
 
     def _update_next_btn(self):
-        if self._current_date >= date.today():
+        if self._current_date >= self.clock.today():
             self.next_btn.configure(state="disabled", fg_color="#2a2a2a")
         else:
             self.next_btn.configure(state="normal", fg_color="#37474F")
@@ -146,12 +160,12 @@ class LifeTimerApp(ctk.CTk):
         self._switch_day()
 
     def _next_day(self):
-        if self._current_date < date.today():
+        if self._current_date < self.clock.today():
             self._current_date += timedelta(days=1)
             self._switch_day()
 
     def _switch_day(self):
-        is_today = self._current_date == date.today()
+        is_today = self._current_date == self.clock.today()
         self.date_lbl.configure(text=self._date_label())
         self._update_next_btn()
 
@@ -171,6 +185,7 @@ class LifeTimerApp(ctk.CTk):
                 display_plan = DayPlan(date=self._current_date.isoformat())
             self.header.pack_forget()
 
+        self._ui_version = None
         self.task_panel.refresh(
             display_plan,
             self.engine.active_task_id if is_today else None,
@@ -184,6 +199,11 @@ class LifeTimerApp(ctk.CTk):
     def _on_tick(self):
         self.after(0, self._refresh_ui)
 
+    def _schedule_display_refresh(self):
+        """Движок сам не тикает — часы на экране перерисовываем раз в секунду."""
+        self._refresh_ui()
+        self.after(1000, self._schedule_display_refresh)
+
     def _get_coin_state(self):
         """Возвращает (balance, streak) если геймификация включена, иначе (0, 0)."""
         if not getattr(self, "_gamification_enabled", False):
@@ -197,16 +217,21 @@ class LifeTimerApp(ctk.CTk):
     def _refresh_ui(self):
         if self._is_readonly():
             return
-        self._ui_plan = engine_to_plan(self.engine)
+        snap = self.engine.snapshot()
+        changed = snap.version != self._ui_version
+        if changed:
+            self._ui_version = snap.version
+            self._ui_plan = engine_to_plan(self.engine)
         coin_bal, coin_streak = self._get_coin_state()
         self.header.refresh(
-            self._ui_plan, self.engine.active_task_id,
+            self._ui_plan, snap.active_task_id,
             self.engine.procrastination_remaining(),
             self.engine.procrastination_overrun(),
             coin_balance=coin_bal,
             coin_streak=coin_streak,
         )
-        self.task_panel.refresh(self._ui_plan, self.engine.active_task_id)
+        if changed:
+            self.task_panel.refresh(self._ui_plan, snap.active_task_id)
 
     # ──────────────────────────────────────────────
     #  Действия с задачами
@@ -227,9 +252,9 @@ class LifeTimerApp(ctk.CTk):
         t = self.engine.get_task(task_id)
         if not t:
             return
-        tomorrow = (date.today() + timedelta(days=1)).isoformat()
+        tomorrow = (self.clock.today() + timedelta(days=1)).isoformat()
         SkipDialog(
-            self, t["name"],
+            self, t.name,
             on_skip=lambda: self._do_skip(task_id),
             on_postpone=lambda: self._skip_and_postpone(task_id, tomorrow),
         )
@@ -244,7 +269,7 @@ class LifeTimerApp(ctk.CTk):
             tomorrow_plan = repo.get_or_create_plan(date.fromisoformat(to_day))
             task_id_new = str(uuid.uuid4())
             repo.add_task(tomorrow_plan.id, task_id_new,
-                          t["name"], t["allocated_seconds"], t["scheduled_time"])
+                          t.name, t.allocated_seconds, t.scheduled_time)
         self.engine.skip_task(task_id)
         self._refresh_ui()
 
@@ -254,10 +279,10 @@ class LifeTimerApp(ctk.CTk):
             return
         new_id = str(uuid.uuid4())
         repo.add_task(self._today_plan_id, new_id,
-                      f"{t['name']} (копия)", t["allocated_seconds"], t["scheduled_time"],
+                      f"{t.name} (копия)", t.allocated_seconds, t.scheduled_time,
                       position=len(self.engine.get_tasks()))
-        self.engine.add_task(new_id, f"{t['name']} (копия)",
-                             t["allocated_seconds"], t["scheduled_time"])
+        self.engine.add_task(new_id, f"{t.name} (копия)",
+                             t.allocated_seconds, t.scheduled_time)
         self._refresh_ui()
 
     def _delete_task(self, task_id: str):
@@ -271,11 +296,12 @@ class LifeTimerApp(ctk.CTk):
             return
         # Оборачиваем в UI Task для диалога
         ui_task = Task(
-            id=t["id"], name=t["name"],
-            allocated_seconds=t["allocated_seconds"],
-            elapsed_seconds=t["elapsed_seconds"],
-            scheduled_time=t["scheduled_time"],
-            status=TaskStatus(t["status"].value),
+            id=t.id, name=t.name,
+            allocated_seconds=t.allocated_seconds,
+            elapsed_seconds=t.elapsed_seconds,
+            scheduled_time=t.scheduled_time,
+            status=TaskStatus(t.status.value),
+            priority=t.priority,
         )
         EditTaskDialog(self, ui_task, on_save=self._save_edited_task)
 
@@ -310,21 +336,26 @@ class LifeTimerApp(ctk.CTk):
         TemplatesDialog(self, on_load=self._load_tasks)
 
     def _load_tasks(self, tasks: list[Task]):
-        for t in tasks:
-            new_id = str(uuid.uuid4())
-            repo.add_task(self._today_plan_id, new_id,
-                          t.name, t.allocated_seconds, t.scheduled_time,
-                          position=len(self.engine.get_tasks()))
+        new_ids = [str(uuid.uuid4()) for _ in tasks]
+        repo.add_tasks_bulk(self._today_plan_id, self._task_rows(tasks, new_ids))
+        for t, new_id in zip(tasks, new_ids):
             self.engine.add_task(new_id, t.name,
                                  t.allocated_seconds, t.scheduled_time)
         self._refresh_ui()
 
+    @staticmethod
+    def _task_rows(tasks: list[Task], new_ids: list[str]) -> list[dict]:
+        """Строки для repo.add_tasks_bulk: копии tasks под новыми id."""
+        return [{"id": new_id, "name": t.name, "allocated_seconds": t.allocated_seconds,
+                 "scheduled_time": t.scheduled_time}
+                for t, new_id in zip(tasks, new_ids)]
+
     # ──────────────────────────────────────────────
     #  Перенос незавершённых
     # ──────────────────────────────────────────────
 
     def _check_carry_over(self):
-        yesterday = date.today() - timedelta(days=1)
+        yesterday = self.clock.today() - timedelta(days=1)
         # Подводим итог вчерашнего дня если ещё не подводили
         result = gami.finalize_day(yesterday)
         if result:
@@ -343,13 +374,12 @@ class LifeTimerApp(ctk.CTk):
 
     def _carry_over_tasks(self, tasks: list[Task]):
         source_ids = [t.id for t in tasks]
-        # Помечаем исходные задачи — больше не будут предлагаться к переносу
-        repo.mark_carried_over(source_ids)
-        for t in tasks:
-            new_id = str(uuid.uuid4())
-            repo.add_task(self._today_plan_id, new_id,
-                          t.name, t.allocated_seconds, t.scheduled_time,
-                          position=len(self.engine.get_tasks()))
+        new_ids = [str(uuid.uuid4()) for _ in tasks]
+        with repo.unit_of_work():
+            # Помечаем исходные задачи — больше не будут предлагаться к переносу
+            repo.mark_carried_over(source_ids)
+            repo.add_tasks_bulk(self._today_plan_id, self._task_rows(tasks, new_ids))
+        for t, new_id in zip(tasks, new_ids):
             self.engine.add_task(new_id, t.name,
                                  t.allocated_seconds, t.scheduled_time)
         self._refresh_ui()
@@ -358,18 +388,19 @@ class LifeTimerApp(ctk.CTk):
     #  Подведение итогов дня
     # ──────────────────────────────────────────────
 
-    def _schedule_midnight_check(self):
-        """Проверяем раз в минуту не наступила ли полночь."""
-        now = datetime.now()
-        if now.hour == 0 and now.minute == 0:
-            self._finalize_yesterday()
-        self.after(60_000, self._schedule_midnight_check)
+    def _on_rollover(self, old: date, new: date, result: Optional[dict]):
+        """Поток планировщика: движок уже перешёл на план нового дня."""
+        self.after(0, lambda: self._apply_rollover(old, new, result))
 
-    def _finalize_yesterday(self):
-        yesterday = date.today() - timedelta(days=1)
-        result = gami.finalize_day(yesterday)
+    def _apply_rollover(self, old: date, new: date, result: Optional[dict]):
+        self._today_plan_id = self.engine.plan_id
+        if self._current_date == old:
+            self._current_date = new
+            self._switch_day()
         if result:
             self._show_day_summary(result)
+        # Остальные незавершённые задачи вчерашнего дня — через обычный диалог
+        self._check_carry_over()
 
     def _show_day_summary(self, result: dict):
         from tkinter import messagebox
@@ -408,10 +439,9 @@ class LifeTimerApp(ctk.CTk):
         from lt_db import Priority
         new_id = str(_uuid.uuid4())
         allocated = duration_minutes * 60
-        repo.add_task(self._today_plan_id, new_id, name, allocated,
-                      scheduled_time=None,
-                      position=len(self.engine.get_tasks()),
-                      priority=Priority.LOW)
+        repo.add_tasks_bulk(self._today_plan_id, [
+            {"id": new_id, "name": name, "allocated_seconds": allocated,
+             "priority": Priority.LOW}])
         self.engine.add_task(new_id, name, allocated,
                              scheduled_time=None, priority=Priority.LOW)
         self._refresh_ui()
@@ -424,6 +454,7 @@ class LifeTimerApp(ctk.CTk):
         self.settings = settings
         self.engine.settings = settings
         self.notifier.settings = settings
+        self.notifier.refresh()
         ctk.set_appearance_mode(settings.theme)
         if gami_changed:
             # Перестраиваем весь UI — кнопка магазина и блок коинов в хедере
@@ -440,10 +471,13 @@ class LifeTimerApp(ctk.CTk):
         self._notification_queue.append((title, message))
 
     def _check_notifications(self):
-        while self._notification_queue:
-            title, msg = self._notification_queue.pop(0)
+        if self._notification_queue:
+            # Всё накопленное — одним окном, а не цепочкой модальных
+            batch = []
+            while self._notification_queue:
+                batch.append(self._notification_queue.pop(0))
             from tkinter import messagebox
-            messagebox.showinfo(title, msg)
+            messagebox.showinfo(*merge_notifications(batch))
         self.after(5000, self._check_notifications)
 
     # ──────────────────────────────────────────────
@@ -453,6 +487,7 @@ class LifeTimerApp(ctk.CTk):
     def _on_close(self):
         self.engine.stop()
         self.notifier.stop()
+        self.notify_sink.close()
         self.destroy()
 
 
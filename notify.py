@@ -0,0 +1,176 @@
+"""
+Доставка напоминаний: NotificationScheduler решает «когда», sink — «куда».
+
+  NullSink      — никуда (тесты)
+  LogSink       — в лог (headless, сервер)
+  CallbackSink  — в функцию cb(title, message) (UI, симуляция)
+  PlyerSink     — системное уведомление через plyer
+  MultiSink     — в несколько sink'ов сразу
+  BatchingSink  — обёртка: доставляет в своём потоке и склеивает
+                  напоминания, пришедшие в пределах window секунд, в одно
+
+Бэкенд выбирается один раз при старте (system_sink), а не импортом
+plyer на каждое уведомление.
+"""
+import logging
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Callable, Optional
+
+log = logging.getLogger(__name__)
+
+
+class NotificationSink(ABC):
+
+    @abstractmethod
+    def send(self, title: str, message: str): ...
+
+    def close(self):
+        pass
+
+
+class NullSink(NotificationSink):
+
+    def send(self, title: str, message: str):
+        pass
+
+
+class LogSink(NotificationSink):
+
+    def send(self, title: str, message: str):
+        log.info("%s — %s", title, message)
+
+
+class CallbackSink(NotificationSink):
+
+    def __init__(self, cb: Callable[[str, str], None]):
+        self.cb = cb
+
+    def send(self, title: str, message: str):
+        self.cb(title, message)
+
+
+class PlyerSink(NotificationSink):
+    """ImportError в конструкторе — plyer не установлен."""
+    TIMEOUT = 8     # секунд на экране
+
+    def __init__(self):
+        from plyer import notification
+        self._notification = notification
+
+    def send(self, title: str, message: str):
+        try:
+            self._notification.notify(title=title, message=message, timeout=self.TIMEOUT)
+        except Exception:
+            # У plyer нет бэкенда под платформу — выясняется только при вызове
+            log.exception("Системное уведомление не показано")
+
+
+class MultiSink(NotificationSink):
+
+    def __init__(self, *sinks: NotificationSink):
+        self.sinks = sinks
+
+    def send(self, title: str, message: str):
+        for sink in self.sinks:
+            try:
+                sink.send(title, message)
+            except Exception:
+                log.exception("Ошибка доставки в %r", sink)
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+
+
+def system_sink() -> NotificationSink:
+    """Системные уведомления, если есть plyer; иначе — в лог."""
+    try:
+        return PlyerSink()
+    except ImportError:
+        log.info("plyer не установлен — уведомления только в лог")
+        return LogSink()
+
+
+def merge_notifications(batch: list[tuple[str, str]]) -> tuple[str, str]:
+    """Несколько напоминаний → одно."""
+    if len(batch) == 1:
+        return batch[0]
+    return (f"🔔 Напоминаний: {len(batch)}",
+            "\n".join(f"{title} — {message}" for title, message in batch))
+
+
+# ──────────────────────────────────────────────
+#  Доставка в фоне с объединением
+# ──────────────────────────────────────────────
+
+class BatchingSink(NotificationSink):
+    """
+    send() только ставит в очередь — поток планировщика не ждёт ни plyer,
+    ни UI. Поток доставки после первого напоминания ждёт window секунд,
+    собирает всё, что успело прийти, и отдаёт inner одним вызовом.
+    """
+    WINDOW = 2.0
+
+    def __init__(self, inner: NotificationSink, window: float = WINDOW):
+        self.inner = inner
+        self.window = window
+        self._cond = threading.Condition()
+        self._pending: list[tuple[str, str]] = []
+        self._busy = False
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+
+    def send(self, title: str, message: str):
+        with self._cond:
+            self._ensure_thread()
+            self._pending.append((title, message))
+            self._cond.notify_all()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Ждёт, пока всё принятое доставлено."""
+        with self._cond:
+            return self._cond.wait_for(lambda: not (self._pending or self._busy), timeout)
+
+    def close(self, timeout: Optional[float] = 5.0):
+        """Доставляет очередь без ожидания окна и останавливает поток."""
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=timeout)
+        self._thread = None
+        self.inner.close()
+
+    def _ensure_thread(self):
+        """Под _cond: поток поднимается при первом напоминании."""
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._loop, daemon=True,
+                                        name="life-timer-notify")
+        self._thread.start()
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending or not self._running)
+                if not self._pending:
+                    return
+                deadline = time.monotonic() + self.window
+                while self._running:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch, self._pending = self._pending, []
+                self._busy = True
+
+            try:
+                self.inner.send(*merge_notifications(batch))
+            except Exception:
+                log.exception("Ошибка доставки напоминания")
+            with self._cond:
+                self._busy = False
+                self._cond.notify_all()
@@ -2,34 +2,97 @@
 Репозиторий — единственное место где код касается БД.
 Бизнес-логика работает только через этот слой.
 """
+import threading
+from contextlib import contextmanager
 from datetime import date, datetime
-from typing import Optional
+from typing import Iterator, Optional
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 
+import db_stats
+
 from lt_db import (
     get_session, DayPlan, Task, Settings, CoinBalance,
     CoinTransaction, Reward, Template, Preset, PresetItem,
-    TaskStatus, RewardType, Priority
+    TaskStatus, RewardType, Priority, minute_of_day
 )
 
 
+# ──────────────────────────────────────────────
+#  Сессии: своя на вызов или общая unit_of_work
+# ──────────────────────────────────────────────
+
+_local = threading.local()      # .session — открытая unit_of_work потока
+
+
+@contextmanager
+def unit_of_work() -> Iterator[Session]:
+    """
+    Одна сессия и одна транзакция на несколько вызовов репозитория:
+
+        with repo.unit_of_work():
+            repo.mark_carried_over(ids)
+            for t in tasks:
+                repo.add_task(...)          # один commit на весь блок
+
+    Функции репозитория в этом потоке работают в общей сессии и вместо
+    commit делают flush (последующие вызовы видят изменения). Выход из
+    блока — commit, исключение — rollback всего блока. Вложенный
+    unit_of_work присоединяется к внешнему. Объекты, возвращённые внутри
+    блока, после commit не протухают (expire_on_commit=False).
+    """
+    s = getattr(_local, "session", None)
+    if s is not None:
+        yield s
+        return
+    s = _local.session = get_session(expire_on_commit=False)
+    try:
+        yield s
+        s.commit()
+    except BaseException:
+        s.rollback()
+        raise
+    finally:
+        _local.session = None
+        s.close()
+
+
+@contextmanager
+def _session() -> Iterator[Session]:
+    """Общая сессия unit_of_work, если она открыта в этом потоке, иначе своя."""
+    s = getattr(_local, "session", None)
+    if s is not None:
+        yield s
+        return
+    with get_session() as s:
+        yield s
+
+
+def _commit(s: Session):
+    """commit своей сессии; в unit_of_work — только flush, commit сделает блок."""
+    if s is getattr(_local, "session", None):
+        s.flush()
+    else:
+        s.commit()
+
+
 # ──────────────────────────────────────────────
 #  Settings
 # ──────────────────────────────────────────────
 
 def get_settings() -> Settings:
-    with get_session() as s:
+    with _session() as s:
         obj = s.get(Settings, 1)
         s.expunge(obj)
         return obj
 
 
 def save_settings(data: dict):
-    with get_session() as s:
+    with _session() as s:
         obj = s.get(Settings, 1)
         for k, v in data.items():
             setattr(obj, k, v)
-        s.commit()
+        _commit(s)
 
 
 # ──────────────────────────────────────────────
@@ -37,62 +100,72 @@ def save_settings(data: dict):
 # ──────────────────────────────────────────────
 
 def get_or_create_plan(d: date) -> DayPlan:
-    with get_session() as s:
+    with _session() as s:
         plan = s.query(DayPlan).filter_by(date=d).first()
         if not plan:
             plan = DayPlan(date=d)
             s.add(plan)
-            s.commit()
+            _commit(s)
             s.refresh(plan)
         s.expunge(plan)
         return plan
 
 
+def get_plan(plan_id: int) -> Optional[DayPlan]:
+    with _session() as s:
+        plan = s.get(DayPlan, plan_id)
+        if plan:
+            s.expunge(plan)
+        return plan
+
+
+@db_stats.instrumented
 def get_plan_with_tasks(d: date) -> Optional[DayPlan]:
-    with get_session() as s:
+    with _session() as s:
         from sqlalchemy.orm import joinedload
         plan = (s.query(DayPlan)
                 .options(joinedload(DayPlan.tasks))
                 .filter_by(date=d)
                 .first())
         if plan:
-            s.expunge_all()
+            # Только свои объекты (задачи — каскадом): в unit_of_work
+            # остальное, загруженное вызывающим, остаётся в сессии
+            s.expunge(plan)
         return plan
 
 
 def update_plan(plan_id: int, **kwargs):
-    with get_session() as s:
+    with _session() as s:
         plan = s.get(DayPlan, plan_id)
         for k, v in kwargs.items():
             setattr(plan, k, v)
-        s.commit()
+        _commit(s)
 
 
 def mark_carried_over(task_ids: list[str]) -> None:
     """Помечает задачи как перенесённые — больше не будут предлагаться к переносу."""
     if not task_ids:
         return
-    with get_session() as s:
+    with _session() as s:
         s.query(Task).filter(Task.id.in_(task_ids)).update(
             {"carried_over": True}, synchronize_session=False
         )
-        s.commit()
+        _commit(s)
 
 
 def get_unfinished_from_date(d: date) -> list[Task]:
     """Незавершённые задачи за конкретный день которые ещё не переносились."""
-    with get_session() as s:
-        from sqlalchemy.orm import joinedload
-        plan = (s.query(DayPlan)
-                .options(joinedload(DayPlan.tasks))
-                .filter_by(date=d)
-                .first())
-        if not plan:
-            return []
-        result = [t for t in plan.tasks
-                  if t.status in (TaskStatus.PENDING, TaskStatus.ACTIVE)
-                  and not t.carried_over]
-        s.expunge_all()
+    with _session() as s:
+        # Фильтр в SQL, без загрузки всего дня; идёт по (plan_id, position)
+        result = (s.query(Task)
+                  .join(DayPlan)
+                  .filter(DayPlan.date == d,
+                          Task.status.in_((TaskStatus.PENDING, TaskStatus.ACTIVE)),
+                          Task.carried_over.isnot(True))
+                  .order_by(Task.position)
+                  .all())
+        for t in result:
+            s.expunge(t)
         return result
 
 
@@ -103,7 +176,7 @@ def get_unfinished_from_date(d: date) -> list[Task]:
 def add_task(plan_id: int, task_id: str, name: str,
              allocated_seconds: int, scheduled_time: Optional[str] = None,
              position: int = 0, priority: Priority = Priority.NORMAL) -> Task:
-    with get_session() as s:
+    with _session() as s:
         t = Task(
             id=task_id,
             plan_id=plan_id,
@@ -114,43 +187,176 @@ def add_task(plan_id: int, task_id: str, name: str,
             priority=priority,
         )
         s.add(t)
-        s.commit()
+        _commit(s)
         s.refresh(t)
         return t
 
 
 def update_task(task_id: str, **kwargs):
-    with get_session() as s:
+    with _session() as s:
         t = s.get(Task, task_id)
         if not t:
             return
         for k, v in kwargs.items():
             setattr(t, k, v)
-        s.commit()
+        _commit(s)
+
+
+@db_stats.instrumented
+def add_tasks_bulk(plan_id: int, rows: list[dict]) -> int:
+    """
+    Добавляет задачи в конец плана одним executemany INSERT, одной транзакцией.
+    rows — [{"id", "name", "allocated_seconds", ["scheduled_time"], ["priority"]}, ...].
+    Позицию считает сама БД: max(position) плана + 1 для каждой строки по порядку.
+    Возвращает число добавленных задач.
+    """
+    from sqlalchemy import func, insert
+    if not rows:
+        return 0
+    next_position = (select(func.coalesce(func.max(Task.position), -1) + 1)
+                     .where(Task.plan_id == plan_id)
+                     .scalar_subquery())
+    # Core-insert мимо ORM: @validates не срабатывает, scheduled_minute — здесь
+    params = [{
+        "id": r["id"],
+        "plan_id": plan_id,
+        "name": r["name"],
+        "allocated_seconds": r["allocated_seconds"],
+        "scheduled_time": r.get("scheduled_time"),
+        "scheduled_minute": minute_of_day(r.get("scheduled_time")),
+        "priority": r.get("priority") or Priority.NORMAL,
+    } for r in rows]
+    with _session() as s:
+        # Без RETURNING — обычный executemany: подзапрос видит предыдущие строки
+        s.execute(insert(Task.__table__).values(position=next_position), params)
+        _commit(s)
+    return len(params)
+
+
+@db_stats.instrumented
+def update_tasks_bulk(changes: list[dict]) -> int:
+    """
+    Пакетное изменение задач одной транзакцией.
+    changes — [{"id": ..., <изменённые поля>}, ...]; строки с одинаковым
+    набором полей уходят одним executemany UPDATE.
+    Возвращает число выполненных UPDATE-выражений.
+    """
+    rows = [dict(r, scheduled_minute=minute_of_day(r["scheduled_time"]))
+            if "scheduled_time" in r else r for r in changes]
+    groups = _group_by_fields(rows)
+    with _session() as s:
+        for group in groups:
+            _update_by_id(s, Task, group)
+        _commit(s)
+    return len(groups)
+
+
+def _update_by_id(s: Session, model, rows: list[dict]):
+    """
+    executemany UPDATE ... WHERE id = ? через Core. В отличие от ORM bulk
+    UPDATE, rowcount не сверяется: строка уже удалённой задачи (удаление
+    обогнало запись движка) просто ничего не обновляет, а не валит всю пачку.
+    Все строки — с одинаковым набором ключей (см. _group_by_fields).
+    """
+    from sqlalchemy import bindparam, update
+    table = model.__table__
+    params = [{("_id" if k == "id" else k): v for k, v in row.items()} for row in rows]
+    s.execute(update(table).where(table.c.id == bindparam("_id")), params)
+
+
+def _group_by_fields(rows: list[dict]) -> list[list[dict]]:
+    """Строки с одинаковым набором ключей — в одну группу (один executemany)."""
+    groups: dict[tuple, list[dict]] = {}
+    for row in rows:
+        groups.setdefault(tuple(sorted(row)), []).append(row)
+    return list(groups.values())
+
+
+def flush_engine_state(plan_id: int, plan_fields: dict,
+                       task_rows: list[dict]) -> int:
+    """
+    Пакетная запись состояния TimerEngine одной транзакцией.
+    task_rows — [{"id": ..., <только изменённые поля>}, ...].
+    Возвращает число выполненных UPDATE-выражений.
+    """
+    return flush_engine_states([(plan_id, plan_fields, task_rows)])
+
+
+@db_stats.instrumented
+def flush_engine_states(batch: list[tuple[int, dict, list[dict]]]) -> int:
+    """
+    То же для нескольких движков сразу (EngineHost): одна транзакция на всех.
+    batch — [(plan_id, plan_fields, task_rows), ...].
+    Строки с одинаковым набором полей уходят одним executemany UPDATE.
+    """
+    plan_groups = _group_by_fields([dict(plan_fields, id=plan_id)
+                                    for plan_id, plan_fields, _ in batch if plan_fields])
+    task_groups = _group_by_fields([row for _, _, task_rows in batch for row in task_rows])
+
+    with _session() as s:
+        for rows in plan_groups:
+            _update_by_id(s, DayPlan, rows)
+        for rows in task_groups:
+            _update_by_id(s, Task, rows)
+        _commit(s)
+    return len(plan_groups) + len(task_groups)
 
 
 def delete_task(task_id: str):
-    with get_session() as s:
+    with _session() as s:
         t = s.get(Task, task_id)
         if t:
             s.delete(t)
-            s.commit()
+            _commit(s)
 
 
 def get_tasks_for_plan(plan_id: int) -> list[Task]:
-    with get_session() as s:
+    with _session() as s:
         return (s.query(Task)
                 .filter_by(plan_id=plan_id)
                 .order_by(Task.position)
                 .all())
 
 
+
+def get_next_scheduled_task(plan_id: int, after_minute: int) -> Optional[Task]:
+    """
+    Ближайшая незавершённая задача плана со временем >= after_minute
+    (минуты от полуночи). Идёт по индексу (plan_id, scheduled_minute).
+    """
+    with _session() as s:
+        t = (s.query(Task)
+             .filter(Task.plan_id == plan_id,
+                     Task.scheduled_minute >= after_minute,
+                     Task.status.in_((TaskStatus.PENDING, TaskStatus.ACTIVE)))
+             .order_by(Task.scheduled_minute)
+             .first())
+        if t:
+            s.expunge(t)
+        return t
+
+
+def get_scheduled_tasks(plan_id: int, from_minute: int = 0,
+                        to_minute: int = 24 * 60) -> list[Task]:
+    """Задачи плана со временем в [from_minute, to_minute), по времени."""
+    with _session() as s:
+        tasks = (s.query(Task)
+                 .filter(Task.plan_id == plan_id,
+                         Task.scheduled_minute >= from_minute,
+                         Task.scheduled_minute < to_minute)
+                 .order_by(Task.scheduled_minute)
+                 .all())
+        for t in tasks:
+            s.expunge(t)
+        return tasks
+
+
 # ──────────────────────────────────────────────
 #  Геймификация — баланс
 # ──────────────────────────────────────────────
 
 def get_balance() -> CoinBalance:
-    with get_session() as s:
+    with _session() as s:
         obj = s.get(CoinBalance, 1)
         s.expunge(obj)
         return obj
@@ -161,7 +367,7 @@ def add_transaction(amount: int, reason: str,
                     plan_date: Optional[date] = None,
                     reward_id: Optional[int] = None) -> int:
     """Добавляет транзакцию и возвращает новый баланс."""
-    with get_session() as s:
+    with _session() as s:
         bal = s.get(CoinBalance, 1)
         settings = s.get(Settings, 1)
 
@@ -186,19 +392,19 @@ def add_transaction(amount: int, reason: str,
             plan_date=plan_date,
             reward_id=reward_id,
         ))
-        s.commit()
+        _commit(s)
         return new_balance
 
 
 def update_streak(streak: int):
-    with get_session() as s:
+    with _session() as s:
         bal = s.get(CoinBalance, 1)
         bal.streak = streak
-        s.commit()
+        _commit(s)
 
 
 def get_transactions(limit: int = 50) -> list[CoinTransaction]:
-    with get_session() as s:
+    with _session() as s:
         return (s.query(CoinTransaction)
                 .order_by(CoinTransaction.created_at.desc())
                 .limit(limit)
@@ -210,7 +416,7 @@ def get_transactions(limit: int = 50) -> list[CoinTransaction]:
 # ──────────────────────────────────────────────
 
 def get_rewards(active_only: bool = True) -> list[Reward]:
-    with get_session() as s:
+    with _session() as s:
         q = s.query(Reward)
         if active_only:
             q = q.filter_by(is_active=True)
@@ -221,7 +427,7 @@ def add_reward(name: str, price: int, reward_type: RewardType,
                description: Optional[str] = None,
                count: Optional[int] = None,
                task_duration_minutes: Optional[int] = None) -> Reward:
-    with get_session() as s:
+    with _session() as s:
         r = Reward(
             name=name, price=price, reward_type=reward_type,
             description=description,
@@ -229,14 +435,15 @@ def add_reward(name: str, price: int, reward_type: RewardType,
             task_duration_minutes=task_duration_minutes,
         )
         s.add(r)
-        s.commit()
+        _commit(s)
         s.refresh(r)
         return r
 
 
+@db_stats.instrumented
 def purchase_reward(reward_id: int) -> dict:
     """Покупает поощрение. Возвращает dict с new_balance и reward. Raises ValueError если нельзя."""
-    with get_session() as s:
+    with _session() as s:
         r = s.get(Reward, reward_id)
         if not r or not r.is_active:
             raise ValueError("Поощрение недоступно")
@@ -257,7 +464,7 @@ def purchase_reward(reward_id: int) -> dict:
         if r.reward_type == RewardType.LIMITED:
             r.count -= 1
 
-        s.commit()
+        _commit(s)
         return {
             "new_balance": bal.balance,
             "reward_name": r.name,
@@ -268,11 +475,11 @@ def purchase_reward(reward_id: int) -> dict:
 
 
 def delete_reward(reward_id: int):
-    with get_session() as s:
+    with _session() as s:
         r = s.get(Reward, reward_id)
         if r:
             s.delete(r)
-            s.commit()
+            _commit(s)
 
 
 def update_reward(reward_id: int, name: str, price: int, description: Optional[str],
@@ -282,7 +489,7 @@ def update_reward(reward_id: int, name: str, price: int, description: Optional[s
     count_add — сколько добавить к остатку (для пополнения лимитированных).
     task_duration_minutes — для абонементов: длительность создаваемой задачи.
     """
-    with get_session() as s:
+    with _session() as s:
         r = s.get(Reward, reward_id)
         if not r:
             raise ValueError("Награда не найдена")
@@ -294,7 +501,7 @@ def update_reward(reward_id: int, name: str, price: int, description: Optional[s
         if count_add > 0 and r.reward_type == RewardType.LIMITED:
             r.count = (r.count or 0) + count_add
             r.count_initial = (r.count_initial or 0) + count_add
-        s.commit()
+        _commit(s)
 
 
 # ──────────────────────────────────────────────
@@ -302,57 +509,58 @@ def update_reward(reward_id: int, name: str, price: int, description: Optional[s
 # ──────────────────────────────────────────────
 
 def get_templates() -> list[Template]:
-    with get_session() as s:
+    with _session() as s:
         return s.query(Template).order_by(Template.category, Template.name).all()
 
 
 def add_user_template(name: str, allocated_seconds: int, category: str) -> Template:
-    with get_session() as s:
+    with _session() as s:
         t = Template(name=name, allocated_seconds=allocated_seconds,
                      category=category, is_builtin=False)
         s.add(t)
-        s.commit()
+        _commit(s)
         s.refresh(t)
         return t
 
 
 def delete_user_template(template_id: int):
-    with get_session() as s:
+    with _session() as s:
         t = s.get(Template, template_id)
         if t and not t.is_builtin:
             s.delete(t)
-            s.commit()
+            _commit(s)
 
 
 def get_presets() -> list[Preset]:
-    with get_session() as s:
+    with _session() as s:
         return s.query(Preset).all()
 
 
 def add_user_preset(name: str, template_ids: list[int]) -> Preset:
-    with get_session() as s:
+    with _session() as s:
         p = Preset(name=name, is_builtin=False)
         s.add(p)
         s.flush()
         for i, tid in enumerate(template_ids):
             s.add(PresetItem(preset_id=p.id, template_id=tid, position=i))
-        s.commit()
+        _commit(s)
         s.refresh(p)
         return p
 
 
 def delete_user_preset(preset_id: int):
-    with get_session() as s:
+    with _session() as s:
         p = s.get(Preset, preset_id)
         if p and not p.is_builtin:
             s.delete(p)
-            s.commit()
+            _commit(s)
 
 
 # ──────────────────────────────────────────────
 #  Статистика
 # ──────────────────────────────────────────────
 
+@db_stats.instrumented
 def get_stats(date_from=None, date_to=None) -> list[dict]:
     """
     Посуточная статистика за [date_from, date_to].
@@ -361,7 +569,7 @@ def get_stats(date_from=None, date_to=None) -> list[dict]:
     from sqlalchemy.orm import joinedload
     if date_to is None:
         date_to = date.today()
-    with get_session() as s:
+    with _session() as s:
         q = (s.query(DayPlan)
                .options(joinedload(DayPlan.tasks))
                .filter(DayPlan.date <= date_to))
@@ -394,8 +602,9 @@ def get_stats(date_from=None, date_to=None) -> list[dict]:
 #  Compat-методы для старого UI шаблонов/пресетов
 # ──────────────────────────────────────────────
 
+@db_stats.instrumented
 def get_templates_as_dicts() -> list[dict]:
-    with get_session() as s:
+    with _session() as s:
         from lt_db import Template
         return [
             {"id": t.id, "name": t.name,
@@ -405,9 +614,10 @@ def get_templates_as_dicts() -> list[dict]:
         ]
 
 
+@db_stats.instrumented
 def save_templates_compat(templates: list[dict]):
     """Сохраняет только пользовательские шаблоны (не встроенные)."""
-    with get_session() as s:
+    with _session() as s:
         from lt_db import Template
         # Удаляем старые пользовательские
         s.query(Template).filter_by(is_builtin=False).delete()
@@ -419,36 +629,84 @@ def save_templates_compat(templates: list[dict]):
                     category=t.get("category", "👤 Мои шаблоны"),
                     is_builtin=False,
                 ))
-        s.commit()
+        _commit(s)
 
 
+@db_stats.instrumented
 def get_user_presets_as_dicts() -> list[dict]:
-    with get_session() as s:
-        from lt_db import Preset
-        result = []
-        for p in s.query(Preset).filter_by(is_builtin=False).all():
-            result.append({
-                "name": p.name,
-                "templates": [item.template.name for item in p.items]
-            })
-        return result
+    with _session() as s:
+        from sqlalchemy.orm import selectinload
+        # Пункты и их шаблоны — одним запросом на все пресеты, а не по шаблону на пункт
+        presets = (s.query(Preset)
+                   .options(selectinload(Preset.items).joinedload(PresetItem.template))
+                   .filter_by(is_builtin=False)
+                   .all())
+        return [
+            {"name": p.name, "templates": [item.template.name for item in p.items]}
+            for p in presets
+        ]
+
+
+@db_stats.instrumented
+def get_user_preset_template_names(name: str) -> Optional[list[str]]:
+    """Имена шаблонов пользовательского пресета по порядку; None — пресета нет."""
+    with _session() as s:
+        preset = s.query(Preset.id).filter_by(name=name, is_builtin=False).first()
+        if preset is None:
+            return None
+        return list(s.scalars(
+            select(Template.name)
+            .join(PresetItem, PresetItem.template_id == Template.id)
+            .where(PresetItem.preset_id == preset.id)
+            .order_by(PresetItem.position)
+        ))
 
 
+@db_stats.instrumented
+def get_templates_by_names(names: list[str]) -> list[dict]:
+    """Шаблоны с такими именами (в формате get_templates_as_dicts), одним запросом."""
+    if not names:
+        return []
+    with _session() as s:
+        return [
+            {"id": t.id, "name": t.name,
+             "allocated_seconds": t.allocated_seconds,
+             "category": t.category, "builtin": t.is_builtin}
+            for t in s.query(Template).filter(Template.name.in_(set(names)))
+                                      .order_by(Template.id)
+        ]
+
+
+@db_stats.instrumented
 def save_user_presets_compat(presets: list[dict]):
-    with get_session() as s:
-        from lt_db import Preset, PresetItem, Template
+    with _session() as s:
+        from sqlalchemy import delete, insert
+        user_ids = select(Preset.id).where(Preset.is_builtin == False)  # noqa: E712
+        # Массовый delete() не каскадирует — пункты удаляем сами
+        s.execute(delete(PresetItem).where(PresetItem.preset_id.in_(user_ids)))
         s.query(Preset).filter_by(is_builtin=False).delete()
+        # Имя → id: один запрос на все имена (при повторах — первый шаблон, как .first())
+        names = {tname for p_data in presets for tname in p_data.get("templates", [])}
+        ids: dict[str, int] = {}
+        if names:
+            for tid, tname in s.execute(select(Template.id, Template.name)
+                                        .where(Template.name.in_(names))
+                                        .order_by(Template.id)):
+                ids.setdefault(tname, tid)
+        items = []
         for p_data in presets:
             p = Preset(name=p_data["name"], is_builtin=False)
             s.add(p)
             s.flush()
-            for i, tname in enumerate(p_data.get("templates", [])):
-                t = s.query(Template).filter_by(name=tname).first()
-                if t:
-                    s.add(PresetItem(preset_id=p.id, template_id=t.id, position=i))
-        s.commit()
+            items += [{"preset_id": p.id, "template_id": ids[tname], "position": i}
+                      for i, tname in enumerate(p_data.get("templates", []))
+                      if tname in ids]
+        if items:
+            s.execute(insert(PresetItem), items)    # один executemany на все пункты
+        _commit(s)
 
 
+@db_stats.instrumented
 def get_stats_summary(date_from=None, date_to=None) -> dict:
     """
     Агрегированная статистика для StatsPanel.
@@ -0,0 +1,175 @@
+"""
+Общий планировщик пробуждений (tickless).
+Один поток спит ровно до ближайшего значимого момента среди всех клиентов
+(движок таймера, уведомления) — без опроса раз в секунду.
+
+Клиент — любой объект с двумя методами:
+  next_deadline() -> Optional[float]   ближайший момент по time.monotonic()
+  on_deadline(now: float)              вызывается, когда момент наступил
+После изменения своего состояния клиент вызывает scheduler.reschedule(self).
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import threading
+import time
+from typing import Optional
+
+log = logging.getLogger(__name__)
+
+
+class Scheduler:
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._heap: list = []          # (when, seq, client) — с устаревшими записями
+        self._due: dict = {}           # client → seq актуальной записи в куче
+        self._asked: dict = {}         # client → номер последнего применённого расчёта
+        self._seq = itertools.count()
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+
+    # ──────────────────────────────────────────────
+    #  Клиенты
+    # ──────────────────────────────────────────────
+
+    def reschedule(self, client):
+        """
+        Пересчитывает дедлайн клиента. Старая запись в куче становится устаревшей.
+        next_deadline() зовётся вне _cond (клиент берёт свои блокировки);
+        расчёт, начатый раньше уже применённого, отбрасывается — медленный
+        вызов не затрёт более свежий дедлайн.
+        """
+        with self._cond:
+            ticket = next(self._seq)
+        when = client.next_deadline()
+        with self._cond:
+            if self._asked.get(client, -1) > ticket:
+                return
+            self._asked[client] = ticket
+            if when is None:
+                self._due.pop(client, None)
+                return
+            seq = ticket
+            self._due[client] = seq
+            heapq.heappush(self._heap, (when, seq, client))
+            # Много устаревших записей — пересобираем кучу
+            if len(self._heap) > 2 * len(self._due) + 64:
+                self._heap = [e for e in self._heap if self._due.get(e[2]) == e[1]]
+                heapq.heapify(self._heap)
+            if self._heap[0][1] == seq:
+                self._cond.notify()
+
+    def remove(self, client):
+        with self._cond:
+            self._due.pop(client, None)
+            self._asked.pop(client, None)
+
+    def next_deadline(self) -> Optional[float]:
+        with self._cond:
+            self._drop_stale()
+            return self._heap[0][0] if self._heap else None
+
+    def _drop_stale(self):
+        while self._heap and self._due.get(self._heap[0][2]) != self._heap[0][1]:
+            heapq.heappop(self._heap)
+
+    # ──────────────────────────────────────────────
+    #  Исполнение
+    # ──────────────────────────────────────────────
+
+    def run_pending(self, now: float):
+        """Отрабатывает все дедлайны <= now."""
+        due = []
+        with self._cond:
+            while self._heap and self._heap[0][0] <= now:
+                _, seq, client = heapq.heappop(self._heap)
+                if self._due.get(client) == seq:
+                    del self._due[client]
+                    due.append(client)
+        for client in due:
+            try:
+                client.on_deadline(now)
+            except Exception:
+                log.exception("Ошибка в обработчике дедлайна %r", client)
+            self.reschedule(client)
+
+    def start(self):
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._loop, daemon=True,
+                                        name="life-timer-scheduler")
+        self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=2)
+        self._thread = None
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                while self._running:
+                    self._drop_stale()
+                    if self._heap:
+                        timeout = self._heap[0][0] - time.monotonic()
+                        if timeout <= 0:
+                            break
+                    else:
+                        timeout = None
+                    self._cond.wait(timeout)
+                if not self._running:
+                    return
+            self.run_pending(time.monotonic())
+
+
+class AsyncioScheduler:
+    """
+    Тот же интерфейс клиентов поверх asyncio: вместо потока — loop.call_at.
+    Все вызовы — только из потока event loop (call_at не потокобезопасен).
+    Дедлайны клиентов — по time.monotonic(); часы loop могут отличаться
+    (uvloop), поэтому переводим через текущую разницу.
+    """
+
+    def __init__(self, loop=None):
+        self._loop = loop
+        self._handles: dict = {}       # client → asyncio.TimerHandle
+
+    def reschedule(self, client):
+        if self._loop is None:
+            self._loop = asyncio.get_running_loop()
+        handle = self._handles.pop(client, None)
+        if handle:
+            handle.cancel()
+        when = client.next_deadline()
+        if when is None:
+            return
+        at = when - time.monotonic() + self._loop.time()
+        self._handles[client] = self._loop.call_at(at, self._fire, client)
+
+    def remove(self, client):
+        handle = self._handles.pop(client, None)
+        if handle:
+            handle.cancel()
+
+    def _fire(self, client):
+        self._handles.pop(client, None)
+        try:
+            client.on_deadline(time.monotonic())
+        except Exception:
+            log.exception("Ошибка в обработчике дедлайна %r", client)
+        self.reschedule(client)
+
+    def start(self):
+        pass
+
+    def stop(self):
+        for handle in self._handles.values():
+            handle.cancel()
+        self._handles.clear()
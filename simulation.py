@@ -0,0 +1,136 @@
+"""
+Ускоренный прогон сценария на виртуальных часах.
+
+TimerEngine + NotificationScheduler крутятся на общем Scheduler, но без
+потока: драйвер сам переводит VirtualClock к ближайшему дедлайну и вызывает
+run_pending. Между событиями ничего не исполняется — сутки с десятком
+задач проходят за миллисекунды, недели — за доли секунды.
+
+    sim = Simulation(plan_id, settings, start=datetime(2026, 3, 2, 8, 0))
+    sim.start()
+    sim.run([
+        ("08:00", "activate", task_a),
+        ("09:45", "complete", task_a),      # перерасход — сам по ходу времени
+        ("10:00", "activate", task_b),
+        ("+2:00", "skip", task_b),          # через 2 часа после прошлого шага
+    ])
+    sim.stop()
+
+По умолчанию движок сам в БД не пишет (persist=False): состояние в памяти,
+flush() — по требованию. Исключение — полночь: закрытый день записывается,
+движок переходит на план следующего (TimerEngine._rollover).
+"""
+from datetime import datetime, timedelta
+from typing import Optional, Union
+
+import repository as repo
+from clock import VirtualClock
+from lt_db import Settings
+from notify import CallbackSink
+from scheduler import Scheduler
+from timer import TimerEngine, NotificationScheduler
+
+When = Union[datetime, timedelta, str]
+
+
+class Simulation:
+
+    def __init__(self, plan_id: int, settings: Settings,
+                 start: Optional[datetime] = None, persist: bool = False):
+        self.clock = VirtualClock(start)
+        self.scheduler = Scheduler()
+        self.persist = persist
+        self.engine = TimerEngine(plan_id, settings, scheduler=self.scheduler,
+                                  autoflush=persist, clock=self.clock)
+        # (виртуальное время, заголовок, текст)
+        self.notifications: list[tuple[datetime, str, str]] = []
+        self.notifier = NotificationScheduler(
+            self.engine, settings, sink=CallbackSink(self._on_notify),
+        )
+        self.wakeups = 0
+
+    # ──────────────────────────────────────────────
+    #  Запуск / время
+    # ──────────────────────────────────────────────
+
+    def start(self):
+        self.engine.start()
+        self.notifier.start()
+
+    def stop(self):
+        self.notifier.stop()
+        self.engine.stop()
+
+    def now(self) -> datetime:
+        return self.clock.now()
+
+    def run_until(self, when: datetime):
+        """Переводит часы к when, отрабатывая по пути все дедлайны."""
+        target = self.clock.monotonic() + (when - self.clock.now()).total_seconds()
+        while True:
+            deadline = self.scheduler.next_deadline()
+            if deadline is None or deadline > target:
+                break
+            self.clock.advance_to(deadline)
+            self.scheduler.run_pending(deadline)
+            self.wakeups += 1
+        self.clock.advance_to(target)
+
+    def advance(self, seconds: float):
+        self.run_until(self.clock.now() + timedelta(seconds=seconds))
+
+    def flush(self):
+        """Пишет состояние движка в БД (при persist=False — кроме полуночи единственный путь)."""
+        self.engine._flush_sync()
+
+    # ──────────────────────────────────────────────
+    #  Сценарий
+    # ──────────────────────────────────────────────
+
+    def run(self, script: list[tuple]):
+        """
+        script — [(when, action, *args), ...] по возрастанию времени.
+        when: datetime; timedelta от текущего момента; "HH:MM" — сегодня
+        по виртуальным часам; "+H:MM" — через столько от текущего момента.
+        action: add / activate / deactivate / complete / skip / edit —
+        одноимённые методы движка (add → add_task, edit → update_task_meta).
+        """
+        for when, action, *args in script:
+            self.run_until(self._resolve(when))
+            self._apply(action, args)
+
+    def _resolve(self, when: When) -> datetime:
+        now = self.clock.now()
+        if isinstance(when, datetime):
+            return when
+        if isinstance(when, timedelta):
+            return now + when
+        if when.startswith("+"):
+            h, m = when[1:].split(":")
+            return now + timedelta(hours=int(h), minutes=int(m))
+        h, m = when.split(":")
+        return now.replace(hour=int(h), minute=int(m), second=0, microsecond=0)
+
+    def _apply(self, action: str, args: list):
+        engine = self.engine
+        if action == "add":
+            task_id, name, allocated, *rest = args
+            if self.persist:
+                repo.add_task(engine.plan_id, task_id, name, allocated,
+                              *rest[:1], position=len(engine.get_tasks()))
+            engine.add_task(task_id, name, allocated, *rest)
+        elif action == "activate":
+            engine.activate_task(*args)
+        elif action == "deactivate":
+            engine.deactivate()
+        elif action == "complete":
+            engine.complete_task(*args)
+        elif action == "skip":
+            engine.skip_task(*args)
+        elif action == "edit":
+            engine.update_task_meta(*args)
+        else:
+            raise ValueError(f"Неизвестное действие сценария: {action}")
+
+    def _on_notify(self, title: str, message: str):
+        self.notifications.append((self.clock.now(), title, message))
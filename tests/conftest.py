@@ -5,3 +5,26 @@ import sys, os
 _ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 if _ROOT not in sys.path:
     sys.path.insert(0, _ROOT)
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.pool import StaticPool
+
+import lt_db
+
+# Одна in-memory база на весь прогон — до первого импорта repository/timer
+# в тестах. StaticPool — одно соединение на все потоки (писатель, планировщик),
+# иначе каждый поток видел бы свою пустую базу. Тесты не подменяют движок
+# сами: тогда результат зависел бы от того, какой файл импортирован первым.
+lt_db.engine = create_engine(
+    "sqlite://", echo=False, poolclass=StaticPool,
+    connect_args={"check_same_thread": False},
+)
+
+
+@event.listens_for(lt_db.Base.metadata, "after_drop")
+def _reset_schema_version(target, connection, **kw):
+    """
+    setUp тестов делает drop_all + init_db: схемы больше нет — версия снова 0,
+    иначе init_db по PRAGMA user_version решил бы, что всё на месте.
+    """
+    lt_db._set_schema_version(connection, 0)
@@ -12,12 +12,10 @@ import unittest
 from datetime import date, timedelta
 from sqlalchemy import create_engine
 
-# Подменяем движок на in-memory ДО первого импорта database/repository
-import lt_db as _db_module
-_db_module.engine = create_engine("sqlite:///:memory:", echo=False)
-
+# In-memory база — в conftest.py
 import repository as repo
 import lt_db as database
+import db_stats
 from lt_db import (
     init_db, TaskStatus, RewardType,
     Settings, CoinBalance, Template, Preset
@@ -133,6 +131,69 @@ class TestTasks(BaseRepoTest):
         self.assertEqual(unfinished[0].id, t1.id)
 
 
+
+class TestScheduledMinute(BaseRepoTest):
+
+    def setUp(self):
+        super().setUp()
+        self.plan = repo.get_or_create_plan(self._today())
+
+    def _add(self, task_id, hhmm):
+        return repo.add_task(self.plan.id, task_id, task_id, 1800, hhmm)
+
+    def test_minute_of_day(self):
+        self.assertEqual(database.minute_of_day("09:05"), 545)
+        self.assertEqual(database.minute_of_day("9:05"), 545)
+        # Как strptime("%H:%M"): минуты одной цифрой тоже годятся
+        self.assertEqual(database.minute_of_day("9:5"), 545)
+        for bad in (None, "", "24:00", "10:60", "10-00", "123:00", ":5", "9:", "1:²"):
+            self.assertIsNone(database.minute_of_day(bad))
+
+    def test_column_follows_scheduled_time(self):
+        self.assertEqual(self._add("a", "10:30").scheduled_minute, 630)
+        repo.update_task("a", scheduled_time="07:15")
+        self.assertEqual(repo.get_tasks_for_plan(self.plan.id)[0].scheduled_minute, 435)
+        repo.update_task("a", scheduled_time=None)
+        self.assertIsNone(repo.get_tasks_for_plan(self.plan.id)[0].scheduled_minute)
+
+    def test_next_scheduled_task(self):
+        self._add("late", "18:00")
+        self._add("early", "08:00")
+        self._add("noon", "12:00")
+        self._add("free", None)
+        repo.update_task("noon", status=TaskStatus.COMPLETED)
+        self.assertEqual(repo.get_next_scheduled_task(self.plan.id, 9 * 60).id, "late")
+        self.assertEqual(repo.get_next_scheduled_task(self.plan.id, 0).id, "early")
+        self.assertIsNone(repo.get_next_scheduled_task(self.plan.id, 19 * 60))
+        self.assertEqual([t.id for t in repo.get_scheduled_tasks(self.plan.id)],
+                         ["early", "noon", "late"])
+
+    def test_backfill_from_strings(self):
+        from sqlalchemy import text
+        self._add("a", "06:45")
+        with database.engine.connect() as conn:
+            conn.execute(text("UPDATE tasks SET scheduled_minute = NULL"))
+            conn.commit()
+            database._backfill_scheduled_minute(conn)
+        self.assertEqual(repo.get_tasks_for_plan(self.plan.id)[0].scheduled_minute, 405)
+
+    def test_single_digit_rows_are_migrated(self):
+        from sqlalchemy import text
+        self._add("a", "9:5")
+        with database.engine.connect() as conn:
+            # Так строку оставил старый разбор
+            conn.execute(text("UPDATE tasks SET scheduled_minute = NULL"))
+            conn.commit()
+            database._m6_single_digit_minutes(conn)
+        self.assertEqual(repo.get_tasks_for_plan(self.plan.id)[0].scheduled_minute, 545)
+
+    def test_index_exists(self):
+        from sqlalchemy import inspect
+        indexes = {ix["name"]: ix["column_names"]
+                   for ix in inspect(database.engine).get_indexes("tasks")}
+        self.assertEqual(indexes["ix_tasks_plan_scheduled"], ["plan_id", "scheduled_minute"])
+
+
 # ──────────────────────────────────────────────────────────
 #  Геймификация — баланс и транзакции
 # ──────────────────────────────────────────────────────────
@@ -309,5 +370,428 @@ class TestTemplates(BaseRepoTest):
         self.assertEqual(len(user_presets), 0)
 
 
+    def test_user_presets_roundtrip(self):
+        presets = [{"name": "Утро", "templates": ["Зарядка", "Завтрак", "Нет такого"]},
+                   {"name": "Вечер", "templates": ["Ужин", "Дневник"]}]
+        repo.save_user_presets_compat(presets)
+        self.assertEqual(repo.get_user_presets_as_dicts(),
+                         [{"name": "Утро", "templates": ["Зарядка", "Завтрак"]},
+                          {"name": "Вечер", "templates": ["Ужин", "Дневник"]}])
+        self.assertEqual(repo.get_user_preset_template_names("Вечер"), ["Ужин", "Дневник"])
+        self.assertIsNone(repo.get_user_preset_template_names("💼 Рабочий день"))
+        self.assertEqual([t["name"] for t in repo.get_templates_by_names(["Ужин", "Сон"])],
+                         ["Сон", "Ужин"])
+
+
+# ──────────────────────────────────────────────────────────
+#  PRAGMA-профиль SQLite
+# ──────────────────────────────────────────────────────────
+
+class TestSqliteProfile(unittest.TestCase):
+
+    def _pragmas(self, eng):
+        from sqlalchemy import text
+        with eng.connect() as conn:
+            return {name: conn.execute(text(f"PRAGMA {name}")).scalar()
+                    for name in database.SQLITE_PRAGMAS}
+
+    def test_profile_applied_to_every_connection(self):
+        import tempfile
+        with tempfile.TemporaryDirectory() as tmp:
+            eng = database.make_engine(f"sqlite:///{os.path.join(tmp, 'p.db')}")
+            got = self._pragmas(eng)
+            eng.dispose()
+        self.assertEqual(got, {"journal_mode": "wal", "synchronous": 1, "busy_timeout": 5000,
+                               "cache_size": -16_000, "mmap_size": 64 * 1024 * 1024,
+                               "temp_store": 2})
+
+    def test_custom_and_empty_profile(self):
+        import tempfile
+        with tempfile.TemporaryDirectory() as tmp:
+            url = f"sqlite:///{os.path.join(tmp, 'p.db')}"
+            eng = database.make_engine(url, pragmas={"busy_timeout": 100})
+            self.assertEqual(self._pragmas(eng)["busy_timeout"], 100)
+            eng.dispose()
+            eng = database.make_engine(url, pragmas={})
+            self.assertEqual(self._pragmas(eng)["synchronous"], 2)     # FULL по умолчанию
+            eng.dispose()
+
+
+# ──────────────────────────────────────────────────────────
+#  Пакетные вставка и изменение задач
+# ──────────────────────────────────────────────────────────
+
+class TestBulkTasks(BaseRepoTest):
+
+    def setUp(self):
+        super().setUp()
+        self.plan = repo.get_or_create_plan(self._today())
+
+    def _rows(self, n, prefix="t"):
+        return [{"id": f"{prefix}{i}", "name": f"Задача {i}", "allocated_seconds": 600}
+                for i in range(n)]
+
+    def _tasks(self):
+        return repo.get_tasks_for_plan(self.plan.id)
+
+    def test_preset_of_50_is_one_statement_and_one_commit(self):
+        from sqlalchemy import event
+        commits = []
+
+        def on_commit(conn):
+            commits.append(conn)
+        event.listen(database.engine, "commit", on_commit)
+        self.addCleanup(event.remove, database.engine, "commit", on_commit)
+        with db_stats.count_queries() as q:
+            self.assertEqual(repo.add_tasks_bulk(self.plan.id, self._rows(50)), 50)
+        self.assertEqual((q.statements, len(commits)), (1, 1))
+        self.assertEqual(len(self._tasks()), 50)
+
+    def test_positions_continue_after_existing(self):
+        repo.add_task(self.plan.id, "old", "Старая", 600, position=3)
+        repo.add_tasks_bulk(self.plan.id, self._rows(3))
+        self.assertEqual([(t.id, t.position) for t in self._tasks()],
+                         [("old", 3), ("t0", 4), ("t1", 5), ("t2", 6)])
+
+    def test_fields_and_defaults(self):
+        from lt_db import Priority
+        repo.add_tasks_bulk(self.plan.id, [
+            {"id": "a", "name": "А", "allocated_seconds": 900, "scheduled_time": "08:30"},
+            {"id": "b", "name": "Б", "allocated_seconds": 300, "priority": Priority.LOW},
+        ])
+        a, b = self._tasks()
+        self.assertEqual((a.position, a.scheduled_minute, a.priority, a.status),
+                         (0, 510, Priority.NORMAL, TaskStatus.PENDING))
+        self.assertEqual((b.scheduled_time, b.scheduled_minute, b.priority),
+                         (None, None, Priority.LOW))
+        self.assertIsNotNone(a.created_at)
+
+    def test_empty_rows(self):
+        with db_stats.count_queries() as q:
+            self.assertEqual(repo.add_tasks_bulk(self.plan.id, []), 0)
+        self.assertEqual(q.statements, 0)
+
+    def test_update_groups_by_fields(self):
+        repo.add_tasks_bulk(self.plan.id, self._rows(4))
+        with db_stats.count_queries() as q:
+            groups = repo.update_tasks_bulk([
+                {"id": "t0", "name": "А"},
+                {"id": "t1", "name": "Б"},
+                {"id": "t2", "status": TaskStatus.SKIPPED, "elapsed_seconds": 30},
+                {"id": "t3", "scheduled_time": "21:00"},
+            ])
+        self.assertEqual((groups, q.statements), (3, 3))
+        t0, t1, t2, t3 = self._tasks()
+        self.assertEqual((t0.name, t1.name), ("А", "Б"))
+        self.assertEqual((t2.status, t2.elapsed_seconds), (TaskStatus.SKIPPED, 30))
+        self.assertEqual(t3.scheduled_minute, 21 * 60)
+
+    def test_inside_unit_of_work(self):
+        repo.add_task(self.plan.id, "src", "Вчерашняя", 600)
+        with repo.unit_of_work():
+            repo.mark_carried_over(["src"])
+            repo.add_tasks_bulk(self.plan.id, self._rows(2))
+        self.assertEqual([t.position for t in self._tasks()], [0, 1, 2])
+        self.assertTrue(self._tasks()[0].carried_over)
+
+
+# ──────────────────────────────────────────────────────────
+#  unit_of_work — несколько вызовов, одна транзакция
+# ──────────────────────────────────────────────────────────
+
+class TestUnitOfWork(BaseRepoTest):
+
+    def setUp(self):
+        super().setUp()
+        from sqlalchemy import event
+        self.plan = repo.get_or_create_plan(self._today())
+        self.commits = 0
+
+        def on_commit(conn):
+            self.commits += 1
+        event.listen(database.engine, "commit", on_commit)
+        self.addCleanup(event.remove, database.engine, "commit", on_commit)
+
+    def _ids(self):
+        return [t.id for t in repo.get_tasks_for_plan(self.plan.id)]
+
+    def test_one_commit_for_the_block(self):
+        with repo.unit_of_work():
+            for i in range(5):
+                repo.add_task(self.plan.id, f"t{i}", "Задача", 600, position=i)
+            repo.mark_carried_over(["t0"])
+            # Внутри блока изменения уже видны
+            self.assertEqual(len(self._ids()), 5)
+        self.assertEqual(self.commits, 1)
+        self.assertEqual(self._ids(), [f"t{i}" for i in range(5)])
+
+    def test_exception_rolls_back_everything(self):
+        with self.assertRaises(ValueError):
+            with repo.unit_of_work():
+                repo.add_task(self.plan.id, "a", "Задача", 600)
+                repo.add_transaction(5, "Бонус")
+                raise ValueError("стоп")
+        self.assertEqual(self._ids(), [])
+        self.assertEqual(repo.get_balance().balance, 0)
+
+    def test_nested_joins_outer(self):
+        with repo.unit_of_work() as outer:
+            with repo.unit_of_work() as inner:
+                repo.add_task(self.plan.id, "a", "Задача", 600)
+            self.assertIs(inner, outer)
+            self.assertEqual(self.commits, 0)
+        self.assertEqual(self.commits, 1)
+
+    def test_returned_objects_survive_commit(self):
+        with repo.unit_of_work():
+            plan = repo.get_or_create_plan(self._today() + timedelta(days=1))
+            task = repo.add_task(plan.id, "a", "Задача", 600, "10:30")
+        self.assertEqual((plan.date, task.scheduled_minute),
+                         (self._today() + timedelta(days=1), 630))
+
+    def test_reads_do_not_detach_callers_objects(self):
+        repo.add_task(self.plan.id, "a", "Задача", 600, "10:30")
+        with repo.unit_of_work() as s:
+            mine = s.get(database.CoinBalance, 1)
+            repo.get_plan_with_tasks(self._today())
+            repo.get_unfinished_from_date(self._today())
+            repo.get_scheduled_tasks(self.plan.id)
+            self.assertIn(mine, s)
+
+    def test_without_block_each_call_commits(self):
+        repo.add_task(self.plan.id, "a", "Задача", 600)
+        repo.add_task(self.plan.id, "b", "Задача", 600)
+        self.assertEqual(self.commits, 2)
+
+
+# ──────────────────────────────────────────────────────────
+#  Версионированные миграции
+# ──────────────────────────────────────────────────────────
+
+class TestMigrations(unittest.TestCase):
+
+    # Схема до версионирования: без priority, carried_over, journal_seq,
+    # scheduled_minute, task_duration_minutes
+    LEGACY_SCHEMA = (
+        "CREATE TABLE day_plans (id INTEGER PRIMARY KEY, date DATE NOT NULL UNIQUE, "
+        "procrastination_used INTEGER, day_bonus INTEGER, day_penalty INTEGER, "
+        "day_total INTEGER, day_finalized BOOLEAN)",
+        "CREATE TABLE tasks (id VARCHAR PRIMARY KEY, plan_id INTEGER NOT NULL, "
+        "name VARCHAR NOT NULL, allocated_seconds INTEGER NOT NULL, "
+        "elapsed_seconds INTEGER, overrun_seconds INTEGER, status VARCHAR, "
+        "scheduled_time VARCHAR, position INTEGER, created_at DATETIME, "
+        "completed_at DATETIME, coins_earned INTEGER, coins_penalty INTEGER)",
+        "CREATE TABLE rewards (id INTEGER PRIMARY KEY, name VARCHAR NOT NULL, "
+        "description TEXT, price INTEGER NOT NULL, reward_type VARCHAR NOT NULL, "
+        "count INTEGER, count_initial INTEGER, is_active BOOLEAN, created_at DATETIME)",
+        "INSERT INTO day_plans (id, date) VALUES (1, '2024-01-01')",
+        "INSERT INTO tasks (id, plan_id, name, allocated_seconds, scheduled_time) "
+        "VALUES ('t1', 1, 'Старая', 600, '09:30')",
+    )
+
+    def setUp(self):
+        from sqlalchemy.pool import StaticPool
+        self._old = database.engine
+        database.engine = create_engine("sqlite://", poolclass=StaticPool)
+        self.addCleanup(setattr, database, "engine", self._old)
+
+    def _sql(self, sql):
+        from sqlalchemy import text
+        with database.engine.connect() as conn:
+            return conn.execute(text(sql)).all()
+
+    def _columns(self, table):
+        return {row[1] for row in self._sql(f"PRAGMA table_info({table})")}
+
+    def test_fresh_db_gets_current_version(self):
+        init_db()
+        self.assertEqual(self._sql("PRAGMA user_version")[0][0], database.SCHEMA_VERSION)
+        self.assertTrue(repo.get_templates())
+
+    def test_current_schema_costs_one_query(self):
+        init_db()
+        with db_stats.count_queries() as q:
+            init_db()
+        self.assertEqual(q.statements, 1)
+
+    def test_legacy_db_migrated_and_backfilled(self):
+        from sqlalchemy import text
+        with database.engine.begin() as conn:
+            for sql in self.LEGACY_SCHEMA:
+                conn.execute(text(sql))
+        init_db()
+        self.assertLessEqual({"priority", "carried_over", "scheduled_minute"},
+                             self._columns("tasks"))
+        self.assertIn("journal_seq", self._columns("day_plans"))
+        self.assertIn("task_duration_minutes", self._columns("rewards"))
+        self.assertEqual(self._sql("SELECT scheduled_minute FROM tasks"), [(9 * 60 + 30,)])
+        indexes = {name for name, in self._sql("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        self.assertLessEqual({"ix_tasks_plan_scheduled", "ix_tasks_plan_position",
+                              "ix_coin_transactions_created_at"}, indexes)
+        self.assertEqual(self._sql("PRAGMA user_version")[0][0], database.SCHEMA_VERSION)
+        self.assertTrue(repo.get_presets())
+
+    def test_only_missing_steps_run(self):
+        init_db()
+        calls = []
+        self.addCleanup(setattr, database, "MIGRATIONS", database.MIGRATIONS)
+        self.addCleanup(setattr, database, "SCHEMA_VERSION", database.SCHEMA_VERSION)
+        database.MIGRATIONS = database.MIGRATIONS + [lambda conn: calls.append(conn)]
+        database.SCHEMA_VERSION += 1
+        init_db()
+        init_db()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(self._sql("PRAGMA user_version")[0][0], database.SCHEMA_VERSION)
+
+    def test_other_dialect_fails_clearly(self):
+        from unittest.mock import MagicMock
+        conn = MagicMock()
+        conn.dialect.name = "postgresql"
+        for call in (lambda: database.schema_version(conn),
+                     lambda: database._set_schema_version(conn, 1)):
+            with self.assertRaisesRegex(RuntimeError, "SQLite"):
+                call()
+        conn.execute.assert_not_called()
+
+    def test_drop_all_resets_version(self):
+        # Сброс версии — фикстура tests/conftest.py
+        init_db()
+        database.Base.metadata.drop_all(database.engine)
+        init_db()
+        self.assertIsNotNone(repo.get_settings())
+
+
+# ──────────────────────────────────────────────────────────
+#  Планы запросов: горячие пути идут по индексам
+# ──────────────────────────────────────────────────────────
+
+class TestQueryPlans(BaseRepoTest):
+
+    def setUp(self):
+        super().setUp()
+        self.plan = repo.get_or_create_plan(self._today())
+        for i in range(3):
+            repo.add_task(self.plan.id, f"t{i}", f"Задача {i}", 600, position=i)
+        repo.add_transaction(5, "Тест")
+
+    def _plan_of(self, call) -> str:
+        """EXPLAIN QUERY PLAN каждого SELECT, выполненного call(), одной строкой."""
+        from sqlalchemy import event, text
+        captured = []
+
+        def capture(conn, cursor, statement, parameters, context, executemany):
+            if statement.lstrip().upper().startswith("SELECT"):
+                captured.append((statement, parameters))
+
+        event.listen(database.engine, "before_cursor_execute", capture)
+        try:
+            call()
+        finally:
+            event.remove(database.engine, "before_cursor_execute", capture)
+        self.assertTrue(captured)
+        lines = []
+        with database.engine.connect() as conn:
+            for statement, parameters in captured:
+                rows = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters)
+                lines += [row[-1] for row in rows]
+        return "\n".join(lines)
+
+    def assertUsesIndex(self, call, index):
+        plan = self._plan_of(call)
+        self.assertIn(index, plan)
+        self.assertNotIn("TEMP B-TREE", plan)
+
+    def test_tasks_for_plan(self):
+        self.assertUsesIndex(lambda: repo.get_tasks_for_plan(self.plan.id),
+                             "ix_tasks_plan_position")
+
+    def test_plan_tasks_relationship(self):
+        def lazy_load():
+            with database.get_session() as s:
+                list(s.get(database.DayPlan, self.plan.id).tasks)
+        self.assertUsesIndex(lazy_load, "ix_tasks_plan_position")
+
+    def test_transactions_newest_first(self):
+        self.assertUsesIndex(repo.get_transactions, "ix_coin_transactions_created_at")
+
+    def test_unfinished_from_date(self):
+        self.assertUsesIndex(lambda: repo.get_unfinished_from_date(self._today()),
+                             "ix_tasks_plan_position")
+
+    def test_unfinished_from_date_filters(self):
+        repo.update_task("t0", status=TaskStatus.COMPLETED)
+        repo.mark_carried_over(["t1"])
+        self.assertEqual([t.id for t in repo.get_unfinished_from_date(self._today())], ["t2"])
+
+
+# ──────────────────────────────────────────────────────────
+#  Счётчик SQL (db_stats)
+# ──────────────────────────────────────────────────────────
+
+class TestStatementCounts(BaseRepoTest):
+
+    def _presets(self, n):
+        names = [t.name for t in repo.get_templates()][:6]
+        repo.save_user_presets_compat(
+            [{"name": f"Пресет {i}", "templates": names} for i in range(n)])
+
+    def test_presets_do_not_query_per_item(self):
+        self._presets(1)
+        with db_stats.count_queries() as one:
+            repo.get_user_presets_as_dicts()
+        self._presets(10)
+        with db_stats.count_queries() as ten:
+            repo.get_user_presets_as_dicts()
+        self.assertEqual(one.statements, ten.statements)
+        self.assertLessEqual(ten.statements, 2)
+
+    def test_save_presets_resolves_names_in_one_query(self):
+        names = [t.name for t in repo.get_templates()][:6]
+        with db_stats.count_queries() as q:
+            repo.save_user_presets_compat([{"name": "П", "templates": names}])
+        # DELETE пунктов и пресетов, SELECT шаблонов, INSERT пресета, INSERT пунктов
+        self.assertEqual(q.statements, 5)
+
+    def test_save_presets_removes_old_items(self):
+        from sqlalchemy import func, select
+        self._presets(3)
+        self._presets(1)
+        with database.get_session() as s:
+            self.assertEqual(s.scalar(select(func.count()).select_from(database.PresetItem)),
+                             sum(len(p.items) for p in s.query(database.Preset)))
+
+    def test_instrumentation_is_opt_in(self):
+        # Без LIFE_TIMER_DB_STATS=1 функции репозитория не обёрнуты
+        self.addCleanup(setattr, db_stats, "ENABLED", db_stats.ENABLED)
+        db_stats.ENABLED = False
+        self.assertIs(db_stats.instrumented(repo.get_balance), repo.get_balance)
+
+    def test_per_function_stats_and_budget_warning(self):
+        self.addCleanup(setattr, db_stats, "ENABLED", db_stats.ENABLED)
+        db_stats.ENABLED = True
+        get_balance = db_stats.instrumented(repo.get_balance)
+        get_settings = db_stats.instrumented(repo.get_settings)
+        db_stats.reset()
+        get_balance()
+        get_balance()
+        s = db_stats.stats()["get_balance"]
+        self.assertEqual((s["calls"], s["statements"], s["max_statements"]), (2, 2, 1))
+        self.assertGreater(s["seconds"], 0)
+
+        old = db_stats.STATEMENT_BUDGET
+        db_stats.STATEMENT_BUDGET = 0
+        self.addCleanup(setattr, db_stats, "STATEMENT_BUDGET", old)
+        with self.assertLogs("db_stats", level="WARNING") as logs:
+            get_settings()
+        self.assertIn("get_settings", logs.output[0])
+
+    def test_nested_counters(self):
+        with db_stats.count_queries() as outer:
+            repo.get_settings()
+            with db_stats.count_queries() as inner:
+                repo.get_balance()
+        self.assertEqual((outer.statements, inner.statements), (2, 1))
+
+
 if __name__ == "__main__":
     unittest.main(verbosity=2)
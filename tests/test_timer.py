@@ -0,0 +1,1340 @@
+"""
+Тесты движка таймера на in-memory SQLite.
+Требуют SQLAlchemy — запускать локально: pip install sqlalchemy
+"""
+import sys, os
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, _ROOT)
+
+import asyncio
+import tempfile
+import threading
+import time
+import unittest
+import uuid
+from datetime import date, datetime, time as dt_time, timedelta
+
+# In-memory база (StaticPool, общая для всех потоков) — в conftest.py
+import repository as repo
+import db_stats
+import lt_db as database
+from lt_db import init_db, TaskStatus
+from adapter import AppSettings
+from timer import TimerEngine
+from scheduler import Scheduler, AsyncioScheduler
+from engine_host import EngineHost
+from writer import WriteBehind
+from async_timer import AsyncTimerEngine
+from journal import Journal
+from notify import (BatchingSink, CallbackSink, LogSink, MultiSink, NullSink,
+                    PlyerSink, system_sink)
+from clock import VirtualClock
+from simulation import Simulation
+
+
+class BaseTimerTest(unittest.TestCase):
+    def setUp(self):
+        database.Base.metadata.drop_all(database.engine)
+        init_db()
+        self.plan = repo.get_or_create_plan(date.today())
+        self.settings = AppSettings()
+        # Общий писатель на тест: к следующему setUp (drop_all) всё дописано
+        self.writer = WriteBehind()
+        self.addCleanup(self.writer.stop)
+
+    def _add(self, engine, name="Задача", alloc=600):
+        task_id = str(uuid.uuid4())
+        repo.add_task(self.plan.id, task_id, name, alloc,
+                      position=len(engine.get_tasks()))
+        engine.add_task(task_id, name, alloc)
+        return task_id
+
+    def _db_task(self, task_id):
+        return next(t for t in repo.get_tasks_for_plan(self.plan.id)
+                    if t.id == task_id)
+
+
+# ──────────────────────────────────────────────────────────
+#  Flush
+# ──────────────────────────────────────────────────────────
+
+class TestFlush(BaseTimerTest):
+
+    def test_idle_flush_writes_nothing(self):
+        engine = TimerEngine(self.plan.id, self.settings, writer=self.writer)
+        for _ in range(5):
+            self._add(engine)
+        engine.flush(wait=True)
+        before = dict(self.writer.stats)
+        with db_stats.count_queries() as q:
+            engine.flush(wait=True)
+        # Писателю ничего не отдано, в этом потоке БД не тронута
+        self.assertEqual(self.writer.stats, before)
+        self.assertEqual(self.writer._submitted, self.writer._committed)
+        self.assertEqual(q.statements, 0)
+
+    def test_flush_writes_only_dirty_rows(self):
+        engine = TimerEngine(self.plan.id, self.settings, writer=self.writer)
+        ids = [self._add(engine) for _ in range(5)]
+        engine.activate_task(ids[0])
+        for _ in range(3):
+            engine._advance(1)
+        engine.flush(wait=True)
+        # Одна задача + строка плана (прокрастинация не менялась)
+        self.assertEqual(engine.flush_stats["last_rows"], 1)
+        self.assertEqual(engine.flush_stats["last_statements"], 1)
+        t = self._db_task(ids[0])
+        self.assertEqual(t.elapsed_seconds, 3)
+        self.assertEqual(t.status, TaskStatus.ACTIVE)
+
+        # Повторный flush без изменений до писателя даже не доходит
+        flushes = engine.flush_stats["flushes"]
+        engine.flush(wait=True)
+        self.assertEqual(engine.flush_stats["flushes"], flushes)
+
+    def test_flush_includes_plan_row(self):
+        engine = TimerEngine(self.plan.id, self.settings, writer=self.writer)
+        self._add(engine)
+        engine._advance(2)
+        engine.flush(wait=True)
+        self.assertEqual(engine.flush_stats["last_rows"], 0)
+        self.assertEqual(engine.flush_stats["last_statements"], 1)
+        self.assertEqual(repo.get_or_create_plan(date.today()).procrastination_used, 2)
+
+    def test_concurrent_flushes_keep_newest_values(self):
+        engine = TimerEngine(self.plan.id, self.settings, writer=self.writer)
+        task_id = self._add(engine)
+        engine.activate_task(task_id)
+        engine._advance(5)
+        entered, gate = threading.Event(), threading.Event()
+        real_submit = self.writer.submit
+
+        def slow_submit(*args, **kwargs):
+            # Первый flush задерживается между сбором изменений и submit
+            if not entered.is_set():
+                entered.set()
+                gate.wait(timeout=2)
+            return real_submit(*args, **kwargs)
+        self.writer.submit = slow_submit
+
+        def newer_flush():
+            with engine._lock:
+                engine._advance(5)
+            engine.flush()
+        older = threading.Thread(target=engine.flush)
+        older.start()
+        entered.wait(timeout=2)
+        newer = threading.Thread(target=newer_flush)
+        newer.start()
+        newer.join(timeout=0.2)
+        gate.set()
+        older.join()
+        newer.join()
+        self.writer.wait(timeout=2)
+        self.assertEqual(self._db_task(task_id).elapsed_seconds, 10)
+
+    def test_complete_flushes_status(self):
+        engine = TimerEngine(self.plan.id, self.settings, writer=self.writer)
+        task_id = self._add(engine)
+        engine.complete_task(task_id)
+        engine.flush(wait=True)     # complete отдаёт запись писателю, не ждёт
+        t = self._db_task(task_id)
+        self.assertEqual(t.status, TaskStatus.COMPLETED)
+        self.assertIsNotNone(t.completed_at)
+
+    def test_delete_during_pending_flush(self):
+        # Задача удалена (main._delete_task), пока её строка ждёт писателя
+        gate = threading.Event()
+
+        def gated(batch):
+            gate.wait(2)
+            return repo.flush_engine_states(batch)
+        writer = WriteBehind(gated)
+        self.addCleanup(writer.stop)
+        engine = TimerEngine(self.plan.id, self.settings, writer=writer)
+        doomed, kept = self._add(engine), self._add(engine)
+        engine.activate_task(doomed)
+        engine._advance(3)
+        engine.flush()
+        engine.remove_task(doomed)
+        repo.delete_task(doomed)
+        gate.set()
+        self.assertTrue(writer.wait(timeout=2))
+        self.assertEqual(writer.stats["errors"], 0)
+
+        engine.activate_task(kept)
+        engine._advance(2)
+        self.assertTrue(engine.flush(wait=True, timeout=2))
+        self.assertEqual(self._db_task(kept).elapsed_seconds, 2)
+
+    def test_state_survives_reload(self):
+        engine = TimerEngine(self.plan.id, self.settings, writer=self.writer)
+        task_id = self._add(engine)
+        engine.activate_task(task_id)
+        for _ in range(4):
+            engine._advance(1)
+        engine.flush(wait=True)
+        reloaded = TimerEngine(self.plan.id, self.settings, writer=self.writer)
+        self.assertEqual(reloaded.get_task(task_id).elapsed_seconds, 4)
+
+
+# ──────────────────────────────────────────────────────────
+#  Учёт времени по monotonic-отрезкам
+# ──────────────────────────────────────────────────────────
+
+class FakeClockTest(BaseTimerTest):
+
+    def setUp(self):
+        super().setUp()
+        self.clock = VirtualClock(datetime.combine(date.today(), dt_time(9, 0)),
+                                  monotonic_start=100.0)
+
+    def _engine(self, **settings):
+        for k, v in settings.items():
+            setattr(self.settings, k, v)
+        engine = TimerEngine(self.plan.id, self.settings, clock=self.clock,
+                             writer=self.writer)
+        engine._seg_start = self.clock.monotonic()  # как будто start() был сейчас
+        return engine
+
+
+class TestTimekeeping(FakeClockTest):
+
+    def test_incomplete_clock_fails_at_creation(self):
+        from clock import Clock
+
+        class NoTime(Clock):
+            def monotonic(self):
+                return 0.0
+
+            def now(self):
+                return datetime.now()
+        with self.assertRaises(TypeError):
+            NoTime()
+
+    def test_fraction_of_second_is_kept(self):
+        engine = self._engine()
+        task_id = self._add(engine)
+        engine.activate_task(task_id)
+        self.clock.advance(3.7)
+        self.assertEqual(engine.get_task(task_id).elapsed_seconds, 3)
+        self.clock.advance(0.5)
+        self.assertEqual(engine.get_task(task_id).elapsed_seconds, 4)
+
+    def test_gap_is_counted_in_one_step(self):
+        # Пропущенные пробуждения (нагрузка, suspend) не теряют время
+        engine = self._engine()
+        self.clock.advance(3600)
+        self.assertEqual(engine.get_proc_used(), 3600)
+
+    def test_switch_splits_segment(self):
+        engine = self._engine()
+        task_id = self._add(engine)
+        self.clock.advance(10)
+        engine.activate_task(task_id)
+        self.clock.advance(15)
+        self.assertEqual(engine.get_proc_used(), 10)
+        self.assertEqual(engine.get_task(task_id).elapsed_seconds, 15)
+
+    def test_stop_behavior_spills_into_procrastination(self):
+        from lt_db import OverrunBehavior
+        engine = self._engine(overrun_behavior=OverrunBehavior.STOP)
+        task_id = self._add(engine, alloc=5)
+        engine.activate_task(task_id)
+        self.clock.advance(8)
+        self.assertEqual(engine.get_task(task_id).elapsed_seconds, 5)
+        self.assertIsNone(engine.active_task_id)
+        self.assertEqual(engine.get_proc_used(), 3)
+
+    def test_continue_overrun_goes_to_procrastination(self):
+        engine = self._engine()
+        task_id = self._add(engine, alloc=5)
+        engine.activate_task(task_id)
+        self.clock.advance(8)
+        t = engine.get_task(task_id)
+        self.assertEqual(t.elapsed_seconds, 8)
+        self.assertEqual(t.overrun_seconds, 3)
+        self.assertEqual(engine.get_proc_used(), 3)
+
+
+# ──────────────────────────────────────────────────────────
+#  Агрегаты прокрастинации
+# ──────────────────────────────────────────────────────────
+
+class TestProcrastinationAggregates(FakeClockTest):
+
+    def _brute_limit(self, engine):
+        tasks_time = sum(
+            t.elapsed_seconds if t.status in (TaskStatus.COMPLETED, TaskStatus.SKIPPED)
+            else t.allocated_seconds
+            for t in engine.get_tasks()
+        )
+        return max(0, engine.SECONDS_IN_DAY - tasks_time)
+
+    def _brute_pending(self, engine):
+        return sum(t.allocated_seconds for t in engine.get_tasks()
+                   if t.status not in (TaskStatus.COMPLETED, TaskStatus.SKIPPED))
+
+    def _check(self, engine):
+        self.assertEqual(engine.procrastination_limit(), self._brute_limit(engine))
+        self.assertEqual(engine._pending_alloc, self._brute_pending(engine))
+
+    def test_aggregates_follow_every_operation(self):
+        from lt_db import OverrunSource
+        engine = self._engine(overrun_source=OverrunSource.PROPORTIONAL)
+        ids = [self._add(engine, alloc=600 * (i + 1)) for i in range(5)]
+        self._check(engine)
+
+        engine.activate_task(ids[0])
+        self.clock.advance(700)          # перерасход съедает чужое время
+        self._check(engine)
+
+        engine.complete_task(ids[0])
+        self._check(engine)
+        engine.skip_task(ids[1])
+        self._check(engine)
+        engine.update_task_meta(ids[2], "Новое имя", 100, None)
+        self._check(engine)
+        engine.remove_task(ids[3])
+        self._check(engine)
+
+    def test_aggregates_after_reload(self):
+        engine = self._engine()
+        ids = [self._add(engine, alloc=600) for _ in range(3)]
+        engine.activate_task(ids[0])
+        self.clock.advance(100)
+        engine.complete_task(ids[0])
+        engine.flush(wait=True)
+        reloaded = TimerEngine(self.plan.id, self.settings, clock=self.clock,
+                             writer=self.writer)
+        self.assertEqual(reloaded._pending_alloc, 1200)
+        self.assertEqual(reloaded._finished_elapsed, 100)
+
+
+# ──────────────────────────────────────────────────────────
+#  Пропорциональный перерасход
+# ──────────────────────────────────────────────────────────
+
+class TestProportionalOverrun(FakeClockTest):
+
+    def setUp(self):
+        super().setUp()
+        from lt_db import OverrunSource
+        self.engine = self._engine(overrun_source=OverrunSource.PROPORTIONAL)
+        self.active = self._add(self.engine, alloc=10)
+        self.a = self._add(self.engine, alloc=100)
+        self.b = self._add(self.engine, alloc=200)
+        self.engine.activate_task(self.active)
+
+    def test_ticks_do_not_touch_other_tasks(self):
+        self.clock.advance(20)
+        with self.engine._lock:
+            self.engine._settle()
+            # Сырые записи не переписаны — только долг
+            self.assertEqual(self.engine._tasks[self.a].allocated_seconds, 100)
+            self.assertEqual(self.engine._shrink_debt, 10)
+
+    def test_debt_is_distributed_exactly(self):
+        self.clock.advance(20)                      # 10 секунд перерасхода
+        a = self.engine.get_task(self.a).allocated_seconds
+        b = self.engine.get_task(self.b).allocated_seconds
+        self.assertEqual((100 - a) + (200 - b), 10)
+        self.assertEqual((a, b), (97, 193))
+
+    def test_long_overrun_never_goes_negative(self):
+        self.clock.advance(10_000)
+        self.assertEqual(self.engine.get_task(self.a).allocated_seconds, 0)
+        self.assertEqual(self.engine.get_task(self.b).allocated_seconds, 0)
+        self.assertEqual(self.engine._pending_alloc, 10)
+
+    def test_shrunk_allocation_is_flushed(self):
+        self.clock.advance(20)
+        self.engine.flush(wait=True)
+        self.assertEqual(self._db_task(self.a).allocated_seconds, 97)
+        self.assertEqual(self._db_task(self.b).allocated_seconds, 193)
+
+    def test_result_does_not_depend_on_read_frequency(self):
+        # Чтение каждую секунду и одно чтение в конце дают одно и то же
+        other = self._engine()
+        for task_id, alloc in ((self.active, 10), (self.a, 100), (self.b, 200)):
+            other.add_task(task_id, "T", alloc)
+        other.activate_task(self.active)
+        for _ in range(37):
+            self.clock.advance(1)
+            self.engine.snapshot()
+        for task_id in (self.a, self.b):
+            self.assertEqual(self.engine.get_task(task_id).allocated_seconds,
+                             other.get_task(task_id).allocated_seconds)
+
+    def test_pool_is_kept_between_reads(self):
+        builds = []
+        build = self.engine._build_shrink_pool
+        self.engine._build_shrink_pool = lambda: (builds.append(1), build())
+        for _ in range(30):
+            self.clock.advance(1)
+            self.engine.snapshot()
+        self.assertEqual(len(builds), 1)
+
+    def test_pool_follows_task_changes(self):
+        self.clock.advance(15)                      # 5 секунд перерасхода
+        self.engine.snapshot()
+        self.engine.complete_task(self.a)
+        a_after = self.engine.get_task(self.a).allocated_seconds
+        c = self._add(self.engine, alloc=200)
+        self.clock.advance(10)
+        # Завершённая задача больше не ужимается, новая — ужимается
+        self.assertEqual(self.engine.get_task(self.a).allocated_seconds, a_after)
+        self.assertLess(self.engine.get_task(c).allocated_seconds, 200)
+        total = sum(self.engine.get_task(t).allocated_seconds for t in (self.b, c))
+        self.assertEqual(total, 400 - (15 - (100 - a_after)))
+
+    def test_per_second_cost_does_not_grow_with_n(self):
+        from lt_db import OverrunSource
+
+        def per_second(n, source):
+            engine = self._engine(overrun_source=source)
+            for i in range(n):
+                engine.add_task(f"t{i}", "T", 600 + i % 7)
+            engine.activate_task("t0")
+            self.clock.advance(700)                 # t0 уже в перерасходе
+            engine.snapshot()
+            best = float("inf")
+            for _ in range(5):
+                start = time.perf_counter()
+                for _ in range(20):
+                    self.clock.advance(1)
+                    engine.snapshot()
+                best = min(best, time.perf_counter() - start)
+            return best
+
+        n = 5_000
+        proportional = per_second(n, OverrunSource.PROPORTIONAL)
+        procrastination = per_second(n, OverrunSource.PROCRASTINATION)
+        # Раньше пул пересобирался каждую секунду: в сотни раз медленнее
+        self.assertLess(proportional, procrastination * 5)
+
+
+# ──────────────────────────────────────────────────────────
+#  Write-behind
+# ──────────────────────────────────────────────────────────
+
+class TestWriteBehind(unittest.TestCase):
+
+    def setUp(self):
+        self.written = []
+        self.gate = threading.Event()
+        self.gate.set()
+        self.fail = 0
+
+    def _write(self, batch):
+        self.gate.wait(2)
+        if self.fail:
+            self.fail -= 1
+            raise RuntimeError("db is locked")
+        self.written.append(batch)
+        return 1
+
+    def _writer(self, **kwargs):
+        writer = WriteBehind(self._write, **kwargs)
+        self.addCleanup(writer.stop, 2)
+        return writer
+
+    def test_updates_to_same_row_are_coalesced(self):
+        writer = self._writer()
+        self.gate.clear()                       # писатель занят первой пачкой
+        writer.submit(1, {}, [{"id": "x", "elapsed_seconds": 1}])
+        time.sleep(0.05)
+        writer.submit(1, {"procrastination_used": 5},
+                      [{"id": "x", "elapsed_seconds": 2}])
+        writer.submit(1, {}, [{"id": "x", "status": "active"},
+                              {"id": "y", "elapsed_seconds": 7}])
+        self.gate.set()
+        self.assertTrue(writer.wait(timeout=2))
+        rows = {r["id"]: r for batch in self.written[1:] for _, _, rs in batch for r in rs}
+        self.assertEqual(rows["x"], {"id": "x", "elapsed_seconds": 2, "status": "active"})
+        self.assertEqual(len(self.written), 2)
+
+    def test_failed_write_is_retried_under_newer_values(self):
+        WriteBehind.RETRY_DELAY, saved = 0.01, WriteBehind.RETRY_DELAY
+        self.addCleanup(setattr, WriteBehind, "RETRY_DELAY", saved)
+        self.fail = 1
+        committed = []
+        writer = self._writer()
+        writer.submit(1, {}, [{"id": "x", "elapsed_seconds": 1, "status": "active"}],
+                      on_commit=lambda: committed.append(1))
+        self.assertTrue(writer.wait(timeout=2))
+        self.assertEqual(writer.stats["errors"], 1)
+        self.assertEqual(committed, [1])
+        (_, _, rows), = self.written[-1]
+        self.assertEqual(rows, [{"id": "x", "elapsed_seconds": 1, "status": "active"}])
+
+    def test_poison_batch_is_dropped_after_max_retries(self):
+        WriteBehind.RETRY_DELAY, saved = 0.01, WriteBehind.RETRY_DELAY
+        self.addCleanup(setattr, WriteBehind, "RETRY_DELAY", saved)
+        self.fail = WriteBehind.MAX_RETRIES
+        committed = []
+        writer = self._writer()
+        with self.assertLogs("writer", level="ERROR") as logs:
+            ticket = writer.submit(1, {}, [{"id": "x", "elapsed_seconds": 1}],
+                                   on_commit=lambda: committed.append(1))
+            self.assertFalse(writer.wait(ticket, timeout=2))
+        self.assertIn("'x'", logs.output[-1])
+        self.assertEqual((writer.stats["errors"], writer.stats["dropped"]),
+                         (WriteBehind.MAX_RETRIES, 1))
+        self.assertEqual(committed, [])
+        # Очередь не встала: следующая запись проходит
+        ticket = writer.submit(1, {}, [{"id": "y", "elapsed_seconds": 2}])
+        self.assertTrue(writer.wait(ticket, timeout=2))
+        self.assertEqual(self.written[-1], [(1, {}, [{"id": "y", "elapsed_seconds": 2}])])
+
+    def test_wait_is_a_barrier(self):
+        writer = self._writer()
+        self.gate.clear()
+        ticket = writer.submit(1, {}, [{"id": "x", "elapsed_seconds": 1}])
+        self.assertFalse(writer.wait(ticket, timeout=0.05))
+        self.gate.set()
+        self.assertTrue(writer.wait(ticket, timeout=2))
+
+    def test_queue_is_bounded(self):
+        writer = self._writer(max_pending=2)
+        self.gate.clear()
+        writer.submit(1, {}, [{"id": "a"}])      # уходит писателю и висит
+        time.sleep(0.05)
+        writer.submit(1, {}, [{"id": "b"}, {"id": "c"}])
+        blocked = threading.Thread(target=writer.submit, args=(1, {}, [{"id": "d"}]))
+        blocked.start()
+        blocked.join(0.05)
+        self.assertTrue(blocked.is_alive())
+        self.gate.set()
+        blocked.join(2)
+        self.assertFalse(blocked.is_alive())
+
+
+# ──────────────────────────────────────────────────────────
+#  Tickless-планировщик
+# ──────────────────────────────────────────────────────────
+
+class _Client:
+    def __init__(self, when):
+        self.when = when
+        self.fired = []
+
+    def next_deadline(self):
+        return self.when
+
+    def on_deadline(self, now):
+        self.fired.append(now)
+        self.when = None
+
+
+class TestScheduler(unittest.TestCase):
+
+    def test_runs_only_due_clients(self):
+        sched = Scheduler()
+        a, b = _Client(10.0), _Client(20.0)
+        sched.reschedule(a)
+        sched.reschedule(b)
+        self.assertEqual(sched.next_deadline(), 10.0)
+        sched.run_pending(15.0)
+        self.assertEqual(a.fired, [15.0])
+        self.assertEqual(b.fired, [])
+        self.assertEqual(sched.next_deadline(), 20.0)
+
+    def test_reschedule_replaces_old_deadline(self):
+        sched = Scheduler()
+        a = _Client(10.0)
+        sched.reschedule(a)
+        a.when = 30.0
+        sched.reschedule(a)
+        sched.run_pending(15.0)
+        self.assertEqual(a.fired, [])
+        self.assertEqual(sched.next_deadline(), 30.0)
+
+    def test_remove(self):
+        sched = Scheduler()
+        a = _Client(10.0)
+        sched.reschedule(a)
+        sched.remove(a)
+        self.assertIsNone(sched.next_deadline())
+
+    def test_slow_caller_does_not_overwrite_newer_deadline(self):
+        sched = Scheduler()
+        computing, release = threading.Event(), threading.Event()
+
+        class Slow(_Client):
+            def next_deadline(self):
+                when = self.when
+                if threading.current_thread().name == "slow":
+                    computing.set()
+                    release.wait(2)     # прочитал старое состояние и застрял
+                return when
+
+        a = Slow(100.0)
+        slow = threading.Thread(target=sched.reschedule, args=(a,), name="slow")
+        slow.start()
+        computing.wait(2)
+        a.when = 50.0                   # состояние изменилось — новый расчёт
+        sched.reschedule(a)
+        release.set()
+        slow.join(2)
+        self.assertEqual(sched.next_deadline(), 50.0)
+
+
+class TestEngineDeadlines(FakeClockTest):
+
+    def test_idle_engine_wakes_only_for_flush(self):
+        engine = self._engine()
+        with engine._lock:
+            engine._running = True
+            engine._last_flush = self.clock.monotonic()
+        self._add(engine)
+        self.assertEqual(engine.next_deadline(), 100.0 + engine.SAVE_INTERVAL)
+
+    def test_wakes_when_active_task_runs_out(self):
+        engine = self._engine()
+        with engine._lock:
+            engine._running = True
+            engine._last_flush = self.clock.monotonic()
+        task_id = self._add(engine, alloc=5)
+        engine.activate_task(task_id)
+        self.assertEqual(engine.next_deadline(), 106.0)
+
+    def test_on_deadline_flushes_and_notifies(self):
+        ticks = []
+        engine = self._engine()
+        engine.on_tick = lambda: ticks.append(1)
+        with engine._lock:
+            engine._last_flush = self.clock.monotonic()
+        self.clock.advance(engine.SAVE_INTERVAL)
+        engine.on_deadline(self.clock.monotonic())
+        self.assertEqual(ticks, [1])
+        self.assertTrue(engine.writer.wait(timeout=2))
+        self.assertEqual(engine.flush_stats["flushes"], 1)
+        self.assertEqual(repo.get_or_create_plan(date.today()).procrastination_used,
+                         engine.SAVE_INTERVAL)
+
+
+# ──────────────────────────────────────────────────────────
+#  Смена дня
+# ──────────────────────────────────────────────────────────
+
+class TestRollover(BaseTimerTest):
+
+    def setUp(self):
+        super().setUp()
+        self.clock = VirtualClock(datetime.combine(date.today(), dt_time(23, 59, 50)))
+        self.rolled = []
+        self.engine = TimerEngine(
+            self.plan.id, self.settings, scheduler=Scheduler(), clock=self.clock,
+            writer=self.writer, on_rollover=lambda *a: self.rolled.append(a),
+        )
+        self.engine.start()
+        self.task_id = self._add(self.engine, alloc=600)
+        self.engine.activate_task(self.task_id)
+
+    def test_deadline_is_midnight(self):
+        self.assertEqual(self.engine.next_deadline(), self.clock.monotonic() + 10)
+
+    def test_active_segment_is_split(self):
+        self.clock.advance(30)
+        self.engine.on_deadline(self.clock.monotonic())
+        self.engine.flush(wait=True)
+        tomorrow = date.today() + timedelta(days=1)
+
+        old = self._db_task(self.task_id)
+        self.assertEqual(old.elapsed_seconds, 10)
+        self.assertTrue(old.carried_over)
+        self.assertEqual(self.rolled, [(date.today(), tomorrow, None)])
+
+        new_plan = repo.get_or_create_plan(tomorrow)
+        self.assertEqual((self.engine.plan_id, self.engine.plan_date),
+                         (new_plan.id, tomorrow))
+        cont = self.engine.get_task(self.engine.active_task_id)
+        self.assertEqual(cont.name, "Задача")
+        self.assertEqual((cont.allocated_seconds, cont.elapsed_seconds), (590, 20))
+        self.assertEqual(repo.get_tasks_for_plan(new_plan.id)[0].elapsed_seconds, 20)
+
+    def test_reads_after_midnight_do_not_leak_into_old_day(self):
+        self.clock.advance(25)
+        self.assertEqual(self.engine.get_task(self.task_id).elapsed_seconds, 10)
+
+    def test_procrastination_after_midnight_goes_to_new_plan(self):
+        self.engine.deactivate()
+        self.clock.advance(70)
+        self.engine.on_deadline(self.clock.monotonic())
+        self.engine.flush(wait=True)
+        self.assertEqual(repo.get_plan(self.plan.id).procrastination_used, 10)
+        self.assertEqual(self.engine.get_proc_used(), 60)
+        self.assertIsNone(self.engine.active_task_id)
+
+    def test_old_journal_is_removed_after_rollover(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        old_path = os.path.join(tmp.name, f"plan_{self.plan.id}.jsonl")
+        journal = Journal(old_path)
+        engine = TimerEngine(self.plan.id, self.settings, scheduler=Scheduler(),
+                             journal=journal, clock=self.clock, writer=self.writer)
+        self.addCleanup(lambda: engine.journal.close())
+        engine.start()
+        engine.activate_task(self.task_id)
+        self.clock.advance(30)
+        engine.on_deadline(self.clock.monotonic())
+        engine.flush(wait=True)
+
+        self.assertNotEqual(engine.plan_id, self.plan.id)
+        self.assertFalse(os.path.exists(old_path))
+        self.assertTrue(os.path.exists(engine.journal.path))
+
+    def test_sleep_over_several_midnights_goes_straight_to_today(self):
+        self.clock.advance(2 * 86400 + 30)
+        self.engine.on_deadline(self.clock.monotonic())
+        today = self.clock.today()
+        self.assertEqual(self.engine.plan_date, today)
+        self.assertEqual(len(self.rolled), 1)
+        self.assertEqual(self.rolled[0][:2], (date.today(), today))
+
+    def _fail_once(self, name):
+        calls = []
+        real = getattr(repo, name)
+
+        def failing(*args, **kwargs):
+            calls.append(1)
+            if len(calls) == 1:
+                raise RuntimeError("database is locked")
+            return real(*args, **kwargs)
+        setattr(repo, name, failing)
+        self.addCleanup(setattr, repo, name, real)
+        return calls
+
+    def test_failed_rollover_backs_off_and_keeps_carry(self):
+        calls = self._fail_once("get_or_create_plan")
+        self.clock.advance(15)
+        now = self.clock.monotonic()
+        self.engine.on_deadline(now)
+        # План прежний, повтор не сразу — планировщик не крутится вхолостую
+        self.assertEqual(self.engine.plan_id, self.plan.id)
+        self.assertGreater(self.engine.next_deadline(), now)
+        self.engine.on_deadline(now + 1)
+        self.assertEqual((self.engine.plan_id, len(calls)), (self.plan.id, 1))
+
+        self.clock.advance(TimerEngine.ROLLOVER_RETRY)
+        self.engine.on_deadline(self.clock.monotonic())
+        tomorrow = date.today() + timedelta(days=1)
+        self.assertEqual(self.engine.plan_date, tomorrow)
+        cont = self.engine.get_task(self.engine.active_task_id)
+        self.assertEqual(cont.allocated_seconds, 590)
+        self.assertEqual(self._db_task(self.task_id).elapsed_seconds, 10)
+
+    def test_retry_does_not_duplicate_carry(self):
+        # Копия уже создана, падает чтение нового плана
+        calls = []
+        real = TimerEngine._read_plan
+
+        def failing(plan_id):
+            calls.append(plan_id)
+            if len(calls) == 1:
+                raise RuntimeError("database is locked")
+            return real(plan_id)
+        self.engine._read_plan = failing
+        self.clock.advance(15)
+        self.engine.on_deadline(self.clock.monotonic())
+        self.clock.advance(TimerEngine.ROLLOVER_RETRY)
+        self.engine.on_deadline(self.clock.monotonic())
+        new_plan = repo.get_or_create_plan(date.today() + timedelta(days=1))
+        tasks = repo.get_tasks_for_plan(new_plan.id)
+        self.assertEqual(len(tasks), 1)
+        self.assertEqual(self.engine.active_task_id, tasks[0].id)
+
+    def test_carry_goes_after_existing_tasks(self):
+        new_plan = repo.get_or_create_plan(date.today() + timedelta(days=1))
+        repo.add_task(new_plan.id, "planned", "Заранее", 600, position=4)
+        self.clock.advance(15)
+        self.engine.on_deadline(self.clock.monotonic())
+        carry = next(t for t in repo.get_tasks_for_plan(new_plan.id) if t.id != "planned")
+        self.assertEqual(carry.position, 5)
+
+
+# ──────────────────────────────────────────────────────────
+#  Снимки состояния
+# ──────────────────────────────────────────────────────────
+
+class TestSnapshot(FakeClockTest):
+
+    def test_version_changes_only_with_state(self):
+        engine = self._engine()
+        task_id = self._add(engine)
+        v1 = engine.snapshot().version
+        self.assertEqual(engine.snapshot().version, v1)
+        self.clock.advance(0.5)
+        self.assertEqual(engine.snapshot().version, v1)
+
+        engine.activate_task(task_id)
+        v2 = engine.snapshot().version
+        self.assertGreater(v2, v1)
+        self.clock.advance(2)
+        snap = engine.snapshot()
+        self.assertGreater(snap.version, v2)
+        self.assertEqual(snap.get(task_id).elapsed_seconds, 2)
+
+    def test_snapshot_is_immutable_copy(self):
+        engine = self._engine()
+        task_id = self._add(engine)
+        snap = engine.snapshot()
+        engine.activate_task(task_id)
+        self.clock.advance(3)
+        engine.get_tasks()
+        self.assertEqual(snap.get(task_id).elapsed_seconds, 0)
+        self.assertIsNone(snap.active_task_id)
+
+    def test_reader_does_not_wait_for_lock(self):
+        engine = self._engine()
+        task_id = self._add(engine)
+        engine.activate_task(task_id)
+        before = engine.snapshot()
+        self.clock.advance(5)
+        with engine._lock:
+            # Lock не реентерабельный: ожидание повесило бы тест
+            self.assertIs(engine.snapshot(), before)
+        self.assertEqual(engine.get_task(task_id).elapsed_seconds, 5)
+
+
+# ──────────────────────────────────────────────────────────
+#  Журнал событий
+# ──────────────────────────────────────────────────────────
+
+class TestJournal(FakeClockTest):
+
+    def setUp(self):
+        super().setUp()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, "plan.jsonl")
+
+    def _open(self, autoflush=True):
+        # «Падение» предыдущего движка — после того, как его писатель
+        # дописал уже отданное: иначе новый читал бы БД посреди транзакции
+        self.writer.wait(timeout=2)
+        journal = Journal(self.path)
+        self.addCleanup(journal.close)
+        engine = TimerEngine(self.plan.id, self.settings, scheduler=Scheduler(),
+                             journal=journal, clock=self.clock, writer=self.writer,
+                             autoflush=autoflush)
+        engine.start()
+        return engine
+
+    def _tick(self, engine, seconds):
+        self.clock.advance(seconds)
+        engine.on_deadline(self.clock.monotonic())
+
+    def test_crash_is_recovered_from_journal(self):
+        engine = self._open()
+        task_id = self._add(engine)
+        engine.activate_task(task_id)
+        self._tick(engine, 10)
+        self._tick(engine, 10)
+        # Между чекпоинтами в БД ничего не писалось
+        self.assertEqual(self._db_task(task_id).elapsed_seconds, 0)
+
+        recovered = self._open()
+        self.assertEqual(recovered.get_task(task_id).elapsed_seconds, 20)
+        self.assertEqual(recovered.get_task(task_id).status, TaskStatus.ACTIVE)
+        self.assertIsNone(recovered.active_task_id)
+
+    def test_replay_applies_events(self):
+        engine = self._open()
+        a = self._add(engine, "A")
+        b = self._add(engine, "B", alloc=10)
+        engine.activate_task(a)
+        self.clock.advance(5)
+        engine.complete_task(a)           # чекпоинт
+        engine.activate_task(b)
+        self.clock.advance(3)
+        engine.update_task_meta(b, "B", 900, None)
+        self._tick(engine, 10)
+        engine.deactivate()
+        self.clock.advance(4)
+        self._tick(engine, 10)
+
+        recovered = self._open()
+        self.assertEqual(recovered.get_task(a).status, TaskStatus.COMPLETED)
+        b_state = recovered.get_task(b)
+        self.assertEqual(b_state.allocated_seconds, 900)
+        self.assertEqual(b_state.elapsed_seconds, 13)
+        self.assertEqual(b_state.overrun_seconds, 0)
+        self.assertEqual(recovered.get_proc_used(), engine.get_proc_used())
+
+    def test_replay_matches_live_engine_with_proportional_overrun(self):
+        from lt_db import OverrunSource
+        self.settings.overrun_source = OverrunSource.PROPORTIONAL
+        # Без autoflush чекпоинтов нет — весь день восстанавливается из журнала
+        engine = self._open(autoflush=False)
+        a = self._add(engine, "A", alloc=10)
+        b = self._add(engine, "B", alloc=600)
+        c = self._add(engine, "C", alloc=300)
+        engine.activate_task(a)
+        self._tick(engine, 40)              # 30 с перерасхода — долг пулу B, C
+        engine.update_task_meta(b, "B", 500, None)
+        engine.complete_task(c)             # C уходит из пула
+        engine.activate_task(b)
+        self._tick(engine, 20)
+        engine.deactivate()
+        live = {t.id: (t.status, t.allocated_seconds, t.elapsed_seconds)
+                for t in engine.get_tasks()}
+        live_pending = engine.snapshot().pending_alloc
+
+        recovered = self._open(autoflush=False)
+        self.assertEqual({t.id: (t.status, t.allocated_seconds, t.elapsed_seconds)
+                          for t in recovered.get_tasks()}, live)
+        self.assertEqual(recovered.snapshot().pending_alloc, live_pending)
+
+    def test_checkpoint_compacts_journal(self):
+        engine = self._open()
+        task_id = self._add(engine)
+        engine.activate_task(task_id)
+        self._tick(engine, 10)
+        engine.flush(wait=True)
+        plan = repo.get_plan(self.plan.id)
+        records = engine.journal.read_from(0)
+        self.assertEqual([r["k"] for r in records], ["ckpt"])
+        self.assertEqual(plan.journal_seq, records[0]["seq"])
+        self.assertEqual(self._db_task(task_id).elapsed_seconds, 10)
+
+        # Повторная загрузка не считает время дважды
+        self.assertEqual(self._open().get_task(task_id).elapsed_seconds, 10)
+
+    def test_time_after_stop_is_not_counted(self):
+        engine = self._open()
+        task_id = self._add(engine)
+        engine.activate_task(task_id)
+        self.clock.advance(6)
+        engine.stop()
+        self.clock.advance(1000)
+
+        restarted = self._open()
+        self.clock.advance(5)
+        restarted.on_deadline(self.clock.monotonic())
+        again = self._open()
+        self.assertEqual(again.get_task(task_id).elapsed_seconds, 6)
+
+    def test_leftover_journal_of_past_plan_is_recovered(self):
+        directory = os.path.dirname(self.path)
+        past = repo.get_or_create_plan(date.today() - timedelta(days=1))
+        past_path = os.path.join(directory, f"plan_{past.id}.jsonl")
+        today_path = os.path.join(directory, f"plan_{self.plan.id}.jsonl")
+        Journal(today_path).close()
+        journal = Journal(past_path)
+        self.addCleanup(journal.close)
+        engine = TimerEngine(past.id, self.settings, scheduler=Scheduler(),
+                             journal=journal, clock=self.clock, autoflush=False)
+        engine.start()
+        task_id = str(uuid.uuid4())
+        repo.add_task(past.id, task_id, "Задача", 600)
+        engine.add_task(task_id, "Задача", 600)
+        engine.activate_task(task_id)
+        self._tick(engine, 40)
+        engine.complete_task(task_id)
+        # «Падение» до полуночи: в БД только то, что добавил UI
+
+        recovered = TimerEngine.recover_journals(self.settings, keep=self.plan.id,
+                                                 directory=directory)
+        self.assertEqual(recovered, [past.id])
+        row = repo.get_tasks_for_plan(past.id)[0]
+        self.assertEqual((row.elapsed_seconds, row.status), (40, TaskStatus.COMPLETED))
+        self.assertFalse(os.path.exists(past_path))
+        self.assertTrue(os.path.exists(today_path))
+        # Повторный запуск ничего не дописывает
+        self.assertEqual(TimerEngine.recover_journals(
+            self.settings, keep=self.plan.id, directory=directory), [])
+
+    def test_torn_tail_is_dropped(self):
+        journal = Journal(self.path)
+        journal.append("mark", 1.0)
+        journal.close()
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write('{"seq": 2, "t": 2.0, "k": "ma')
+        journal = Journal(self.path)
+        self.addCleanup(journal.close)
+        self.assertEqual(journal.seq, 1)
+        journal.append("mark", 3.0)
+        self.assertEqual([r["seq"] for r in journal.read_from(0)], [1, 2])
+
+
+# ──────────────────────────────────────────────────────────
+#  Симуляция на виртуальных часах
+# ──────────────────────────────────────────────────────────
+
+class TestSimulation(BaseTimerTest):
+
+    def _sim(self):
+        sim = Simulation(self.plan.id, self.settings,
+                         start=datetime.combine(date.today(), dt_time(8, 0)))
+        sim.start()
+        return sim
+
+    def test_scripted_day(self):
+        sim = self._sim()
+        started = time.perf_counter()
+        sim.run([
+            ("08:00", "add", "a", "A", 3600, "10:00"),
+            ("08:00", "add", "b", "B", 1800),
+            ("08:30", "activate", "b"),
+            ("09:15", "complete", "b"),       # 15 минут перерасхода
+            ("10:00", "activate", "a"),
+            ("+0:30", "skip", "a"),
+        ])
+        sim.run_until(datetime.combine(date.today(), dt_time(12, 0)))
+        sim.stop()
+        self.assertLess(time.perf_counter() - started, 1.0)
+
+        a, b = sim.engine.get_task("a"), sim.engine.get_task("b")
+        self.assertEqual((b.elapsed_seconds, b.overrun_seconds), (2700, 900))
+        self.assertEqual((a.elapsed_seconds, a.status), (1800, TaskStatus.SKIPPED))
+        # 08:00–08:30, 09:15–10:00, 10:30–12:00 + перерасход B
+        self.assertEqual(sim.engine.get_proc_used(), 1800 + 2700 + 5400 + 900)
+        self.assertEqual([(n.hour, n.minute) for n, _, _ in sim.notifications],
+                         [(9, 55)])
+
+    def test_multi_week_soak(self):
+        sim = self._sim()
+        start = sim.now()
+        tasks = []
+        for day in range(21):
+            for i in range(5):
+                task_id = f"{day}-{i}"
+                sim.run([
+                    ("+0:00", "add", task_id, task_id, 3600),
+                    ("+0:20", "activate", task_id),
+                    ("+1:10", "complete", task_id),   # 10 минут перерасхода
+                ])
+            # Задачи без persist — только в памяти: после полуночи их уже нет
+            day_tasks = sim.engine.get_tasks()
+            self.assertEqual(len(day_tasks), 5)
+            tasks += day_tasks
+            sim.run_until(start + timedelta(days=day + 1))
+        sim.stop()
+        sim.flush()
+
+        # Каждый день — в своём плане
+        plans = [repo.get_or_create_plan(date.today() + timedelta(days=d)) for d in range(22)]
+        self.assertEqual(sim.engine.plan_id, plans[-1].id)
+        self.assertTrue(all(t.overrun_seconds == 600 for t in tasks))
+        # Каждая секунда учтена ровно один раз (перерасход — и в задаче, и в прокрастинации)
+        total = sum(t.elapsed_seconds - t.overrun_seconds for t in tasks)
+        proc = sum(p.procrastination_used for p in plans)
+        self.assertEqual(total + proc, 21 * 86400)
+        self.assertLess(sim.wakeups, 21 * 5 * 4 + 21)
+
+    def test_rollover_without_persist(self):
+        sim = Simulation(self.plan.id, self.settings,
+                         start=datetime.combine(date.today(), dt_time(23, 0)))
+        sim.start()
+        sim.run([
+            ("+0:00", "add", "a", "A", 7200),
+            ("+0:00", "activate", "a"),
+        ])
+        sim.advance(2 * 3600)
+        sim.stop()
+        sim.flush()
+        tomorrow = date.today() + timedelta(days=1)
+        self.assertEqual(sim.engine.plan_date, tomorrow)
+        # Старый день записан в полночь; "a" есть только в памяти — строки нет
+        self.assertEqual(repo.get_plan(self.plan.id).procrastination_used, 0)
+        cont = sim.engine.get_task(sim.engine.active_task_id)
+        self.assertEqual((cont.allocated_seconds, cont.elapsed_seconds), (3600, 3600))
+        self.assertEqual(repo.get_tasks_for_plan(sim.engine.plan_id)[0].elapsed_seconds, 3600)
+
+
+# ──────────────────────────────────────────────────────────
+#  Напоминания
+# ──────────────────────────────────────────────────────────
+
+class TestNotificationHeap(BaseTimerTest):
+
+    def setUp(self):
+        super().setUp()
+        self.sim = Simulation(self.plan.id, self.settings,
+                              start=datetime.combine(date.today(), dt_time(8, 0)))
+        self.sim.start()
+        self.addCleanup(self.sim.stop)
+
+    def _fired(self):
+        return [(n.hour, n.minute, n.second, title)
+                for n, title, _ in self.sim.notifications]
+
+    def test_fires_exactly_at_threshold_in_order(self):
+        self.sim.run([
+            ("08:00", "add", "late", "Поздняя", 600, "11:00"),
+            ("08:00", "add", "early", "Ранняя", 600, "09:00"),
+            ("08:00", "add", "free", "Без времени", 600),
+        ])
+        self.sim.run_until(datetime.combine(date.today(), dt_time(12, 0)))
+        self.assertEqual(self._fired(), [(8, 55, 0, "⏰ Скоро: Ранняя"),
+                                         (10, 55, 0, "⏰ Скоро: Поздняя")])
+        self.assertTrue(self.sim.notifications[0][2].startswith("Через 5 мин."))
+        self.assertEqual(self.sim.wakeups, 2)
+
+    def test_edit_moves_and_finish_cancels(self):
+        self.sim.run([
+            ("08:00", "add", "a", "A", 600, "09:00"),
+            ("08:00", "add", "b", "B", 600, "09:30"),
+            ("08:10", "edit", "a", "A", 600, "10:00"),
+            ("08:20", "skip", "b"),
+        ])
+        self.sim.run_until(datetime.combine(date.today(), dt_time(12, 0)))
+        self.assertEqual(self._fired(), [(9, 55, 0, "⏰ Скоро: A")])
+
+    def test_past_and_removed_tasks_are_dropped(self):
+        self.sim.run([
+            ("08:00", "add", "past", "Прошлая", 600, "07:00"),
+            ("08:00", "add", "gone", "Удалённая", 600, "09:00"),
+        ])
+        self.sim.engine.remove_task("gone")
+        self.assertIsNone(self.sim.notifier.next_deadline())
+        self.sim.run_until(datetime.combine(date.today(), dt_time(12, 0)))
+        self.assertEqual(self.sim.notifications, [])
+
+
+
+class TestNotificationSinks(unittest.TestCase):
+
+    def test_sink_without_send_fails_at_creation(self):
+        from notify import NotificationSink
+
+        class Silent(NotificationSink):
+            pass
+        with self.assertRaises(TypeError):
+            Silent()
+
+    def test_batching_merges_close_notifications(self):
+        got = []
+        sink = BatchingSink(CallbackSink(lambda *a: got.append(a)), window=0.2)
+        self.addCleanup(sink.close)
+        started = time.perf_counter()
+        sink.send("⏰ Скоро: A", "Через 5 мин. (10:00)")
+        sink.send("⏰ Скоро: B", "Через 5 мин. (10:00)")
+        self.assertLess(time.perf_counter() - started, 0.1)    # send не ждёт доставки
+        self.assertTrue(sink.flush(timeout=2))
+        self.assertEqual(got, [("🔔 Напоминаний: 2",
+                                "⏰ Скоро: A — Через 5 мин. (10:00)\n"
+                                "⏰ Скоро: B — Через 5 мин. (10:00)")])
+
+    def test_single_notification_unchanged_and_close_drains(self):
+        got = []
+        sink = BatchingSink(CallbackSink(lambda *a: got.append(a)), window=60)
+        sink.send("T", "M")
+        sink.close(timeout=2)
+        self.assertEqual(got, [("T", "M")])
+
+    def test_failing_sink_does_not_stop_others(self):
+        got = []
+
+        def boom(title, message):
+            raise RuntimeError
+        sink = MultiSink(CallbackSink(boom), CallbackSink(lambda *a: got.append(a)))
+        with self.assertLogs("notify", level="ERROR"):
+            sink.send("T", "M")
+        self.assertEqual(got, [("T", "M")])
+
+    def test_system_sink_resolves_once(self):
+        sink = system_sink()
+        self.assertIsInstance(sink, (PlyerSink, LogSink))
+        NullSink().send("T", "M")
+
+
+# ──────────────────────────────────────────────────────────
+#  EngineHost
+# ──────────────────────────────────────────────────────────
+
+class TestEngineHost(BaseTimerTest):
+
+    def setUp(self):
+        super().setUp()
+        # Чужой Scheduler — хост не поднимает поток, дедлайны гоняем руками
+        self.host = EngineHost(scheduler=Scheduler())
+        self.other = repo.get_or_create_plan(date.today() - timedelta(days=1))
+
+    def _start(self, key, plan, host=None):
+        host = self.host if host is None else host     # пустой хост — falsy (__len__)
+        engine = host.start_engine(key, plan.id, self.settings)
+        task_id = str(uuid.uuid4())
+        repo.add_task(plan.id, task_id, "Задача", 600)
+        engine.add_task(task_id, "Задача", 600)
+        return engine, task_id
+
+    def test_hosted_engine_rolls_over(self):
+        clock = VirtualClock(datetime.combine(date.today(), dt_time(23, 59, 50)))
+        host = EngineHost(scheduler=Scheduler(), clock=clock)
+        engine, task_id = self._start("u1", self.plan, host=host)
+        engine.activate_task(task_id)
+        clock.advance(30)
+        engine.on_deadline(clock.monotonic())
+
+        tomorrow = repo.get_or_create_plan(date.today() + timedelta(days=1))
+        self.assertEqual(engine.plan_id, tomorrow.id)
+        self.assertEqual(host._plans, {tomorrow.id: "u1"})
+        # Старый день записан при смене суток, новый — обычным flush хоста
+        self.assertEqual(self._db_task(task_id).elapsed_seconds, 10)
+        host.flush()
+        self.assertEqual(repo.get_tasks_for_plan(tomorrow.id)[0].elapsed_seconds, 20)
+
+    def test_engine_on_past_plan_does_not_roll_over(self):
+        clock = VirtualClock(datetime.combine(date.today(), dt_time(12, 0)))
+        host = EngineHost(scheduler=Scheduler(), clock=clock)
+        today, _ = self._start("u1", self.plan, host=host)
+        past, task_id = self._start("u2", self.other, host=host)
+        past.activate_task(task_id)
+        clock.advance(30)
+        past.on_deadline(clock.monotonic())
+        today.on_deadline(clock.monotonic())
+
+        self.assertEqual((past.plan_id, today.plan_id), (self.other.id, self.plan.id))
+        self.assertEqual(host._plans, {self.plan.id: "u1", self.other.id: "u2"})
+        self.assertEqual(past.get_task(task_id).elapsed_seconds, 30)
+
+    def test_engine_loads_its_own_plan(self):
+        repo.update_plan(self.other.id, procrastination_used=50)
+        engine = self.host.start_engine("u2", self.other.id, self.settings)
+        self.assertEqual(engine.get_proc_used(), 50)
+
+    def test_hosted_engines_do_not_write_themselves(self):
+        engine, task_id = self._start("u1", self.plan)
+        engine.activate_task(task_id)
+        engine._advance(3)
+        engine.complete_task(task_id)
+        self.assertEqual(self._db_task(task_id).status, TaskStatus.PENDING)
+        self.assertEqual(engine.flush_stats["flushes"], 0)
+
+    def test_flush_batches_all_engines(self):
+        e1, t1 = self._start("u1", self.plan)
+        e2, t2 = self._start("u2", self.other)
+        for engine, task_id in ((e1, t1), (e2, t2)):
+            engine.activate_task(task_id)
+            engine._advance(4)
+        self.host.flush()
+        # Обе задачи с одинаковым набором полей — один executemany
+        self.assertEqual(self.host.flush_stats["engines"], 2)
+        self.assertEqual(self.host.flush_stats["rows"], 2)
+        self.assertEqual(self.host.flush_stats["statements"], 1)
+        self.assertEqual(self._db_task(t1).elapsed_seconds, 4)
+        other_task, = repo.get_tasks_for_plan(self.other.id)
+        self.assertEqual(other_task.elapsed_seconds, 4)
+
+    def test_stop_engine_flushes_and_forgets(self):
+        engine, task_id = self._start("u1", self.plan)
+        engine.activate_task(task_id)
+        engine._advance(2)
+        self.host.stop_engine("u1")
+        self.assertEqual(self._db_task(task_id).elapsed_seconds, 2)
+        self.assertIsNone(self.host.query("u1"))
+        self.assertEqual(len(self.host), 0)
+
+    def test_query(self):
+        engine, task_id = self._start("u1", self.plan)
+        engine.activate_task(task_id)
+        info = self.host.query("u1")
+        self.assertEqual(info["plan_id"], self.plan.id)
+        self.assertEqual(info["active_task_id"], task_id)
+        self.assertEqual([t.id for t in info["tasks"]], [task_id])
+
+    def test_one_engine_per_plan(self):
+        self.host.start_engine("u1", self.plan.id, self.settings)
+        self.assertIs(self.host.start_engine("u1", self.plan.id, self.settings),
+                      self.host.get("u1"))
+        with self.assertRaises(ValueError):
+            self.host.start_engine("u2", self.plan.id, self.settings)
+
+    def test_engine_load_does_not_block_host(self):
+        self.host.start_engine("u1", self.plan.id, self.settings)
+        loading, gate = threading.Event(), threading.Event()
+        real = TimerEngine._read_plan
+
+        def slow_read(plan_id):
+            loading.set()
+            gate.wait(timeout=5)
+            return real(plan_id)
+        TimerEngine._read_plan = staticmethod(slow_read)
+        self.addCleanup(setattr, TimerEngine, "_read_plan", staticmethod(real))
+
+        results = []
+        starters = [threading.Thread(target=lambda: results.append(
+            self.host.start_engine("u2", self.other.id, self.settings)))
+            for _ in range(2)]
+        for t in starters:
+            t.start()
+        loading.wait(timeout=2)
+        # Пока u2 грузится, хост отвечает
+        answered = []
+        reader = threading.Thread(target=lambda: answered.append(self.host.query("u1")))
+        reader.start()
+        reader.join(timeout=1)
+        self.assertTrue(answered and answered[0] is not None)
+        gate.set()
+        for t in starters:
+            t.join()
+        # Параллельный старт того же ключа — один и тот же движок
+        self.assertIs(results[0], results[1])
+        self.assertIs(self.host.get("u2"), results[0])
+        self.assertEqual(self.host._plans, {self.plan.id: "u1", self.other.id: "u2"})
+
+    def test_host_deadline_is_flush_interval(self):
+        self.host.start()
+        self.assertEqual(self.host.next_deadline(),
+                         self.host._last_flush + EngineHost.SAVE_INTERVAL)
+        self.host.stop()
+        self.assertIsNone(self.host.next_deadline())
+
+
+# ──────────────────────────────────────────────────────────
+#  AsyncTimerEngine
+# ──────────────────────────────────────────────────────────
+
+class TestAsyncioScheduler(unittest.IsolatedAsyncioTestCase):
+
+    async def test_fires_on_loop(self):
+        sched = AsyncioScheduler()
+        a = _Client(time.monotonic() + 0.01)
+        b = _Client(time.monotonic() + 0.01)
+        sched.reschedule(a)
+        sched.reschedule(b)
+        sched.remove(b)
+        await asyncio.sleep(0.05)
+        self.assertEqual(len(a.fired), 1)
+        self.assertEqual(b.fired, [])
+
+
+class TestAsyncTimerEngine(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        database.Base.metadata.drop_all(database.engine)
+        init_db()
+        self.plan = repo.get_or_create_plan(date.today())
+        self.engine = await AsyncTimerEngine.create(self.plan.id, AppSettings())
+        await self.engine.start()
+
+    async def asyncTearDown(self):
+        await self.engine.stop()
+
+    async def test_events_and_persistence(self):
+        events = self.engine.events()
+        task_id = str(uuid.uuid4())
+        await self.engine.add_task(task_id, "Задача", 600)
+        await self.engine.activate_task(task_id)
+        self.engine.core._advance(3)
+        await self.engine.complete_task(task_id)
+
+        kinds = [await events.__anext__() for _ in range(3)]
+        self.assertEqual(kinds, [("add", task_id), ("activate", task_id),
+                                 ("complete", task_id)])
+        t, = repo.get_tasks_for_plan(self.plan.id)
+        self.assertEqual(t.status, TaskStatus.COMPLETED)
+        self.assertEqual(t.elapsed_seconds, 3)
+
+    async def test_stop_closes_streams(self):
+        events = self.engine.events()
+        await self.engine.stop()
+        received = [e async for e in events]
+        self.assertEqual(received, [])
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
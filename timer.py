@@ -1,10 +1,79 @@
+import heapq
+import itertools
+import logging
 import threading
-import time
-from datetime import datetime, date
-from typing import Optional, Callable
+import uuid
+from datetime import datetime, date, timedelta
+from typing import Optional, Callable, NamedTuple
 
-from lt_db import TaskStatus, OverrunBehavior, OverrunSource, Settings
+from lt_db import (TaskStatus, OverrunBehavior, OverrunSource, Settings, Priority,
+                   minute_of_day)
 import repository as repo
+import gamification as gami
+from scheduler import Scheduler
+from journal import Journal, JOURNAL_DIR
+from notify import NotificationSink, LogSink
+from writer import WriteBehind
+from clock import Clock, SYSTEM_CLOCK
+
+log = logging.getLogger(__name__)
+
+_FINISHED = (TaskStatus.COMPLETED, TaskStatus.SKIPPED)
+
+
+class TaskState(NamedTuple):
+    """
+    Запись задачи в движке — кортеж без __dict__: компактно и быстро читается.
+    Неизменяема: движок не правит запись, а подменяет её копией (_set),
+    поэтому UI держит ссылки на записи напрямую, без поштучной конвертации
+    в adapter.Task, и никогда не видит наполовину обновлённую задачу.
+    Интерфейс чтения совпадает с adapter.Task.
+    """
+    id: str
+    name: str
+    allocated_seconds: int
+    elapsed_seconds: int             = 0
+    overrun_seconds: int             = 0
+    status: TaskStatus               = TaskStatus.PENDING
+    scheduled_time: Optional[str]    = None
+    completed_at: Optional[datetime] = None
+    priority: Priority               = Priority.NORMAL
+
+    @property
+    def remaining_seconds(self) -> int:
+        return max(0, self.allocated_seconds - self.elapsed_seconds)
+
+    @property
+    def is_overrun(self) -> bool:
+        return self.elapsed_seconds > self.allocated_seconds
+
+    @property
+    def scheduled_minute(self) -> Optional[int]:
+        return minute_of_day(self.scheduled_time)
+
+
+class EngineSnapshot(NamedTuple):
+    """
+    Неизменяемый срез состояния движка (см. TimerEngine.snapshot).
+    version растёт при каждом изменении — читатель может пропустить работу,
+    если версия та же, что в прошлый раз.
+    """
+    version: int
+    tasks: tuple                     # tuple[TaskState, ...] в порядке плана
+    active_task_id: Optional[str]
+    proc_used: int
+    running: bool
+    pending_alloc: int               # Σ allocated незавершённых задач
+    finished_elapsed: int            # Σ elapsed завершённых/скипнутых
+
+    def get(self, task_id: str) -> Optional[TaskState]:
+        for t in self.tasks:
+            if t.id == task_id:
+                return t
+        return None
+
+
+_EMPTY_SNAPSHOT = EngineSnapshot(0, (), None, 0, False, 0, 0)
 
 
 class TimerEngine:
@@ -12,26 +81,106 @@ class TimerEngine:
     Шахматный таймер — идёт ВСЕГДА.
     Нет активной задачи → секунды идут в прокрастинацию.
     Работает с plan_id, обновляет БД каждые N секунд.
+
+    Время считается не «+1 за sleep(1)», а по self.clock.monotonic():
+    движок помнит начало текущего отрезка (_seg_start) и при любом
+    чтении/изменении досчитывает прошедшие целые секунды (_settle).
+    Частота пробуждений влияет только на отображение, не на точность.
+
+    Своего цикла нет: движок — клиент Scheduler и просыпается только
+    в значимые моменты (активная задача исчерпала allocated, полночь,
+    очередной flush). Подписчики (add_listener) узнают о каждом изменении.
     """
 
     SECONDS_IN_DAY = 86400
     SAVE_INTERVAL  = 10  # flush в БД каждые 10 секунд
+    CHECKPOINT_INTERVAL = 300  # с журналом: чекпоинт в БД раз в 5 минут
+    ROLLOVER_RETRY = 60  # смена суток не удалась (БД) — повтор через минуту
+    # Поля задачи, которые движок меняет сам и пишет в БД при flush.
+    # name/scheduled_time/priority UI сохраняет напрямую через repo.update_task.
+    FLUSH_FIELDS = ("allocated_seconds", "elapsed_seconds", "overrun_seconds",
+                    "status", "completed_at")
 
     def __init__(self, plan_id: int, settings: Settings,
-                 on_tick: Optional[Callable] = None):
+                 on_tick: Optional[Callable] = None,
+                 scheduler: Optional[Scheduler] = None,
+                 autoflush: bool = True,
+                 journal: Optional[Journal] = None,
+                 clock: Clock = SYSTEM_CLOCK,
+                 writer: Optional[WriteBehind] = None,
+                 rollover: bool = True,
+                 on_rollover: Optional[Callable] = None):
         self.plan_id        = plan_id
         self.settings       = settings
         self.on_tick        = on_tick
+        self.clock          = clock
         self.active_task_id: Optional[str] = None
+        # Общий планировщик; если не передан — свой, и движок им управляет
+        self.scheduler      = scheduler or Scheduler()
+        self._owns_scheduler = scheduler is None
+        # autoflush=False — движок сам в БД не пишет, изменения забирает
+        # владелец (EngineHost) через _take_changes и пишет пачкой
+        self.autoflush      = autoflush
+        # Запись в БД — в потоке писателя; свой, если не передан общий
+        self.writer         = writer or (WriteBehind() if autoflush else None)
+        self._owns_writer   = writer is None
+        # Полночь: движок сам закрывает день и переходит на план следующего
+        # (см. _rollover). Без autoflush старый день пишется в БД синхронно.
+        # on_rollover(old_date, new_date, day_result) — из потока планировщика.
+        self.rollover       = rollover
+        self.on_rollover    = on_rollover
+        self.plan_date: Optional[date] = None
+        self._day_end: Optional[float] = None      # monotonic полуночи plan_date
+        # Смена суток начата, но не закончена (ошибка БД): повтор не раньше
+        # _rollover_retry_at, активная задача для переноса — в _carry
+        self._rollover_pending = False
+        self._rollover_retry_at: float = 0.0
+        self._carry: Optional[TaskState] = None
+        self._carry_id: Optional[str] = None
+        # С журналом между чекпоинтами в БД пишутся только append'ы в файл
+        self.journal        = journal
+        self._ckpt_seq: int = 0
+        self._last_checkpoint: float = 0.0
+        self._replaying = False
+        self._listeners: list[Callable] = []
 
         # In-memory состояние (синхронизируется с БД периодически)
-        self._tasks: dict = {}         # task_id → dict с полями
+        self._tasks: dict[str, TaskState] = {}
         self._proc_used: int = 0
-        self._dirty_ticks: int = 0
+        # Начало текущего отрезка по self.clock.monotonic(); None — движок остановлен.
+        # Дробная часть секунды остаётся в _seg_start и не теряется.
+        self._seg_start: Optional[float] = None
+        self._last_flush: float = 0.0
+        # Dirty-tracking: task_id → множество полей, изменённых с прошлого flush
+        self._dirty: dict[str, set] = {}
+        self._proc_flushed: int = 0
+        # Агрегаты для O(1) расчёта прокрастинации (см. _account):
+        #   _pending_alloc    — Σ allocated_seconds незавершённых задач
+        #   _finished_elapsed — Σ elapsed_seconds завершённых/скипнутых
+        self._pending_alloc: int = 0
+        self._finished_elapsed: int = 0
+        # Ленивая раздача перерасхода (OverrunSource.PROPORTIONAL): пока задача
+        # в перерасходе, остальные не переписываются каждую секунду — копится
+        # долг, раздаётся в _apply_shrink. Пул живёт между раздачами и правится
+        # по изменениям задач (_shrink_refresh), а не собирается заново.
+        self._shrink_pool: Optional[dict] = None   # task_id → [remaining, выдано, seq]
+        self._shrink_heap: list = []               # (следующая доля, seq, task_id)
+        self._shrink_room: int = 0                 # Σ (remaining - выдано) пула
+        self._shrink_debt: int = 0                 # съедено, но ещё не роздано
+        self._shrink_seq = itertools.count()
+        # Счётчики записи: сколько строк/UPDATE-выражений ушло в БД
+        self.flush_stats: dict = self.writer.stats if self.writer else {
+            "flushes": 0, "rows": 0, "statements": 0,
+            "last_rows": 0, "last_statements": 0,
+        }
 
         self._running = False
-        self._thread: Optional[threading.Thread] = None
         self._lock = threading.Lock()
+        # Опубликованный снимок: подменяется целиком под _lock, читается без него.
+        # _rev растёт при изменении задач; _snap_key — от чего построен снимок.
+        self._snapshot: EngineSnapshot = _EMPTY_SNAPSHOT
+        self._rev = 0
+        self._snap_key: Optional[tuple] = None
 
         self._load_state()
 
@@ -39,56 +188,373 @@ class TimerEngine:
     #  Загрузка / сохранение
     # ──────────────────────────────────────────────
 
-    def _load_state(self):
-        tasks = repo.get_tasks_for_plan(self.plan_id)
-        plan  = repo.get_plan_with_tasks(self._current_date())
+    def _load_state(self, loaded: Optional[tuple] = None):
+        """loaded — заранее прочитанные (tasks, plan) плана self.plan_id."""
+        tasks, plan = loaded or self._read_plan(self.plan_id)
+        self.plan_date = plan.date if plan else None
         self._proc_used = plan.procrastination_used if plan else 0
+        self._proc_flushed = self._proc_used
+        self._dirty.clear()
         self._tasks = {
-            t.id: {
-                "id":                t.id,
-                "name":              t.name,
-                "allocated_seconds": t.allocated_seconds,
-                "elapsed_seconds":   t.elapsed_seconds,
-                "overrun_seconds":   t.overrun_seconds,
-                "status":            t.status,
-                "scheduled_time":    t.scheduled_time,
-                "completed_at":      t.completed_at,
-                "priority":          t.priority if hasattr(t, "priority") and t.priority else None,
-            }
+            t.id: TaskState(
+                id                = t.id,
+                name              = t.name,
+                allocated_seconds = t.allocated_seconds,
+                elapsed_seconds   = t.elapsed_seconds or 0,
+                overrun_seconds   = t.overrun_seconds or 0,
+                status            = t.status or TaskStatus.PENDING,
+                scheduled_time    = t.scheduled_time,
+                completed_at      = t.completed_at,
+                priority          = t.priority if hasattr(t, "priority") and t.priority else Priority.NORMAL,
+            )
             for t in tasks
         }
-
-    def _flush(self):
-        """Записывает накопленные изменения в БД."""
-        repo.update_plan(self.plan_id, procrastination_used=self._proc_used)
+        self._pending_alloc = 0
+        self._finished_elapsed = 0
+        self._shrink_pool = None
+        self._shrink_heap = []
+        self._shrink_room = self._shrink_debt = 0
         for t in self._tasks.values():
-            repo.update_task(t["id"],
-                             elapsed_seconds=t["elapsed_seconds"],
-                             overrun_seconds=t["overrun_seconds"],
-                             status=t["status"],
-                             completed_at=t["completed_at"])
+            self._account(t, +1)
+
+        if self.journal is not None:
+            self._ckpt_seq = (plan.journal_seq or 0) if plan else 0
+            self.journal.ensure_seq(self._ckpt_seq)
+            self._replay(self.journal.read_from(self._ckpt_seq))
+        self._rev += 1
+        self._publish()
+
+    @classmethod
+    def recover_journals(cls, settings: Settings, keep: Optional[int] = None,
+                         directory: str = JOURNAL_DIR,
+                         clock: Clock = SYSTEM_CLOCK) -> list[int]:
+        """
+        Журналы других планов, оставшиеся от прошлых запусков: хвост после
+        чекпоинта проигрывается (тот же _replay), состояние пишется в план
+        синхронно, файл удаляется. keep — план, который откроет сам движок.
+        Не удалось записать — журнал остаётся до следующего запуска.
+        Возвращает id дописанных планов.
+        """
+        recovered = []
+        for plan_id, path in sorted(Journal.plan_journals(directory).items()):
+            if plan_id == keep:
+                continue
+            journal = Journal(path)
+            try:
+                if repo.get_plan(plan_id) is None:
+                    log.warning("Журнал %s: плана %s нет, удаляется", path, plan_id)
+                else:
+                    engine = cls(plan_id, settings, autoflush=False, journal=journal,
+                                 clock=clock, rollover=False)
+                    engine._flush_sync()
+                    recovered.append(plan_id)
+            except Exception:
+                log.exception("Не удалось восстановить план %s из журнала", plan_id)
+                journal.close()
+                continue
+            journal.remove()
+        return recovered
+
+    @staticmethod
+    def _read_plan(plan_id: int) -> tuple:
+        return repo.get_tasks_for_plan(plan_id), repo.get_plan(plan_id)
+
+    def _replay(self, records: list[dict]):
+        """
+        Проигрывает хвост журнала после чекпоинта поверх состояния из БД.
+        Время между соседними записями уходит в _advance как при живом движке;
+        промежутки вне сессии (после stop, до start) не считаются. События —
+        через те же _do_*, что и живые мутаторы: раздача долга перерасхода,
+        пул и агрегаты сходятся с живым движком.
+        """
+        self._replaying = True
+        prev_t, carry = None, 0.0
+        for r in records:
+            kind = r["k"]
+            if prev_t is not None and kind != "start":
+                carry += max(0.0, r["t"] - prev_t)
+                whole = int(carry)
+                carry -= whole
+                if whole:
+                    self._advance(whole)
+            prev_t = None if kind == "stop" else r["t"]
+
+            task_id = r.get("id")
+            if kind == "ckpt":
+                self._sync()
+                self._set_active(r.get("active"))
+            elif kind in ("start", "stop", "deactivate"):
+                self._do_deactivate()
+            elif kind == "activate":
+                self._do_activate(task_id)
+            elif kind in ("complete", "skip"):
+                status = TaskStatus.COMPLETED if kind == "complete" else TaskStatus.SKIPPED
+                self._do_finish(task_id, status, datetime.fromtimestamp(r["t"]))
+            elif kind == "edit":
+                fields = dict(name=r["name"], allocated_seconds=r["allocated_seconds"],
+                              scheduled_time=r.get("scheduled_time"))
+                if r.get("priority"):
+                    fields["priority"] = Priority(r["priority"])
+                self._do_edit(task_id, fields)
+        # Восстановленная сессия закончилась падением — новая начнётся со start()
+        self._do_deactivate()
+        self._replaying = False
+
+    def _log(self, kind: str, task_id: Optional[str] = None, **data):
+        """Запись в журнал (если он есть). Вызывать под _lock."""
+        if self.journal is not None and not self._replaying:
+            self.journal.append(kind, self.clock.time(), task_id, **data)
+
+    def _account(self, t: TaskState, sign: int):
+        """Добавляет (+1) или убирает (-1) вклад задачи в агрегаты."""
+        if t.status in _FINISHED:
+            self._finished_elapsed += sign * t.elapsed_seconds
+        else:
+            self._pending_alloc += sign * t.allocated_seconds
+
+    def _set(self, t: TaskState, **fields) -> TaskState:
+        """
+        Подменяет запись задачи копией с новыми полями и помечает изменившиеся
+        для следующего flush. Возвращает новую запись.
+        Все изменения allocated/elapsed/status идут через него — так агрегаты
+        (_pending_alloc, _finished_elapsed) всегда согласованы с задачами.
+        """
+        changed = {k: v for k, v in fields.items() if getattr(t, k) != v}
+        if not changed:
+            return t
+        self._account(t, -1)
+        new = self._tasks[t.id] = t._replace(**changed)
+        self._account(new, +1)
+        self._rev += 1
+        if self._shrink_pool is not None:
+            self._shrink_refresh(t.id)
+        dirty = None
+        for k in changed:
+            if k in self.FLUSH_FIELDS:
+                if dirty is None:
+                    dirty = self._dirty.setdefault(t.id, set())
+                dirty.add(k)
+        return new
+
+    def _take_changes(self) -> tuple[dict, list[dict], tuple]:
+        """
+        Забирает изменения с прошлого flush и сбрасывает пометки.
+        Возвращает (plan_fields, rows, undo); undo — для _restore_changes,
+        если запись в БД не удалась.
+        """
+        with self._lock:
+            return self._collect_changes()
+
+    def _collect_changes(self) -> tuple[dict, list[dict], tuple]:
+        """То же, что _take_changes, под уже взятым _lock."""
+        self._sync()
+        rows = []
+        for task_id, fields in self._dirty.items():
+            t = self._tasks.get(task_id)
+            if t is None:
+                continue
+            row = {"id": task_id}
+            for f in fields:
+                row[f] = getattr(t, f)
+            rows.append(row)
+        plan_fields = {}
+        if self._proc_used != self._proc_flushed:
+            plan_fields["procrastination_used"] = self._proc_used
+        undo = (self._dirty, self._proc_flushed, self._ckpt_seq)
+        if self.journal is not None and (rows or plan_fields
+                                         or self.journal.seq != self._ckpt_seq):
+            self._ckpt_seq = self._log_checkpoint()
+            plan_fields["journal_seq"] = self._ckpt_seq
+        self._dirty = {}
+        self._proc_flushed = self._proc_used
+        return plan_fields, rows, undo
+
+    def _log_checkpoint(self) -> int:
+        return self.journal.append("ckpt", self.clock.time(), active=self.active_task_id)
+
+    def _restore_changes(self, undo: tuple):
+        """Возвращает пометки после неудачной записи — уйдут в следующий flush."""
+        dirty, proc_flushed, ckpt_seq = undo
+        with self._lock:
+            for task_id, fields in dirty.items():
+                self._dirty.setdefault(task_id, set()).update(fields)
+            self._proc_flushed = proc_flushed
+            self._ckpt_seq = ckpt_seq
+
+    def _commit_changes(self, plan_fields: dict):
+        """После успешной записи: журнал до чекпоинта больше не нужен."""
+        if "journal_seq" in plan_fields:
+            self.journal.compact(plan_fields["journal_seq"])
+
+    def flush(self, wait: bool = False, timeout: Optional[float] = None) -> bool:
+        """
+        Отдаёт писателю (WriteBehind) только изменившиеся с прошлого flush
+        строки + план и сразу возвращается — запись идёт в его потоке.
+        wait=True — барьер: ждёт, пока всё отданное до сих пор записано
+        (False — не успели за timeout).
+        """
+        if not self.autoflush:
+            return True
+        # submit — под тем же _lock, что и сбор: иначе два потока (UI и
+        # планировщик) могли бы отдать писателю свои пачки в обратном порядке,
+        # и старые значения затёрли бы новые. Писатель _lock движка не берёт.
+        with self._lock:
+            plan_fields, rows, _ = self._collect_changes()
+            if rows or plan_fields:
+                on_commit = None
+                if "journal_seq" in plan_fields:
+                    on_commit = lambda: self._commit_changes(plan_fields)
+                self.writer.submit(self.plan_id, plan_fields, rows, on_commit)
+        return self.writer.wait(timeout=timeout) if wait else True
+
+    def _flush_sync(self):
+        """
+        Пишет изменения текущего плана в БД сразу, в этом потоке, мимо
+        писателя. Для движка без autoflush (Simulation.flush, смена суток).
+        Запись не удалась — пометки возвращаются, исключение выше.
+        """
+        plan_fields, rows, undo = self._take_changes()
+        if not rows and not plan_fields:
+            return
+        try:
+            repo.flush_engine_state(self.plan_id, plan_fields, rows)
+        except Exception:
+            self._restore_changes(undo)
+            raise
+        self._commit_changes(plan_fields)
+
+    def _record_flush(self, rows: int, statements: int):
+        stats = self.flush_stats
+        stats["flushes"] += 1
+        stats["rows"] += rows
+        stats["statements"] += statements
+        stats["last_rows"] = rows
+        stats["last_statements"] = statements
 
     def _current_date(self):
-        return date.today()
+        return self.clock.today()
+
+    # ──────────────────────────────────────────────
+    #  Учёт времени
+    # ──────────────────────────────────────────────
+
+    def _settle(self, now: Optional[float] = None):
+        """
+        Досчитывает время открытого отрезка до now (monotonic).
+        Вызывается под _lock перед любым чтением или изменением состояния.
+        """
+        if self._seg_start is None:
+            return
+        if now is None:
+            now = self.clock.monotonic()
+        if self._day_end is not None and now > self._day_end:
+            now = self._day_end     # время после полуночи — уже новому дню
+        whole = int(now - self._seg_start)
+        if whole <= 0:
+            return
+        self._advance(whole)
+        self._seg_start += whole
+
+    def _sync(self):
+        """_settle + раздача накопленного долга — перед чтением/изменением задач."""
+        self._settle()
+        self._apply_shrink()
+
+    # ──────────────────────────────────────────────
+    #  Снимки для читателей
+    # ──────────────────────────────────────────────
+
+    def _state_key(self) -> tuple:
+        return (self._rev, self.active_task_id, self._proc_used, self._running)
+
+    def _publish(self):
+        """Под _lock: выпускает новый снимок, если состояние изменилось."""
+        key = self._state_key()
+        if key == self._snap_key:
+            return
+        self._snap_key = key
+        self._snapshot = EngineSnapshot(
+            version          = self._snapshot.version + 1,
+            tasks            = tuple(self._tasks.values()),
+            active_task_id   = self.active_task_id,
+            proc_used        = self._proc_used,
+            running          = self._running,
+            pending_alloc    = self._pending_alloc,
+            finished_elapsed = self._finished_elapsed,
+        )
+
+    def snapshot(self) -> EngineSnapshot:
+        """
+        Текущий снимок состояния. Никогда не ждёт _lock: если снимок устарел
+        (набежала целая секунда или было изменение), он освежается только
+        когда _lock свободен, иначе отдаётся предыдущий — целый и согласованный.
+        """
+        snap = self._snapshot
+        seg_start = self._seg_start
+        stale = ((seg_start is not None and self.clock.monotonic() - seg_start >= 1)
+                 or self._state_key() != self._snap_key)
+        if stale and self._lock.acquire(blocking=False):
+            try:
+                self._sync()
+                self._publish()
+                snap = self._snapshot
+            finally:
+                self._lock.release()
+        return snap
+
+    def _advance(self, seconds: int):
+        """Зачисляет seconds секунд активной задаче или прокрастинации."""
+        if seconds <= 0:
+            return
+        t = self._tasks.get(self.active_task_id) if self.active_task_id else None
+        if not t or t.status in _FINISHED:
+            self.active_task_id = None
+            self._proc_used += seconds
+            return
+
+        if self.settings.overrun_behavior == OverrunBehavior.STOP:
+            room = max(0, t.allocated_seconds - t.elapsed_seconds)
+            if seconds > room:
+                # Дошли до лимита — задача встаёт, остаток уходит в прокрастинацию
+                self._set(t, elapsed_seconds=t.elapsed_seconds + room)
+                self._set_active(None)
+                self._proc_used += seconds - room
+                return
+
+        t = self._set(t, elapsed_seconds=t.elapsed_seconds + seconds)
+
+        if t.elapsed_seconds > t.allocated_seconds:
+            overrun_delta = t.elapsed_seconds - t.allocated_seconds
+            prev_overrun  = t.overrun_seconds
+            t = self._set(t, overrun_seconds=overrun_delta)
+            if prev_overrun == 0:
+                self._log("overrun", t.id)
+            delta = overrun_delta - prev_overrun
+
+            if self.settings.overrun_source == OverrunSource.PROCRASTINATION:
+                self._proc_used += delta
+            elif self.settings.overrun_source == OverrunSource.PROPORTIONAL:
+                self._eat_proportional(delta)
 
     # ──────────────────────────────────────────────
     #  Публичные свойства
     # ──────────────────────────────────────────────
 
+    # Все читатели работают по снимку — без ожидания _lock
+
     @property
     def procrastination_active(self) -> bool:
-        return self._running and self.active_task_id is None
+        snap = self.snapshot()
+        return snap.running and snap.active_task_id is None
 
     def procrastination_limit(self) -> int:
         """Теоретический максимум прокрастинации за весь день (24ч - все задачи)."""
+        return self._procrastination_limit(self.snapshot())
+
+    def _procrastination_limit(self, snap: EngineSnapshot) -> int:
         if self.settings.procrastination_override_minutes is not None:
             return self.settings.procrastination_override_minutes * 60
-        tasks_time = sum(
-            t["elapsed_seconds"]
-            if t["status"] in (TaskStatus.COMPLETED, TaskStatus.SKIPPED)
-            else t["allocated_seconds"]
-            for t in self._tasks.values()
-        )
+        tasks_time = snap.pending_alloc + snap.finished_elapsed
         return max(0, self.SECONDS_IN_DAY - tasks_time)
 
     def procrastination_remaining(self) -> int:
@@ -96,28 +562,23 @@ class TimerEngine:
         Сколько прокрастинации осталось с учётом реального времени суток.
         remaining = (секунд до полуночи) - (время незавершённых задач)
         """
-        now = datetime.now()
+        now = self.clock.now()
         midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
         seconds_until_midnight = self.SECONDS_IN_DAY - int((now - midnight).total_seconds())
-
-        pending_tasks_time = sum(
-            t["allocated_seconds"]
-            for t in self._tasks.values()
-            if t["status"] not in (TaskStatus.COMPLETED, TaskStatus.SKIPPED)
-        )
-        return max(0, seconds_until_midnight - pending_tasks_time)
+        return max(0, seconds_until_midnight - self.snapshot().pending_alloc)
 
     def procrastination_overrun(self) -> int:
-        return max(0, self._proc_used - self.procrastination_limit())
+        snap = self.snapshot()
+        return max(0, snap.proc_used - self._procrastination_limit(snap))
 
-    def get_tasks(self) -> list[dict]:
-        return list(self._tasks.values())
+    def get_tasks(self) -> list[TaskState]:
+        return list(self.snapshot().tasks)
 
-    def get_task(self, task_id: str) -> Optional[dict]:
-        return self._tasks.get(task_id)
+    def get_task(self, task_id: str) -> Optional[TaskState]:
+        return self.snapshot().get(task_id)
 
     def get_proc_used(self) -> int:
-        return self._proc_used
+        return self.snapshot().proc_used
 
     # ──────────────────────────────────────────────
     #  Управление задачами
@@ -126,192 +587,533 @@ class TimerEngine:
     def add_task(self, task_id: str, name: str, allocated_seconds: int,
                  scheduled_time: Optional[str] = None, priority=None):
         with self._lock:
-            from lt_db import Priority
-            self._tasks[task_id] = {
-                "id": task_id,
-                "name": name,
-                "allocated_seconds": allocated_seconds,
-                "elapsed_seconds": 0,
-                "overrun_seconds": 0,
-                "status": TaskStatus.PENDING,
-                "scheduled_time": scheduled_time,
-                "completed_at": None,
-                "priority": priority or Priority.NORMAL,
-            }
+            if task_id in self._tasks:
+                self._account(self._tasks[task_id], -1)
+            t = self._tasks[task_id] = TaskState(
+                id=task_id,
+                name=name,
+                allocated_seconds=allocated_seconds,
+                scheduled_time=scheduled_time,
+                priority=priority or Priority.NORMAL,
+            )
+            self._account(t, +1)
+            self._rev += 1
+            self._shrink_refresh(task_id)
+        self._changed("add", task_id)
 
     def remove_task(self, task_id: str):
         with self._lock:
-            self._tasks.pop(task_id, None)
+            self._sync()
+            t = self._tasks.pop(task_id, None)
+            if t is not None:
+                self._account(t, -1)
+                self._rev += 1
+            self._dirty.pop(task_id, None)
             if self.active_task_id == task_id:
-                self.active_task_id = None
+                self._set_active(None)
+            self._shrink_refresh(task_id)
+        self._changed("remove", task_id)
 
     def update_task_meta(self, task_id: str, name: str,
                          allocated_seconds: int, scheduled_time: Optional[str],
                          priority=None):
         """Обновить название/время/приоритет задачи без сброса elapsed."""
         with self._lock:
-            if task_id in self._tasks:
-                self._tasks[task_id]["name"] = name
-                self._tasks[task_id]["allocated_seconds"] = allocated_seconds
-                self._tasks[task_id]["scheduled_time"] = scheduled_time
-                if priority is not None:
-                    self._tasks[task_id]["priority"] = priority
+            fields = dict(name=name, allocated_seconds=allocated_seconds,
+                          scheduled_time=scheduled_time)
+            if priority is not None:
+                fields["priority"] = priority
+            if self._do_edit(task_id, fields):
+                self._log("edit", task_id, **fields)
+        self._changed("edit", task_id)
 
     def activate_task(self, task_id: str):
         with self._lock:
-            self.active_task_id = task_id
-            if task_id in self._tasks:
-                t = self._tasks[task_id]
-                if t["status"] == TaskStatus.PENDING:
-                    t["status"] = TaskStatus.ACTIVE
+            self._do_activate(task_id)
+            self._log("activate", task_id)
+        self._changed("activate", task_id)
 
     def deactivate(self):
         with self._lock:
-            self.active_task_id = None
+            self._do_deactivate()
+            self._log("deactivate")
+        self._changed("deactivate")
 
     def complete_task(self, task_id: str):
         with self._lock:
-            if task_id in self._tasks:
-                self._tasks[task_id]["status"] = TaskStatus.COMPLETED
-                self._tasks[task_id]["completed_at"] = datetime.now()
-            if self.active_task_id == task_id:
-                self.active_task_id = None
-        self._flush()
+            self._do_finish(task_id, TaskStatus.COMPLETED, self.clock.now())
+            self._log("complete", task_id)
+        self.flush()
+        self._changed("complete", task_id)
 
     def skip_task(self, task_id: str):
         with self._lock:
-            if task_id in self._tasks:
-                self._tasks[task_id]["status"] = TaskStatus.SKIPPED
-                self._tasks[task_id]["completed_at"] = datetime.now()
-            if self.active_task_id == task_id:
-                self.active_task_id = None
-        self._flush()
+            self._do_finish(task_id, TaskStatus.SKIPPED, self.clock.now())
+            self._log("skip", task_id)
+        self.flush()
+        self._changed("skip", task_id)
+
+    # Тела мутаторов — под _lock; их же зовёт _replay при проигрывании журнала
+
+    def _do_edit(self, task_id: str, fields: dict) -> bool:
+        self._sync()
+        if task_id not in self._tasks:
+            return False
+        self._set(self._tasks[task_id], **fields)
+        return True
+
+    def _do_activate(self, task_id: str):
+        self._sync()
+        self._set_active(task_id)
+        t = self._tasks.get(task_id)
+        if t is not None and t.status == TaskStatus.PENDING:
+            self._set(t, status=TaskStatus.ACTIVE)
+
+    def _do_deactivate(self):
+        self._sync()
+        self._set_active(None)
+
+    def _do_finish(self, task_id: str, status: TaskStatus, when: datetime):
+        self._sync()
+        if task_id in self._tasks:
+            self._set(self._tasks[task_id], status=status, completed_at=when)
+        if self.active_task_id == task_id:
+            self._set_active(None)
+
+    # ──────────────────────────────────────────────
+    #  Подписчики
+    # ──────────────────────────────────────────────
+
+    def add_listener(self, cb: Callable):
+        """cb(kind, task_id) — после каждого изменения состояния (вне _lock)."""
+        self._listeners.append(cb)
+
+    def remove_listener(self, cb: Callable):
+        if cb in self._listeners:
+            self._listeners.remove(cb)
+
+    def _changed(self, kind: str, task_id: Optional[str] = None):
+        """Вызывать ПОСЛЕ выхода из _lock: снимок, пересчёт дедлайна, подписчики."""
+        with self._lock:
+            self._publish()
+        if self._running:
+            self.scheduler.reschedule(self)
+        for cb in list(self._listeners):
+            cb(kind, task_id)
 
     # ──────────────────────────────────────────────
-    #  Основной цикл
+    #  Запуск / остановка, дедлайны для Scheduler
     # ──────────────────────────────────────────────
 
     def start(self):
         if self._running:
             return
-        self._running = True
-        self._thread = threading.Thread(target=self._loop, daemon=True)
-        self._thread.start()
+        with self._lock:
+            self._running = True
+            self._seg_start = self.clock.monotonic()
+            self._last_flush = self._last_checkpoint = self._seg_start
+            # Смена суток — только у плана на сегодня: прошедший день открыт
+            # для правки, а не для того, чтобы догонять сегодняшний
+            self._day_end = (self._midnight_after(self.plan_date)
+                             if self.rollover and self.plan_date == self.clock.today()
+                             else None)
+            self._log("start")
+            self._publish()
+        if self._owns_scheduler:
+            self.scheduler.start()
+        self.scheduler.reschedule(self)
 
     def stop(self):
-        self._running = False
-        self._flush()
-
-    def _loop(self):
-        while self._running:
-            time.sleep(1)
-            with self._lock:
-                self._tick()
-                self._dirty_ticks += 1
-                if self._dirty_ticks >= self.SAVE_INTERVAL:
-                    self._flush()
-                    self._dirty_ticks = 0
-            if self.on_tick:
-                self.on_tick()
-
-    def _tick(self):
-        if not self.active_task_id:
-            self._proc_used += 1
-            return
+        with self._lock:
+            self._sync()
+            self._running = False
+            self._seg_start = None
+            self._log("stop")
+            self._publish()
+        self.scheduler.remove(self)
+        if self._owns_scheduler:
+            self.scheduler.stop()
+        self.flush(wait=True)
+        if self.writer and self._owns_writer:
+            self.writer.stop()
 
-        t = self._tasks.get(self.active_task_id)
-        if not t or t["status"] in (TaskStatus.COMPLETED, TaskStatus.SKIPPED):
-            self.active_task_id = None
-            self._proc_used += 1
-            return
+    def next_deadline(self) -> Optional[float]:
+        """
+        Ближайший значимый момент (monotonic):
+        активная задача выходит за allocated, очередной flush или полночь.
+        """
+        with self._lock:
+            if self._seg_start is None:
+                return None
+            deadline = float("inf")
+            if self.autoflush:
+                deadline = self._last_flush + self.SAVE_INTERVAL
 
-        t["elapsed_seconds"] += 1
+            t = self._tasks.get(self.active_task_id) if self.active_task_id else None
+            if t and t.status not in _FINISHED:
+                room = t.allocated_seconds - t.elapsed_seconds
+                if room >= 0:
+                    # Первая секунда сверх allocated: перерасход или STOP
+                    deadline = min(deadline, self._seg_start + room + 1)
 
-        if t["elapsed_seconds"] > t["allocated_seconds"]:
-            if self.settings.overrun_behavior == OverrunBehavior.STOP:
-                t["elapsed_seconds"] -= 1
-                self.active_task_id = None
-                self._proc_used += 1
+        if self._day_end is not None:
+            return min(deadline, max(self._day_end, self._rollover_retry_at))
+        return min(deadline, self._midnight_after(self.clock.today()))
+
+    def _midnight_after(self, d: date) -> float:
+        """monotonic-момент полуночи, которой заканчивается день d."""
+        midnight = datetime.combine(d + timedelta(days=1), datetime.min.time())
+        return self.clock.monotonic() + (midnight - self.clock.now()).total_seconds()
+
+    def on_deadline(self, now: float):
+        if (self._day_end is not None
+                and now >= max(self._day_end, self._rollover_retry_at)):
+            self._rollover()
+        with self._lock:
+            if self._seg_start is None:
                 return
+            self._settle(now)
+            self._publish()
+            need_flush = self.autoflush and now - self._last_flush >= self.SAVE_INTERVAL
+            if need_flush:
+                self._last_flush = now
+                # С журналом между чекпоинтами — только отметка в файле
+                if (self.journal is not None
+                        and now - self._last_checkpoint < self.CHECKPOINT_INTERVAL):
+                    self._log("mark")
+                    need_flush = False
+                else:
+                    self._last_checkpoint = now
+        if need_flush:
+            self.flush()
+        if self.on_tick:
+            self.on_tick()
 
-            overrun_delta = t["elapsed_seconds"] - t["allocated_seconds"]
-            prev_overrun  = t["overrun_seconds"]
-            t["overrun_seconds"] = overrun_delta
-            delta = overrun_delta - prev_overrun
+    def _rollover(self):
+        """
+        Полночь: время до неё уже досчитано старому плану (_settle не заходит
+        за _day_end). День записывается и закрывается (gamification.finalize_day),
+        движок переключается на план следующего дня (после сна через
+        несколько полуночей — сразу на сегодняшний). Активная задача
+        продолжается в новом дне копией на оставшееся время, исходная
+        помечается перенесённой — остальное переносит UI, как при запуске.
 
-            if self.settings.overrun_source == OverrunSource.PROCRASTINATION:
-                self._proc_used += delta
-            elif self.settings.overrun_source == OverrunSource.PROPORTIONAL:
-                self._eat_proportional(delta)
+        Ошибка БД — повтор через ROLLOVER_RETRY; до тех пор время стоит
+        на полуночи, задача для переноса и уже созданная копия помнятся.
+        """
+        with self._lock:
+            if not self._rollover_pending:
+                self._sync()
+                carry = self._tasks.get(self.active_task_id) if self.active_task_id else None
+                self._carry = carry if carry is not None and carry.status not in _FINISHED else None
+                self._carry_id = None
+                self._set_active(None)
+                self._log("stop")
+                self._rollover_pending = True
+            carry = self._carry
+        old_plan_id, old_date = self.plan_id, self.plan_date
+        # Проспали несколько полуночей — сразу на сегодня, без дня за пробуждение
+        new_date = max(old_date + timedelta(days=1), self.clock.today())
+
+        try:
+            if self.autoflush:
+                if not self.flush(wait=True):
+                    raise RuntimeError("писатель не подтвердил запись")
+            else:
+                self._flush_sync()
+            if carry is not None:
+                repo.mark_carried_over([carry.id])
+            try:
+                result = gami.finalize_day(old_date)
+            except Exception:
+                # Итог дня можно подвести и позже (UI делает это при запуске)
+                log.exception("Не удалось подвести итог дня %s", old_date)
+                result = None
+            with repo.unit_of_work():
+                plan = repo.get_or_create_plan(new_date)
+                carry_id = self._carry_id
+                if carry is not None and carry_id is None:
+                    carry_id = str(uuid.uuid4())
+                    repo.add_tasks_bulk(plan.id, [{
+                        "id": carry_id, "name": carry.name,
+                        "allocated_seconds": carry.remaining_seconds,
+                        "scheduled_time": carry.scheduled_time,
+                        "priority": carry.priority,
+                    }])
+            self._carry_id = carry_id
+            loaded = self._read_plan(plan.id)
+        except Exception:
+            log.exception("Смена суток %s → %s не удалась, повтор через %d с",
+                          old_date, new_date, self.ROLLOVER_RETRY)
+            self._rollover_retry_at = self.clock.monotonic() + self.ROLLOVER_RETRY
+            return
+
+        with self._lock:
+            # Изменения старого плана, сделанные пока шла запись
+            leftover = self._collect_changes()[:2]
+            old_journal = self.journal
+            if self.writer is not None and any(leftover):
+                on_commit = old_journal.remove if old_journal is not None else None
+                self.writer.submit(old_plan_id, *leftover, on_commit)
+                leftover = old_journal = None
+            self.plan_id = plan.id
+            if self.journal is not None:
+                self.journal = self.journal.rotate(plan.id)
+            self._load_state(loaded)
+            self._day_end = self._midnight_after(new_date)
+            self._rollover_pending = False
+            self._rollover_retry_at = 0.0
+            self._carry = self._carry_id = None
+            if carry_id in self._tasks:
+                self._set_active(carry_id)
+                self._set(self._tasks[carry_id], status=TaskStatus.ACTIVE)
+            self._log("start")
+            if carry_id:
+                self._log("activate", carry_id)
+            self._publish()
+        if leftover and any(leftover):
+            try:
+                repo.flush_engine_state(old_plan_id, *leftover)
+            except Exception:
+                log.exception("Не удалось дописать план %s после смены суток", old_plan_id)
+                old_journal = None      # чекпоинт не записан — журнал ещё нужен
+        if old_journal is not None:
+            # Последний чекпоинт старого плана в БД — его журнал больше не нужен
+            old_journal.remove()
+        self._changed("rollover")
+        if self.on_rollover:
+            self.on_rollover(old_date, new_date, result)
 
     def _eat_proportional(self, delta: int):
-        pending = [
-            t for t in self._tasks.values()
-            if t["status"] in (TaskStatus.PENDING, TaskStatus.ACTIVE)
-            and t["id"] != self.active_task_id
-            and (t["allocated_seconds"] - t["elapsed_seconds"]) > 0
-        ]
-        if not pending:
+        """
+        Перерасход активной задачи съедает остаток остальных пропорционально.
+        O(1) на вызов: растёт только долг, задачи не переписываются.
+        Агрегат _pending_alloc уменьшается сразу.
+        """
+        if self._shrink_pool is None:
+            self._build_shrink_pool()
+        eaten = min(delta, self._shrink_room - self._shrink_debt)
+        self._shrink_debt += eaten
+        self._pending_alloc -= eaten
+
+    def _build_shrink_pool(self):
+        """Пул — при первом перерасходе, O(n) один раз; дальше правится точечно."""
+        self._shrink_pool, self._shrink_heap, self._shrink_room = {}, [], 0
+        for t in self._tasks.values():
+            if self._shrinkable(t):
+                self._shrink_join(t, heapify=False)
+        heapq.heapify(self._shrink_heap)
+
+    def _shrinkable(self, t: TaskState) -> bool:
+        return (t.status in (TaskStatus.PENDING, TaskStatus.ACTIVE)
+                and t.id != self.active_task_id
+                and t.allocated_seconds > t.elapsed_seconds)
+
+    def _shrink_join(self, t: TaskState, heapify: bool = True):
+        remaining = t.allocated_seconds - t.elapsed_seconds
+        seq = next(self._shrink_seq)
+        self._shrink_pool[t.id] = [remaining, 0, seq]
+        self._shrink_room += remaining
+        entry = (1 / remaining, seq, t.id)
+        if heapify:
+            heapq.heappush(self._shrink_heap, entry)
+        else:
+            self._shrink_heap.append(entry)
+
+    def _shrink_refresh(self, task_id: Optional[str]):
+        """
+        Под _lock, после изменения задачи (или смены активной): задача входит
+        в пул, выходит из него или входит заново с новым остатком.
+        Запись в куче не удаляется — устаревшая отбрасывается по seq.
+        Вызывать без нерозданного долга (после _sync), кроме входа новых задач.
+        """
+        pool = self._shrink_pool
+        if pool is None or task_id is None:
             return
-        total_remaining = sum(
-            t["allocated_seconds"] - t["elapsed_seconds"] for t in pending
-        )
-        for t in pending:
-            share = delta * (t["allocated_seconds"] - t["elapsed_seconds"]) / total_remaining
-            t["allocated_seconds"] = max(0, t["allocated_seconds"] - int(share))
+        t = self._tasks.get(task_id)
+        member = pool.get(task_id)
+        if member is not None:
+            remaining, given, _ = member
+            if (t is not None and self._shrinkable(t)
+                    and t.allocated_seconds - t.elapsed_seconds == remaining - given):
+                return      # изменилось что-то, кроме остатка
+            del pool[task_id]
+            self._shrink_room -= remaining - given
+        if t is not None and self._shrinkable(t):
+            self._shrink_join(t)
+
+    def _set_active(self, task_id: Optional[str]):
+        """Смена активной задачи: прежняя может войти в пул перерасхода, новая — выходит."""
+        old, self.active_task_id = self.active_task_id, task_id
+        if self._shrink_pool is not None and old != task_id:
+            self._shrink_refresh(old)
+            self._shrink_refresh(task_id)
+
+    def _apply_shrink(self):
+        """
+        Раздаёт накопленный долг задачам пула по секунде: каждая следующая
+        достаётся задаче с наименьшим (выдано + 1) / remaining (метод
+        д'Ондта по куче). Сумма — ровно долг; задача не получает больше
+        своего остатка; итог зависит только от общего долга, а не от того,
+        как часто его раздают. O(долг · log n) вместо O(n) на раздачу.
+        """
+        debt = self._shrink_debt
+        if debt == 0:
+            return
+        self._shrink_debt = 0
+        self._shrink_room -= debt
+        pool, heap = self._shrink_pool, self._shrink_heap
+        shares: dict[str, int] = {}
+        while debt:
+            _, seq, task_id = heapq.heappop(heap)
+            member = pool.get(task_id)
+            if member is None or member[2] != seq:
+                continue                    # устаревшая запись
+            member[1] += 1
+            debt -= 1
+            shares[task_id] = shares.get(task_id, 0) + 1
+            if member[1] < member[0]:
+                heapq.heappush(heap, ((member[1] + 1) / member[0], seq, task_id))
+
+        self._pending_alloc += sum(shares.values())  # _set ниже снова вычтет доли
+        for task_id, q in shares.items():
+            t = self._tasks[task_id]
+            self._set(t, allocated_seconds=t.allocated_seconds - q)
 
 
 class NotificationScheduler:
+    """
+    Напоминания о задачах со scheduled_time.
+    Своего потока нет: просыпается на планировщике движка ровно
+    к порогу notify_before_minutes ближайшей задачи.
+
+    Очередь — min-куча (время задачи, task_id), которая правится по событиям
+    движка (add / edit / remove / complete / skip): scheduled_time разбирается
+    один раз на изменение, дедлайн — вершина кучи. Устаревшие записи не
+    удаляются из середины, а отбрасываются при выходе наверх (сверка с _due).
+    """
+
     def __init__(self, engine: TimerEngine, settings: Settings,
-                 notify_cb: Optional[Callable] = None):
+                 sink: Optional[NotificationSink] = None):
         self.engine    = engine
         self.settings  = settings
-        self.notify_cb = notify_cb
+        # Куда доставлять (notify.py); закрывает sink его владелец
+        self.sink      = sink or LogSink()
+        self.scheduler = engine.scheduler
+        self.clock     = engine.clock
         self._notified: set = set()
+        self._heap: list[tuple[datetime, str]] = []
+        self._due: dict[str, datetime] = {}     # task_id → актуальное время в куче
+        self._lock     = threading.Lock()
         self._running  = False
-        self._thread: Optional[threading.Thread] = None
 
     def start(self):
         self._running = True
-        self._thread = threading.Thread(target=self._loop, daemon=True)
-        self._thread.start()
+        self._rebuild()
+        self.engine.add_listener(self._on_engine_change)
+        self.scheduler.reschedule(self)
 
     def stop(self):
         self._running = False
+        self.engine.remove_listener(self._on_engine_change)
+        self.scheduler.remove(self)
+
+    def refresh(self):
+        """Пересчитать ближайшее напоминание (задачи или настройки поменялись)."""
+        if self._running:
+            self.scheduler.reschedule(self)
+
+    def _on_engine_change(self, kind: str, task_id: Optional[str]):
+        if kind in ("add", "edit", "remove", "complete", "skip"):
+            self._update(task_id)
+        elif kind == "rollover":
+            self._rebuild()     # новый план и новая дата
+        else:
+            return              # activate / deactivate расписание не меняют
+        self.refresh()
 
-    def _loop(self):
-        while self._running:
-            self._check()
-            time.sleep(30)
+    # ──────────────────────────────────────────────
+    #  Куча напоминаний
+    # ──────────────────────────────────────────────
+
+    def _rebuild(self):
+        with self._lock:
+            self._due = {}
+            for t in self.engine.get_tasks():
+                scheduled = self._scheduled_at(t)
+                if scheduled is not None:
+                    self._due[t.id] = scheduled
+            self._heap = [(at, task_id) for task_id, at in self._due.items()]
+            heapq.heapify(self._heap)
+
+    def _update(self, task_id: str):
+        t = self.engine.get_task(task_id)
+        scheduled = self._scheduled_at(t) if t is not None else None
+        with self._lock:
+            if scheduled is None:
+                self._due.pop(task_id, None)
+            elif self._due.get(task_id) != scheduled:
+                self._due[task_id] = scheduled
+                heapq.heappush(self._heap, (scheduled, task_id))
+
+    def _top(self) -> Optional[tuple[datetime, str]]:
+        """Под _lock: актуальная вершина кучи (устаревшие записи выбрасываются)."""
+        heap = self._heap
+        while heap and self._due.get(heap[0][1]) != heap[0][0]:
+            heapq.heappop(heap)
+        return heap[0] if heap else None
+
+    def _scheduled_at(self, t: TaskState) -> Optional[datetime]:
+        """datetime напоминания для ещё не напомненной незавершённой задачи."""
+        minute = t.scheduled_minute
+        if minute is None or t.id in self._notified or t.status in _FINISHED:
+            return None
+        midnight = datetime.combine(self.clock.today(), datetime.min.time())
+        return midnight + timedelta(minutes=minute)
+
+    def next_deadline(self) -> Optional[float]:
+        now = self.clock.now()
+        notify_ahead = self.settings.notify_before_minutes * 60
+        with self._lock:
+            while True:
+                top = self._top()
+                if top is None:
+                    return None
+                seconds_until = (top[0] - now).total_seconds()
+                if seconds_until >= 0:
+                    break
+                del self._due[top[1]]       # время прошло — напоминать поздно
+        wait = max(0.0, seconds_until - notify_ahead)
+        return self.clock.monotonic() + wait
+
+    def on_deadline(self, now: float):
+        self._check()
 
     def _check(self):
-        now = datetime.now()
+        now = self.clock.now()
         notify_ahead = self.settings.notify_before_minutes * 60
-        for t in self.engine.get_tasks():
-            if not t["scheduled_time"] or t["id"] in self._notified:
-                continue
-            if t["status"] in (TaskStatus.COMPLETED, TaskStatus.SKIPPED):
+        due = []
+        with self._lock:
+            while True:
+                top = self._top()
+                if top is None:
+                    break
+                scheduled, task_id = top
+                seconds_until = (scheduled - now).total_seconds()
+                if seconds_until > notify_ahead:
+                    break
+                del self._due[task_id]
+                if seconds_until >= 0:
+                    self._notified.add(task_id)
+                    due.append((task_id, seconds_until))
+        for task_id, seconds_until in due:
+            t = self.engine.get_task(task_id)
+            if t is None:
                 continue
+            mins  = int(seconds_until // 60)
+            title = f"⏰ Скоро: {t.name}"
+            msg   = f"Через {mins} мин. ({t.scheduled_time})" if mins > 0 else "Уже сейчас!"
             try:
-                scheduled = datetime.strptime(
-                    f"{date.today().isoformat()} {t['scheduled_time']}",
-                    "%Y-%m-%d %H:%M"
-                )
-            except ValueError:
-                continue
-            seconds_until = (scheduled - now).total_seconds()
-            if 0 <= seconds_until <= notify_ahead:
-                self._notified.add(t["id"])
-                mins  = int(seconds_until // 60)
-                title = f"⏰ Скоро: {t['name']}"
-                msg   = f"Через {mins} мин. ({t['scheduled_time']})" if mins > 0 else "Уже сейчас!"
-                self._send(title, msg)
-
-    def _send(self, title: str, message: str):
-        if self.notify_cb:
-            self.notify_cb(title, message)
-        try:
-            from plyer import notification
-            notification.notify(title=title, message=message, timeout=8)
-        except Exception:
-            pass
+                self.sink.send(title, msg)
+            except Exception:
+                log.exception("Напоминание не доставлено")
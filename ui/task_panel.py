@@ -56,7 +56,9 @@ def sort_tasks(tasks, active_task_id=None):
     active.sort(key=active_key)
     if active_task_id:
         active.sort(key=lambda t: 0 if t.id == active_task_id else 1)
-    done.sort(key=lambda t: t.completed_at or "")
+    # completed_at: ISO-строка у adapter.Task, datetime у записей движка
+    done.sort(key=lambda t: t.completed_at.isoformat()
+              if hasattr(t.completed_at, "isoformat") else (t.completed_at or ""))
     return active + done
 
 
@@ -24,13 +24,12 @@ class _TmplCompat:
         return {k: v for k, v in grouped.items() if v}
 
     def resolve_preset(self, preset_name):
-        flat = {t["name"]: t for group in self.get_all_templates().values() for t in group}
-        names = BUILTIN_PRESETS.get(preset_name, [])
-        for p in storage.get_user_presets_as_dicts():
-            if p["name"] == preset_name:
-                names = p["templates"]
-                break
-        return [flat[n] for n in names if n in flat]
+        # Только нужные шаблоны и только этот пресет — без выгрузки всех списков
+        names = storage.get_user_preset_template_names(preset_name)
+        if names is None:
+            names = BUILTIN_PRESETS.get(preset_name, [])
+        by_name = {t["name"]: t for t in storage.get_templates_by_names(names)}
+        return [by_name[n] for n in names if n in by_name]
 
 
 tmpl = _TmplCompat()
@@ -1,5 +1,4 @@
 """Валидация плана дня — мягкие предупреждения."""
-from datetime import datetime, date
 from adapter import DayPlan, TaskStatus
 
 
@@ -18,19 +17,14 @@ def check_plan(plan: DayPlan) -> list[str]:
         h = total // 3600
         warnings.append(f"⚠ Суммарное время задач {h}ч — больше суток")
 
-    # 2. Пересечения по scheduled_time
+    # 2. Пересечения по scheduled_time (в секундах от полуночи)
     timed = []
     for t in active_tasks:
-        if not t.scheduled_time:
-            continue
-        try:
-            start = datetime.strptime(
-                f"{date.today().isoformat()} {t.scheduled_time}", "%Y-%m-%d %H:%M"
-            )
-            end_sec = start.timestamp() + t.allocated_seconds
-            timed.append((t.name, start.timestamp(), end_sec))
-        except ValueError:
+        minute = t.scheduled_minute
+        if minute is None:
             continue
+        start = minute * 60
+        timed.append((t.name, start, start + t.allocated_seconds))
 
     timed.sort(key=lambda x: x[1])
     for i in range(len(timed) - 1):
@@ -0,0 +1,180 @@
+"""
+Write-behind: фоновая запись состояния движка в БД.
+
+Движок отдаёт изменения (submit) и сразу возвращается — ни поток Tk,
+ни поток планировщика не ждут SQLite. Поток-писатель забирает всё
+накопленное и пишет одной транзакцией (repo.flush_engine_states).
+
+Пока писатель занят, новые изменения той же строки сливаются с ещё не
+записанными (новые значения полей побеждают), поэтому очередь ограничена
+числом разных строк, а не числом вызовов. Если строк больше max_pending
+(БД надолго заблокирована), submit ждёт — иначе память росла бы без предела.
+
+Неудачная запись не теряется сразу: пачка возвращается в очередь под
+более свежие значения и повторяется через RETRY_DELAY. После MAX_RETRIES
+неудач подряд пачка отбрасывается с записью в лог — иначе одна «ядовитая»
+строка навсегда остановила бы запись всех последующих изменений;
+wait() для отброшенных пачек возвращает False.
+"""
+import logging
+import threading
+from typing import Callable, Optional
+
+import repository as repo
+
+log = logging.getLogger(__name__)
+
+
+class WriteBehind:
+    MAX_PENDING = 10_000   # разных строк задач в очереди
+    RETRY_DELAY = 1.0      # секунд до повтора после ошибки записи
+    MAX_RETRIES = 5        # неудач подряд, после которых пачка отбрасывается
+
+    def __init__(self, write: Callable = None, max_pending: int = MAX_PENDING):
+        self._write = write or repo.flush_engine_states
+        self.max_pending = max_pending
+        self._cond = threading.Condition()
+        self._plans: dict[int, dict] = {}              # plan_id → поля плана
+        self._rows: dict[str, tuple[int, dict]] = {}   # task_id → (plan_id, строка)
+        self._callbacks: list[Callable] = []           # после успешного commit
+        self._submitted = 0     # номер последней принятой пачки
+        self._committed = 0     # номер последней обработанной (записанной или отброшенной)
+        self._lost: list[tuple[int, int]] = []     # (после, до] — отброшенные номера
+        self._failures = 0      # неудачных попыток подряд
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+        self.stats: dict = {
+            "flushes": 0, "rows": 0, "statements": 0,
+            "last_rows": 0, "last_statements": 0, "errors": 0, "dropped": 0,
+        }
+
+    # ──────────────────────────────────────────────
+    #  Производитель
+    # ──────────────────────────────────────────────
+
+    def submit(self, plan_id: int, plan_fields: dict, rows: list[dict],
+               on_commit: Optional[Callable] = None) -> int:
+        """Ставит изменения в очередь; возвращает номер для wait()."""
+        with self._cond:
+            self._ensure_thread()
+            while len(self._rows) >= self.max_pending:
+                self._cond.wait()
+            if plan_fields:
+                self._plans.setdefault(plan_id, {}).update(plan_fields)
+            for row in rows:
+                pending = self._rows.get(row["id"])
+                if pending is None:
+                    self._rows[row["id"]] = (plan_id, dict(row))
+                else:
+                    pending[1].update(row)
+            if on_commit:
+                self._callbacks.append(on_commit)
+            self._submitted += 1
+            self._cond.notify_all()
+            return self._submitted
+
+    def wait(self, ticket: Optional[int] = None, timeout: Optional[float] = None) -> bool:
+        """
+        Барьер: ждёт, пока обработано всё принятое до ticket (по умолчанию — всё).
+        False — не успели за timeout или пачка с ticket отброшена (MAX_RETRIES).
+        """
+        with self._cond:
+            if ticket is None:
+                ticket = self._submitted
+            if not self._cond.wait_for(lambda: self._committed >= ticket, timeout):
+                return False
+            return not any(lo < ticket <= hi for lo, hi in self._lost)
+
+    def stop(self, timeout: Optional[float] = 5.0) -> bool:
+        """Дописывает очередь и останавливает поток. False — не успели за timeout."""
+        done = self.wait(timeout=timeout)
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=timeout)
+        self._thread = None
+        return done
+
+    # ──────────────────────────────────────────────
+    #  Поток-писатель
+    # ──────────────────────────────────────────────
+
+    def _ensure_thread(self):
+        """Под _cond: поток поднимается при первой записи."""
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._loop, daemon=True,
+                                        name="life-timer-writer")
+        self._thread.start()
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._plans or self._rows or not self._running)
+                if not (self._plans or self._rows):
+                    return
+                plans, rows, callbacks = self._plans, self._rows, self._callbacks
+                self._plans, self._rows, self._callbacks = {}, {}, []
+                ticket = self._submitted
+                self._cond.notify_all()     # место в очереди освободилось
+
+            batch: dict[int, tuple[dict, list]] = {pid: (f, []) for pid, f in plans.items()}
+            for plan_id, row in rows.values():
+                batch.setdefault(plan_id, ({}, []))[1].append(row)
+            try:
+                statements = self._write([(pid, f, r) for pid, (f, r) in batch.items()])
+            except Exception:
+                self._failures += 1
+                if self._failures >= self.MAX_RETRIES:
+                    self._drop(plans, rows, ticket)
+                else:
+                    log.exception("Фоновая запись в БД не удалась — повтор через %ss",
+                                  self.RETRY_DELAY)
+                    self._requeue(plans, rows, callbacks)
+                continue
+            self._failures = 0
+
+            for cb in callbacks:
+                try:
+                    cb()
+                except Exception:
+                    log.exception("Ошибка в on_commit %r", cb)
+            with self._cond:
+                self._committed = ticket
+                stats = self.stats
+                stats["flushes"] += 1
+                stats["rows"] += len(rows)
+                stats["statements"] += statements
+                stats["last_rows"] = len(rows)
+                stats["last_statements"] = statements
+                self._cond.notify_all()
+
+    def _drop(self, plans: dict, rows: dict, ticket: int):
+        """
+        Пачка не записалась MAX_RETRIES раз подряд — отбрасываем её, чтобы не
+        держать очередь. on_commit не вызываются: чекпоинт журнала не записан,
+        журнал остаётся источником этих изменений.
+        """
+        log.exception("Фоновая запись не удалась %d раз подряд — отброшены планы %s "
+                      "и строки задач %s", self._failures, sorted(plans), sorted(rows))
+        with self._cond:
+            self.stats["errors"] += 1
+            self.stats["dropped"] += len(rows)
+            self._lost.append((self._committed, ticket))
+            self._committed = ticket
+            self._failures = 0
+            self._cond.notify_all()
+
+    def _requeue(self, plans: dict, rows: dict, callbacks: list):
+        """Возвращает неудачную пачку в очередь; поля, изменённые с тех пор, новее."""
+        with self._cond:
+            self.stats["errors"] += 1
+            for plan_id, fields in plans.items():
+                self._plans[plan_id] = {**fields, **self._plans.get(plan_id, {})}
+            for task_id, (plan_id, row) in rows.items():
+                newer = self._rows.get(task_id)
+                self._rows[task_id] = (plan_id, {**row, **newer[1]} if newer else row)
+            self._callbacks = callbacks + self._callbacks
+            self._cond.wait(self.RETRY_DELAY)